@@ -0,0 +1,55 @@
+"""
+Per-request authentication cost for the task endpoints.
+
+Compares GET /api/tasks/{id} when every request looks the user up in the database
+(the previous behaviour), when the lookup is served from the in-process user cache,
+and in the default stateless mode that trusts the signed user_id claim.
+
+    python benchmarks/bench_auth.py [--repeat 2000]
+"""
+import argparse
+import asyncio
+
+from common import ASGIClient, access_token_for, ameasure, create_user, print_table, seed_tasks, setup_django
+
+
+def prepare():
+    from todo.models import Task
+
+    user = create_user()
+    seed_tasks(user, 1)
+    task_id = Task.objects.filter(owner=user).values_list('id', flat=True).first()
+    return access_token_for(user), task_id
+
+
+async def run(token, task_id, repeat):
+    from django.conf import settings
+    from todo.api import api
+    from todo.cache import user_cache
+
+    client = ASGIClient(api, headers={'authorization': f'Bearer {token}'})
+    path = f'/tasks/{task_id}'
+
+    async def uncached():
+        user_cache.clear()
+        await client.get(path)
+
+    async def cached():
+        await client.get(path)
+
+    rows = []
+    settings.API_AUTH_MODE = 'database'
+    await client.get(path)
+    rows.append(('database lookup (no cache)', await ameasure(uncached, repeat)))
+    rows.append(('database lookup (cached)', await ameasure(cached, repeat)))
+    settings.API_AUTH_MODE = 'stateless'
+    rows.append(('stateless user_id claim', await ameasure(cached, repeat)))
+    print_table(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+    setup_django()
+    asyncio.run(run(*prepare(), args.repeat))
@@ -0,0 +1,101 @@
+"""
+Throughput of the task router under concurrent clients.
+
+Runs N concurrent clients, each alternating GET /tasks/ and PATCH /tasks/{id}, against
+the task router with a single shared sync_to_async thread (every ORM call in the process
+queues on it), a fresh thread and connection per request, and the API's pool of leased,
+long-lived DB threads (API_DB_THREADS) that keep their connections.
+
+SQLite runs in-process, so on its own it hides the network round trip a PostgreSQL query
+pays; --db-latency-ms adds that wait (a GIL-releasing sleep) to every query.
+
+    python benchmarks/bench_concurrency.py [--clients 200] [--requests 10] [--tasks 50] [--db-latency-ms 1]
+"""
+import argparse
+import asyncio
+import time
+
+from common import ASGIClient, access_token_for, create_user, seed_tasks, setup_django, summarize
+
+
+def prepare(clients, tasks):
+    from todo.models import Task
+
+    tokens = []
+    for i in range(clients):
+        user = create_user(f'bench{i}')
+        seed_tasks(user, tasks)
+        task_id = Task.objects.filter(owner=user).values_list('id', flat=True).first()
+        tokens.append((access_token_for(user), task_id))
+    return tokens
+
+
+def simulate_db_latency(seconds):
+    from django.db.backends.signals import connection_created
+
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(delay)
+
+    connection_created.connect(install, weak=False)
+
+
+def build_apps():
+    from fastapi import FastAPI
+    from todo.api import api, router
+    from todo.middleware import ThreadSensitiveMiddleware
+
+    shared_thread = FastAPI()
+    shared_thread.include_router(router, prefix='/tasks')
+    thread_per_request = FastAPI()
+    thread_per_request.add_middleware(ThreadSensitiveMiddleware)
+    thread_per_request.include_router(router, prefix='/tasks')
+    return [
+        ('shared sync_to_async thread', shared_thread),
+        ('thread per request', thread_per_request),
+        ('leased DB threads', api),
+    ]
+
+
+async def run_clients(app, tokens, requests_per_client):
+    latencies = []
+
+    async def client(token, task_id):
+        http = ASGIClient(app, headers={'authorization': f'Bearer {token}'})
+        for i in range(requests_per_client):
+            start = time.perf_counter()
+            if i % 2:
+                response = await http.patch(f'/tasks/{task_id}', json_body={'order': float(i)})
+            else:
+                response = await http.get('/tasks/')
+            assert response.status_code == 200, response.content
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(token, task_id) for token, task_id in tokens))
+    return time.perf_counter() - start, latencies
+
+
+async def run(tokens, requests_per_client):
+    for name, app in build_apps():
+        elapsed, latencies = await run_clients(app, tokens, requests_per_client)
+        stats = summarize(latencies)
+        print(f"{name:<30} {len(latencies) / elapsed:8.1f} req/s  p50={stats['p50_ms']:8.2f}ms  "
+              f"p99={stats['p99_ms']:8.2f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=10)
+    parser.add_argument('--tasks', type=int, default=50)
+    parser.add_argument('--db-latency-ms', type=float, default=1.0)
+    args = parser.parse_args()
+    setup_django()
+    tokens = prepare(args.clients, args.tasks)
+    if args.db_latency_ms:
+        simulate_db_latency(args.db_latency_ms / 1000)
+    asyncio.run(run(tokens, args.requests))
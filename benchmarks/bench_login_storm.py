@@ -0,0 +1,101 @@
+"""
+Task endpoint latency during a login storm.
+
+A few clients keep reading GET /tasks/ while many others hammer POST /auth/login with
+real (PBKDF2) passwords. Runs once with hashing in the request threads
+(PASSWORD_HASHING_WORKERS = 0, the old behaviour) and once on the hashing process pool,
+and reports task-read latency next to login throughput and 503s.
+
+The hashing pool run is checked: the task reads' p99 must stay under --max-read-p99-ms,
+and with more logins than the pool admits the excess must be shed with 503. The exit
+status is 1 when either fails.
+
+    python benchmarks/bench_login_storm.py [--logins 40] [--readers 4] [--seconds 10] [--workers 2]
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from common import ASGIClient, access_token_for, create_user, seed_tasks, setup_django, summarize
+
+PASSWORD = 'Bench-pass-123'
+
+
+def prepare(logins, readers):
+    users = [create_user(f'storm{i}', PASSWORD).username for i in range(logins)]
+    tokens = []
+    for i in range(readers):
+        user = create_user(f'reader{i}', None)
+        seed_tasks(user, 50)
+        tokens.append(access_token_for(user))
+    return users, tokens
+
+
+async def storm(app, users, tokens, seconds):
+    deadline = time.perf_counter() + seconds
+    reads, logins = [], {'ok': 0, 'overloaded': 0}
+
+    async def reader(token):
+        http = ASGIClient(app, headers={'authorization': f'Bearer {token}'})
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await http.get('/tasks/')
+            assert response.status_code == 200, response.content
+            reads.append(time.perf_counter() - start)
+            await asyncio.sleep(0.01)
+
+    async def login(username):
+        http = ASGIClient(app)
+        while time.perf_counter() < deadline:
+            response = await http.post('/auth/login', data={'username': username, 'password': PASSWORD})
+            if response.status_code == 503:
+                logins['overloaded'] += 1
+                await asyncio.sleep(int(response.headers['retry-after']))
+            else:
+                assert response.status_code == 200, response.content
+                logins['ok'] += 1
+
+    await asyncio.gather(*(reader(t) for t in tokens), *(login(u) for u in users))
+    return summarize(reads), logins
+
+
+async def run(users, tokens, seconds, workers, max_read_p99_ms):
+    from todo import hashing
+    from todo.api import api
+
+    failures = []
+    for name, pool_workers in [('hash in request threads', 0), (f'hash pool ({workers} procs)', workers)]:
+        hashing.pool = hashing.PasswordHasherPool(pool_workers, hashing.pool.queue_size)
+        if pool_workers:
+            # Start the workers outside the measured window
+            await hashing.make_password('warm-up')
+        stats, logins = await storm(api, users, tokens, seconds)
+        admits = hashing.pool.workers + hashing.pool.queue_size
+        hashing.pool.shutdown()
+        print(f"{name:<26} tasks p50={stats['p50_ms']:8.2f}ms  p99={stats['p99_ms']:8.2f}ms  "
+              f"logins/s={logins['ok'] / seconds:6.2f}  503s={logins['overloaded']}")
+        if not pool_workers:
+            continue
+        if stats['p99_ms'] > max_read_p99_ms:
+            failures.append(f"task reads p99 {stats['p99_ms']:.2f}ms is over {max_read_p99_ms}ms")
+        if len(users) > admits and not logins['overloaded']:
+            failures.append(f"{len(users)} concurrent logins, {admits} admitted, but none got 503")
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--logins', type=int, default=40)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--max-read-p99-ms', type=float, default=1000.0,
+                        help="Highest acceptable p99 of the task reads with the hashing pool")
+    args = parser.parse_args()
+    setup_django()
+    users, tokens = prepare(args.logins, args.readers)
+    failures = asyncio.run(run(users, tokens, args.seconds, args.workers, args.max_read_p99_ms))
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
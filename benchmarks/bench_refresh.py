@@ -0,0 +1,55 @@
+"""
+Cost of renewing an access token: POST /auth/refresh against POST /auth/login.
+
+A login checks the password (a full PBKDF2 hash on the hashing pool); a refresh checks
+the refresh token's signature and looks up the user and the revoked-token table. Runs
+refresh with and without rotation (rotation also revokes the old token).
+
+    python benchmarks/bench_refresh.py [--repeat 20]
+"""
+import argparse
+import asyncio
+
+from common import ASGIClient, ameasure, create_user, print_table, setup_django
+
+PASSWORD = 'Bench-pass-123'
+
+
+async def run(username, repeat):
+    from rest_framework_simplejwt.settings import api_settings as jwt_settings
+    from todo import hashing
+    from todo.api import api
+
+    http = ASGIClient(api)
+    # Start the hashing workers outside the measured window
+    await hashing.make_password('warm-up')
+    login = await http.post('/auth/login', data={'username': username, 'password': PASSWORD})
+    refresh_token = login.json()['refresh']
+
+    async def do_login():
+        response = await http.post('/auth/login', data={'username': username, 'password': PASSWORD})
+        assert response.status_code == 200, response.content
+
+    async def do_refresh():
+        nonlocal refresh_token
+        response = await http.post('/auth/refresh', json_body={'refresh': refresh_token})
+        assert response.status_code == 200, response.content
+        refresh_token = response.json()['refresh']
+
+    rows = [('login (password hash)', await ameasure(do_login, repeat))]
+    rotate = jwt_settings.ROTATE_REFRESH_TOKENS
+    for name, rotation in [('refresh, rotating', True), ('refresh, no rotation', False)]:
+        jwt_settings.ROTATE_REFRESH_TOKENS = rotation
+        rows.append((name, await ameasure(do_refresh, repeat * 10)))
+    jwt_settings.ROTATE_REFRESH_TOKENS = rotate
+    hashing.pool.shutdown()
+    print_table(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    setup_django()
+    user = create_user('refresher', PASSWORD)
+    asyncio.run(run(user.username, args.repeat))
@@ -0,0 +1,66 @@
+"""
+Full-text search latency at a large per-user task count.
+
+Seeds one user with --tasks tasks (titles and descriptions drawn from a small vocabulary,
+so common words match thousands of rows and rare ones a handful) plus a second user
+with the same amount, then times GET /tasks/search for a few query shapes.
+
+    python benchmarks/bench_search.py [--tasks 100000] [--repeat 50]
+"""
+import argparse
+import asyncio
+import random
+from datetime import date
+
+from common import ASGIClient, access_token_for, ameasure, create_user, print_table, setup_django
+
+COMMON = ['report', 'meeting', 'review', 'email', 'call', 'plan', 'update', 'fix', 'draft', 'budget']
+RARE = [f'project{i}' for i in range(2000)]
+
+QUERIES = [
+    ('rare word', 'project1234'),
+    ('common word', 'budget'),
+    ('two common words', 'budget review'),
+    ('prefix', 'meet'),
+    ('common + rare', 'report project42'),
+]
+
+
+def seed(user, count, rng):
+    from todo.models import Task
+
+    def text(words):
+        return ' '.join(rng.choice(COMMON) for _ in range(words)) + ' ' + rng.choice(RARE)
+
+    for start in range(0, count, 5000):
+        Task.objects.bulk_create([
+            Task(owner=user, title=text(3), description=text(12), due_date=date(2030, 1, 1), order=float(i))
+            for i in range(start, min(count, start + 5000))
+        ])
+
+
+async def run(token, repeat):
+    from todo.api import api
+
+    http = ASGIClient(api, headers={'authorization': f'Bearer {token}'})
+    rows = []
+    for name, q in QUERIES:
+        async def search():
+            response = await http.get('/tasks/search', params={'q': q})
+            assert response.status_code == 200, response.content
+
+        rows.append((f'{name} ({q!r})', await ameasure(search, repeat)))
+    print_table(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    setup_django()
+    rng = random.Random(42)
+    user = create_user('searcher', None)
+    seed(user, args.tasks, rng)
+    seed(create_user('neighbour', None), args.tasks, rng)
+    asyncio.run(run(access_token_for(user), args.repeat))
@@ -0,0 +1,57 @@
+"""
+Per-row cost of turning a user's tasks into the task list JSON.
+
+Compares what list_tasks used to do (ORM instances validated through TaskDisplay with
+from_attributes, dumped to JSON the way FastAPI does) with the values_list() fast path
+encoded by the precompiled TaskRow TypeAdapter. Both include the query.
+
+    python benchmarks/bench_serialization.py [--sizes 1000 10000 100000] [--repeat 5]
+"""
+import argparse
+import json
+import time
+from typing import List
+
+from common import create_user, seed_tasks, setup_django
+
+
+def run(sizes, repeat):
+    from pydantic import TypeAdapter
+    from todo.api import TASK_ROW_FIELDS, TaskDisplay, task_rows_json
+    from todo.models import Task
+    from todo.pagination import TASK_LIST_ORDERING
+
+    display_adapter = TypeAdapter(List[TaskDisplay])
+
+    def orm_and_model(tasks):
+        validated = display_adapter.validate_python(list(tasks), from_attributes=True)
+        return json.dumps(display_adapter.dump_python(validated, mode='json'), ensure_ascii=False, separators=(',', ':'))
+
+    def values_and_adapter(tasks):
+        return task_rows_json(list(tasks.values_list(*TASK_ROW_FIELDS)))
+
+    for size in sizes:
+        user = create_user(f'serial{size}', None)
+        seed_tasks(user, size)
+        tasks = Task.objects.filter(owner=user).order_by(*TASK_LIST_ORDERING)
+        results = []
+        for fn in (orm_and_model, values_and_adapter):
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                # A fresh queryset each time, or the ORM variant reuses its result cache
+                fn(tasks.all())
+                best = min(best, time.perf_counter() - start)
+            results.append(best)
+        old, new = results
+        print(f"{size:>7} tasks  ORM + TaskDisplay {old / size * 1e6:7.2f}us/row  "
+              f"values_list + TypeAdapter {new / size * 1e6:7.2f}us/row  ({old / new:.1f}x)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    setup_django()
+    run(args.sizes, args.repeat)
@@ -0,0 +1,76 @@
+"""
+Worker cold start: time from a fresh interpreter to the first API response.
+
+Each run starts a new Python process that imports todoproject.asgi, starts the app's
+lifespan and serves GET /api/health in-process, and reports both times. Runs in eager
+(LEAN_STARTUP=0) and lean (the default) mode. Exits 1 if the lean median time to the
+first response is over --target-ms.
+
+    python benchmarks/bench_startup.py [--runs 7] [--target-ms 1200]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import asyncio, json, sys, time
+start = float(sys.argv[1])
+sys.path.insert(0, 'benchmarks')
+import todoproject.asgi
+imported = time.perf_counter()
+from common import ASGIClient
+
+async def first_request():
+    app = todoproject.asgi.application
+    async with app.router.lifespan_context(app):
+        response = await ASGIClient(app).get('/api/health')
+        assert response.status_code == 200, response.content
+        return time.perf_counter()
+
+served = asyncio.run(first_request())
+print(json.dumps({'import_ms': (imported - start) * 1000, 'first_response_ms': (served - start) * 1000}))
+'''
+
+
+def run_once(lean):
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'benchmarks.settings', 'LEAN_STARTUP': '1' if lean else '0'}
+    # perf_counter is system-wide on Linux, so the child can measure from our clock
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, repr(start)], cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--target-ms', type=float, default=1200)
+    args = parser.parse_args()
+
+    # Make sure the benchmark database exists so /api/health can answer
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from common import setup_django
+    setup_django()
+
+    medians = {}
+    for name, lean in [('eager', False), ('lean', True)]:
+        runs = [run_once(lean) for _ in range(args.runs)]
+        medians[name] = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        print(f"{name:<6} import {medians[name]['import_ms']:7.1f}ms  "
+              f"first response {medians[name]['first_response_ms']:7.1f}ms  (median of {args.runs})")
+
+    lean_ms = medians['lean']['first_response_ms']
+    print(f"target {args.target_ms:.0f}ms: {'met' if lean_ms <= args.target_ms else 'MISSED'}")
+    if lean_ms > args.target_ms:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Cost of a page load: the SPA shell and its script, through Django against the ASGI app.
+
+"django" is how they were served before: staticfiles' serve view behind the whole
+middleware stack, and index rendering the template on every hit. "asgi" is the
+application as deployed: StaticAssets on collected, hashed files and the ShellCache copy
+of the shell. Also shows the bytes sent with and without gzip.
+
+    python benchmarks/bench_static.py [--repeat 500]
+"""
+import argparse
+import asyncio
+import tempfile
+
+from common import ASGIClient, ameasure, print_table, setup_django
+
+# Used as ROOT_URLCONF for the "django" rows
+urlpatterns = []
+
+
+async def run(repeat):
+    from django.templatetags.static import static
+    from todo.views import anonymous_shell
+    from todoproject.asgi import application, django_asgi_app
+
+    script = static('todo/script.js')
+    gzip = {'accept-encoding': 'gzip, deflate, br'}
+    django = ASGIClient(django_asgi_app, headers=gzip)
+    asgi = ASGIClient(application, headers=gzip)
+
+    async def django_script():
+        response = await django.get('/static/todo/script.js')
+        assert response.status_code == 200, response.status_code
+
+    async def django_shell():
+        # What index did before: a full render for every visitor
+        anonymous_shell.cache_clear()
+        response = await django.get('/')
+        assert response.status_code == 200, response.status_code
+
+    async def asgi_script():
+        response = await asgi.get(script)
+        assert response.status_code == 200, response.status_code
+
+    async def asgi_shell():
+        response = await asgi.get('/')
+        assert response.status_code == 200, response.status_code
+
+    revalidate = (await asgi.get('/')).headers['etag']
+
+    async def asgi_shell_revalidated():
+        response = await asgi.get('/', headers={'if-none-match': revalidate})
+        assert response.status_code == 304, response.status_code
+
+    print_table([
+        ('script.js, django serve view', await ameasure(django_script, repeat)),
+        ('script.js, asgi static mount', await ameasure(asgi_script, repeat)),
+        ('shell, django render per hit', await ameasure(django_shell, repeat)),
+        ('shell, asgi cached copy', await ameasure(asgi_shell, repeat)),
+        ('shell, asgi 304 revalidation', await ameasure(asgi_shell_revalidated, repeat)),
+    ])
+    for path in (script, '/'):
+        plain = await ASGIClient(application).get(path)
+        compressed = await asgi.get(path)
+        print(f"{path:<40} {len(plain.content):>8} bytes, gzip {len(compressed.content):>7} bytes, "
+              f"cache-control: {compressed.headers['cache-control']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+    setup_django()
+
+    from django.conf import settings
+    from django.contrib.staticfiles.views import serve
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+    from django.urls import re_path
+    from todoproject.urls import urlpatterns as project_urlpatterns
+
+    urlpatterns[:] = project_urlpatterns + [re_path(r'^static/(?P<path>.*)$', serve, {'insecure': True})]
+    storages = {**settings.STORAGES, 'staticfiles': {'BACKEND': 'todo.assets.CompressedManifestStaticFilesStorage'}}
+    with tempfile.TemporaryDirectory() as static_root, \
+            override_settings(STATIC_ROOT=static_root, STORAGES=storages, ROOT_URLCONF='__main__'):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        asyncio.run(run(args.repeat))
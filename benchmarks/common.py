@@ -0,0 +1,195 @@
+"""Shared helpers for the benchmark scripts: Django bootstrap, seeding, timing and an ASGI client."""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import date
+from urllib.parse import urlencode
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def setup_django(fresh=True):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    import django
+    from django.conf import settings
+
+    if fresh and os.path.exists(settings.DATABASES['default']['NAME']):
+        os.remove(settings.DATABASES['default']['NAME'])
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+
+    call_command('migrate', verbosity=0)
+    # WAL is persistent in the database file and lets readers run alongside the writer
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
+
+
+def create_user(username='benchuser', password='Bench-pass-123'):
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+    user, created = User.objects.get_or_create(username=username, defaults={'email': f'{username}@example.com'})
+    if created:
+        user.set_password(password)
+        user.save()
+    return user
+
+
+def access_token_for(user):
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    return str(RefreshToken.for_user(user).access_token)
+
+
+def seed_tasks(user, count):
+    from todo.models import Task
+
+    Task.objects.bulk_create(
+        [
+            Task(
+                owner=user,
+                title=f'Task {i}',
+                description='Seeded by the benchmark suite',
+                priority=('Low', 'Medium', 'High')[i % 3],
+                status=('Queue', 'In Progress', 'Completed', 'Aborted')[i % 4],
+                due_date=date(2030, 1, 1 + i % 28),
+                order=float(i),
+            )
+            for i in range(count)
+        ],
+        batch_size=1000,
+    )
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': pct(50),
+        'p95_ms': pct(95),
+        'p99_ms': pct(99),
+    }
+
+
+def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+async def ameasure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def print_table(rows):
+    for name, stats in rows:
+        print(f"{name:<40} mean={stats['mean_ms']:8.3f}ms  p50={stats['p50_ms']:8.3f}ms  "
+              f"p95={stats['p95_ms']:8.3f}ms  p99={stats['p99_ms']:8.3f}ms")
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status_code = status
+        self.headers = headers
+        self.content = body
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ASGIClient:
+    """
+    Minimal in-process HTTP client for an ASGI app, so the benchmarks exercise the real
+    routing/middleware stack without a socket or a server process.
+    """
+
+    def __init__(self, app, headers=None):
+        self.app = app
+        self.headers = dict(headers or {})
+
+    async def request(self, method, path, json_body=None, data=None, params=None, headers=None):
+        body = b''
+        request_headers = {**self.headers, **(headers or {})}
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            request_headers.setdefault('content-type', 'application/json')
+        elif data is not None:
+            body = data if isinstance(data, bytes) else urlencode(data).encode()
+            request_headers.setdefault('content-type', 'application/x-www-form-urlencoded')
+        request_headers['content-length'] = str(len(body))
+
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'root_path': '',
+            'query_string': urlencode(params or {}).encode(),
+            'headers': [(k.lower().encode(), v.encode()) for k, v in request_headers.items()],
+            'client': ('127.0.0.1', 50000),
+            'server': ('testserver', 80),
+        }
+        sent = False
+        finished = asyncio.Event()
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            # Like a real client, only disconnect once the whole response has arrived
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        status, response_headers, chunks = None, {}, []
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                for key, value in message.get('headers', []):
+                    response_headers[key.decode().lower()] = value.decode()
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+                if not message.get('more_body', False):
+                    finished.set()
+
+        await self.app(scope, receive, send)
+        return Response(status, response_headers, b''.join(chunks))
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    async def put(self, path, **kwargs):
+        return await self.request('PUT', path, **kwargs)
+
+    async def patch(self, path, **kwargs):
+        return await self.request('PATCH', path, **kwargs)
+
+    async def delete(self, path, **kwargs):
+        return await self.request('DELETE', path, **kwargs)
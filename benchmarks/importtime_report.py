@@ -0,0 +1,72 @@
+"""
+Import-time profile of the ASGI entry point.
+
+Runs `python -X importtime -c "import todoproject.asgi"` in a fresh interpreter and
+summarizes where the time goes: per top-level package (summed self time) and the
+slowest individual modules. Compare LEAN_STARTUP=1 (the default) with --eager.
+
+    python benchmarks/importtime_report.py [--eager] [--top 25] [--json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def profile_imports(eager=False, module='todoproject.asgi'):
+    """(module, self_us, cumulative_us) for every module the import loads, in load order."""
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'benchmarks.settings', 'LEAN_STARTUP': '0' if eager else '1'}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def summarize(rows, top):
+    packages = defaultdict(lambda: [0, 0])
+    for name, self_us, _ in rows:
+        package = packages[name.split('.')[0]]
+        package[0] += self_us
+        package[1] += 1
+    return {
+        'total_ms': sum(self_us for _, self_us, _ in rows) / 1000,
+        'modules': len(rows),
+        'packages': [
+            {'package': name, 'self_ms': self_us / 1000, 'modules': count}
+            for name, (self_us, count) in sorted(packages.items(), key=lambda item: -item[1][0])[:top]
+        ],
+        'slowest_modules': [
+            {'module': name, 'self_ms': self_us / 1000}
+            for name, self_us, _ in sorted(rows, key=lambda row: -row[1])[:top]
+        ],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--eager', action='store_true', help='profile with LEAN_STARTUP=0')
+    parser.add_argument('--top', type=int, default=25)
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+    args = parser.parse_args()
+    report = summarize(profile_imports(args.eager), args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{report['modules']} modules, {report['total_ms']:.1f}ms of import time")
+        print('\nBy package (self time):')
+        for row in report['packages']:
+            print(f"  {row['package']:<30} {row['self_ms']:8.1f}ms  {row['modules']:5} modules")
+        print('\nSlowest modules (self time):')
+        for row in report['slowest_modules']:
+            print(f"  {row['module']:<60} {row['self_ms']:8.1f}ms")
@@ -0,0 +1,39 @@
+"""
+Settings for the in-process benchmarks: the project settings on top of a throwaway
+SQLite database so the benchmarks run without a PostgreSQL server.
+"""
+import os
+import tempfile
+
+from todoproject.settings import *  # noqa: F401,F403
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('BENCH_DB', os.path.join(tempfile.gettempdir(), 'todo_bench.sqlite3')),
+        'CONN_MAX_AGE': None,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 30,
+            'init_command': 'PRAGMA synchronous=NORMAL;',
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+}
+
+# Hashed asset names need `collectstatic`; bench_static.py runs it into a temp directory.
+# Elsewhere the app's own static directory stands in for STATIC_ROOT, so the lifespan's
+# collectstatic check passes without collecting anything.
+STORAGES = {**STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}
+STATIC_ROOT = BASE_DIR / 'todo' / 'static'
+
+SPA_SHELL_CACHE_SECONDS = 300
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+# The benchmarks drive many requests from one address; measure the app, not the limiter
+RATE_LIMITS = []
+API_MAX_CONCURRENT_REQUESTS = 0
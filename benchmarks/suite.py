@@ -0,0 +1,234 @@
+"""
+Benchmark suite for the API, run in-process against a seeded SQLite database.
+
+Drives todoproject.asgi.application (the real Starlette/FastAPI/Django stack, lifespan
+included) without a server, for each combination of tasks per user and concurrent
+clients. Each client is its own user. Scenarios run in order: login, list, create,
+patch, reorder, delete (the tasks create added). Results go out as JSON with throughput
+and p50/p95/p99 latency per scenario.
+
+    python benchmarks/suite.py [--sizes 100 1000] [--concurrency 1 10 50] [--requests 200] [--output results.json]
+    python benchmarks/suite.py --baseline results.json [--threshold 0.2]
+
+With --baseline, a row whose throughput fell or whose p95 rose by more than --threshold
+(a fraction), or that has more errors, is a regression and the exit status is 1.
+--current compares a saved file against the baseline without running anything.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from common import ASGIClient, access_token_for, create_user, seed_tasks, setup_django, summarize
+
+PASSWORD = 'Bench-pass-123'
+REORDER_WINDOW = 10
+
+
+class Client:
+    """One simulated user: an authenticated HTTP client plus the ids it works on."""
+
+    def __init__(self, app, user, task_ids):
+        self.username = user.username
+        self.anonymous = ASGIClient(app)
+        self.http = ASGIClient(app, headers={'authorization': f'Bearer {access_token_for(user)}'})
+        self.task_ids = task_ids
+        self.created = []
+
+
+async def login(client, i):
+    response = await client.anonymous.post(
+        '/api/auth/login', data={'username': client.username, 'password': PASSWORD}
+    )
+    return response.status_code == 200
+
+
+async def list_tasks(client, i):
+    response = await client.http.get('/api/tasks/')
+    return response.status_code == 200
+
+
+async def create(client, i):
+    response = await client.http.post('/api/tasks/', json_body={
+        'title': f'Benchmark task {i}', 'description': 'Created by the benchmark suite',
+        'priority': 'Medium', 'due_date': '2030-01-01',
+    })
+    if response.status_code != 201:
+        return False
+    client.created.append(response.json()['id'])
+    return True
+
+
+async def patch(client, i):
+    task_id = client.task_ids[i % len(client.task_ids)]
+    response = await client.http.patch(f'/api/tasks/{task_id}', json_body={'title': f'Patched {i}'})
+    return response.status_code == 200
+
+
+async def reorder(client, i):
+    window = client.task_ids[:REORDER_WINDOW]
+    # Rotate the first few tasks by one place each time
+    shift = i % len(window) + 1
+    response = await client.http.put('/api/tasks/order', json_body={'ids': window[shift:] + window[:shift]})
+    return response.status_code == 200
+
+
+async def delete(client, i):
+    if not client.created:
+        return False
+    response = await client.http.delete(f'/api/tasks/{client.created.pop()}')
+    return response.status_code == 204
+
+
+# (name, operation, share of --requests): a login is a deliberately slow password hash
+SCENARIOS = [
+    ('login', login, 0.1),
+    ('list', list_tasks, 1),
+    ('create', create, 1),
+    ('patch', patch, 1),
+    ('reorder', reorder, 1),
+    ('delete', delete, 1),
+]
+
+
+def prepare(app, size, concurrency):
+    from todo.models import Task
+
+    clients = []
+    for c in range(concurrency):
+        user = create_user(f'suite{size}x{concurrency}u{c}', PASSWORD)
+        seed_tasks(user, size)
+        task_ids = list(Task.objects.filter(owner=user).order_by('order').values_list('id', flat=True))
+        clients.append(Client(app, user, task_ids))
+    return clients
+
+
+async def run_scenario(clients, operation, total):
+    per_client = max(1, total // len(clients))
+    latencies, errors = [], 0
+
+    async def worker(client):
+        nonlocal errors
+        for i in range(per_client):
+            start = time.perf_counter()
+            ok = await operation(client, i)
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(client) for client in clients))
+    elapsed = time.perf_counter() - start
+    return {**summarize(latencies), 'errors': errors, 'throughput_rps': len(latencies) / elapsed}
+
+
+async def run(sizes, concurrency_levels, requests):
+    from todoproject.asgi import application
+
+    results = []
+    async with application.router.lifespan_context(application):
+        for size in sizes:
+            for concurrency in concurrency_levels:
+                clients = await asyncio.to_thread(prepare, application, size, concurrency)
+                for name, operation, share in SCENARIOS:
+                    total = max(concurrency, int(requests * share))
+                    stats = await run_scenario(clients, operation, total)
+                    row = {'scenario': name, 'tasks': size, 'concurrency': concurrency, **stats}
+                    print_row(row)
+                    results.append(row)
+    return results
+
+
+def metadata(args):
+    import django
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'sizes': args.sizes,
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+    }
+
+
+def print_row(row, file=sys.stderr):
+    print(f"{row['scenario']:<8} tasks={row['tasks']:<6} clients={row['concurrency']:<4} "
+          f"{row['throughput_rps']:8.1f} req/s  p50={row['p50_ms']:8.2f}ms  p95={row['p95_ms']:8.2f}ms  "
+          f"p99={row['p99_ms']:8.2f}ms  errors={row['errors']}", file=file)
+
+
+def compare(baseline, current, threshold):
+    """Print each row next to its baseline; returns the regressed rows' keys."""
+    def key(row):
+        return row['scenario'], row['tasks'], row['concurrency']
+
+    def change(new, old):
+        # Relative change; None when the baseline is zero (e.g. a row where every request failed)
+        return new / old - 1 if old else None
+
+    def percent(value):
+        return f'{value:+7.1%}' if value is not None else f'{"n/a":>7}'
+
+    previous = {key(row): row for row in baseline['results']}
+    regressions = []
+    for row in current['results']:
+        old = previous.get(key(row))
+        if old is None:
+            continue
+        throughput = change(row['throughput_rps'], old['throughput_rps'])
+        p95 = change(row['p95_ms'], old['p95_ms'])
+        regressed = ((throughput is not None and throughput < -threshold)
+                     or (p95 is not None and p95 > threshold) or row['errors'] > old['errors'])
+        if regressed:
+            regressions.append(key(row))
+        print(f"{'REGRESSION' if regressed else 'ok':<10} {row['scenario']:<8} tasks={row['tasks']:<6} "
+              f"clients={row['concurrency']:<4} throughput {percent(throughput)}  p95 {percent(p95)}  "
+              f"errors {old['errors']} -> {row['errors']}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario and combination')
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    parser.add_argument('--baseline', help='saved results to compare against')
+    parser.add_argument('--current', help='compare these saved results instead of running')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.current:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        setup_django()
+        current = {'meta': metadata(args), 'results': asyncio.run(run(args.sizes, args.concurrency, args.requests))}
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(current, f, indent=2)
+        else:
+            json.dump(current, sys.stdout, indent=2)
+            print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(baseline, current, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Task
+from .models import EmailOutbox, Task
 
 # Register your models here.
-admin.site.register(Task)
\ No newline at end of file
+admin.site.register(Task)
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('email_address', 'kind', 'state', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('state', 'kind')
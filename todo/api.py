@@ -1,18 +1,40 @@
 from fastapi.security import OAuth2PasswordBearer
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from django.conf import settings
 from django.contrib.auth.models import User
-from fastapi import FastAPI, APIRouter, HTTPException, status, Depends
-from pydantic import BaseModel, Field
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, APIRouter, HTTPException, status, Depends, Query, Request, Response, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, Field, TypeAdapter
 from typing import List, Optional
+from typing_extensions import TypedDict
 from datetime import datetime, date
+import asyncio
+import time
 from asgiref.sync import sync_to_async
 
 # Importing authentication API module
-from . import auth_api
+from . import auth_api, metrics, profiling, replicas
 
 # Importing Django models
-from .models import Task, Profile
+from .models import STATS_STATE_FIELDS, Task, Profile
+from .cache import user_cache
+from .middleware import DatabaseThreadPool, ThreadSensitiveMiddleware
+from .ratelimit import RateLimitMiddleware
+from .pagination import TASK_LIST_ORDERING, after_task_cursor, task_cursor
+from .ordering import ORDER_STEP, next_order, move_task, reorder_tasks
+from .events import get_broker, publish
+from .transfer import export_tasks, import_tasks
+from .search import search_tasks
+from .stats import PRIORITY_COUNTERS, STATUS_COUNTERS, get_stats, record_changes
+from .sync import changes_since, record_deletions
+from .tokens import access_token_from_scope
+from .versioning import abump_version, aget_version, bump_version, etag_headers, make_etag, not_modified
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
@@ -40,6 +62,24 @@ class TaskDisplay(TaskBase):
     class Config:
         from_attributes = True 
         
+class TaskRow(TypedDict):
+    """TaskDisplay as a plain dict, for serializing values_list() rows without model instances"""
+    title: str
+    description: str
+    priority: str
+    due_date: date
+    status: str
+    order: float
+    id: int
+    is_completed: bool
+    completed_at: Optional[datetime]
+    created_at: datetime
+    updated_at: datetime
+
+# Column order of TaskRow (and of TaskDisplay's JSON output)
+TASK_ROW_FIELDS = tuple(TaskRow.__annotations__)
+task_rows_adapter = TypeAdapter(List[TaskRow])
+
 class ProfileBase(BaseModel):
     full_name: Optional[str] = None
     bio: Optional[str] = None
@@ -63,43 +103,279 @@ class TaskUpdate(BaseModel):
     # NEW: Allow updating order via PATCH (for drag & drop)
     order: Optional[float] = None 
 
+class TaskBatchUpdate(TaskUpdate):
+    id: int
+
+class TaskBatch(BaseModel):
+    """Creates, partial updates and deletes applied together in one transaction"""
+    create: List[TaskBase] = Field(default_factory=list, max_length=500)
+    update: List[TaskBatchUpdate] = Field(default_factory=list, max_length=500)
+    delete: List[int] = Field(default_factory=list, max_length=500)
+
+class TaskBatchResult(BaseModel):
+    op: str
+    status: int
+    id: Optional[int] = None
+    task: Optional[TaskDisplay] = None
+    detail: Optional[str] = None
+
+class TaskBatchResponse(BaseModel):
+    results: List[TaskBatchResult]
+
+class TaskChanges(BaseModel):
+    """Delta since a sync cursor; pass `cursor` back as `since` next time"""
+    changed: List[TaskDisplay]
+    deleted: List[int]
+    cursor: str
+    has_more: bool
+
+class TaskImportResult(BaseModel):
+    created: int
+    failed: int
+    errors: List[dict]
+
+class TaskMove(BaseModel):
+    """Place the task directly after `after_id`; null moves it to the top of the list"""
+    after_id: Optional[int] = None
+
+class TaskReorder(BaseModel):
+    """Task ids in their new relative order"""
+    ids: List[int] = Field(..., min_length=1, max_length=5000)
+
+class TaskOrder(BaseModel):
+    id: int
+    order: float
+
+    class Config:
+        from_attributes = True
+
+class TaskStatsDisplay(BaseModel):
+    total: int
+    by_status: dict[str, int]
+    by_priority: dict[str, int]
+    overdue: int
+    completed_this_week: int
+
+    @classmethod
+    def from_stats(cls, stats):
+        return cls(
+            total=stats.total,
+            by_status={value: getattr(stats, field) for value, field in STATUS_COUNTERS.items()},
+            by_priority={value: getattr(stats, field) for value, field in PRIORITY_COUNTERS.items()},
+            overdue=stats.overdue,
+            completed_this_week=stats.completed_this_week,
+        )
+
 
 # --- API Router ---
 router = APIRouter()
 
 # --- Dependencies ---
 
-@sync_to_async
-def get_user_from_token(token: str):
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Invalid authentication credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+class TokenPrincipal(TokenUser):
+    """A TokenUser whose id is the integer primary key (simplejwt signs the claim as a string)."""
+
+    @cached_property
+    def id(self):
+        return int(self.token[jwt_settings.USER_ID_CLAIM])
+
+def decode_token(token: str):
     try:
-        access_token = AccessToken(token)
-        user = User.objects.get(id=access_token['user_id'])
-        return user
-    except (InvalidToken, TokenError, User.DoesNotExist):
+        return AccessToken(token)
+    except (InvalidToken, TokenError):
         return None
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    user = await get_user_from_token(token)
+async def get_user_from_token(access_token):
+    try:
+        user = await User.objects.aget(id=access_token[jwt_settings.USER_ID_CLAIM])
+    except User.DoesNotExist:
+        return None
+    return user if user.is_active else None
+
+async def get_cached_user(access_token):
+    """
+    Resolve the full User for a token, going to the database only on a cache miss.
+    Entries are keyed on (user_id, jti) and dropped when the user is saved or deleted.
+    """
+    key = (int(access_token[jwt_settings.USER_ID_CLAIM]), access_token.get(jwt_settings.JTI_CLAIM))
+    user = user_cache.get(key)
+    if user is None:
+        user = await get_user_from_token(access_token)
+        if user is not None:
+            user_cache.set(key, user)
+    return user
+
+# The dependencies below take `token` for the OpenAPI security scheme and its 401 when the
+# header is missing, but use the token already decoded for this request (todo.tokens)
+
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)):
+    """Full User model for endpoints that need more than the id (e.g. the profile)."""
+    access_token = access_token_from_scope(request.scope)
+    user = await get_cached_user(access_token) if access_token else None
     if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise credentials_exception
     return user
 
-@sync_to_async
-def get_task_or_404(task_id: int):
+async def get_staff_user(current_user: User = Depends(get_current_user)):
+    if not current_user.is_staff:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Staff only")
+    return current_user
+
+async def get_current_principal(request: Request, token: str = Depends(oauth2_scheme)):
+    """
+    Identity for the task endpoints. In the default "stateless" mode we trust the signed
+    user_id claim and never touch the database; "database" mode resolves the full User.
+    """
+    access_token = access_token_from_scope(request.scope)
+    if not access_token:
+        raise credentials_exception
+    if settings.API_AUTH_MODE == 'stateless':
+        return TokenPrincipal(access_token)
+    user = await get_cached_user(access_token)
+    if not user:
+        raise credentials_exception
+    return user
+
+def replica_reads(get_user):
+    """
+    An auth dependency for read-only endpoints: `get_user`, after which the request's
+    queries may go to a read replica unless the user wrote recently (todo.replicas).
+    """
+    async def dependency(current_user = Depends(get_user)):
+        await replicas.use_replica(current_user.id)
+        return current_user
+    return dependency
+
+get_reading_principal = replica_reads(get_current_principal)
+get_reading_user = replica_reads(get_current_user)
+
+async def get_task_or_404(task_id: int, owner_id: int):
+    # Scoped to the owner, so someone else's task is indistinguishable from a missing one
     try:
-        return Task.objects.select_related('owner').get(pk=task_id)
+        return await Task.objects.aget(pk=task_id, owner_id=owner_id)
     except Task.DoesNotExist:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")    
     
+@sync_to_async
+def apply_task_batch(owner_id: int, batch: TaskBatch):
+    """
+    Apply a TaskBatch with a constant number of queries: one ownership lookup, one
+    bulk_create, one bulk_update, one DELETE and one TaskStats update, all inside a
+    single transaction.
+    """
+    results = []
+    with transaction.atomic():
+        ids = [item.id for item in batch.update] + batch.delete
+        owned = {task.id: task for task in Task.objects.select_for_update().filter(owner_id=owner_id, pk__in=ids)}
+        removed, added = [], []
+
+        # Creates: same defaults as create_task, appended in batch order
+        base_order = next_order(owner_id) if batch.create else None
+        new_tasks = []
+        for i, item in enumerate(batch.create):
+            task_dict = item.dict()
+            if task_dict.get('description') is None:
+                task_dict['description'] = ""
+            task_dict['status'] = 'Queue'
+            task_dict['order'] = base_order + i * ORDER_STEP
+            task = Task(owner_id=owner_id, **task_dict)
+            task.sync_status()
+            new_tasks.append(task)
+        Task.objects.bulk_create(new_tasks)
+        added += [task.stats_state() for task in new_tasks]
+        for task in new_tasks:
+            results.append(TaskBatchResult(op="create", status=status.HTTP_201_CREATED, id=task.id, task=task))
+
+        # Updates: bulk_update skips save() and auto_now, so mirror them here
+        now = timezone.now()
+        changed, fields = [], {'is_completed', 'completed_at', 'updated_at'}
+        for item in batch.update:
+            task = owned.get(item.id)
+            if task is None:
+                results.append(TaskBatchResult(op="update", status=status.HTTP_404_NOT_FOUND, id=item.id, detail="Task not found"))
+                continue
+            removed.append(task.stats_state())
+            update_data = item.dict(exclude_unset=True, exclude={'id'})
+            for key, value in update_data.items():
+                setattr(task, key, value)
+            fields.update(update_data)
+            task.sync_status()
+            added.append(task.stats_state())
+            task.updated_at = now
+            changed.append(task)
+            results.append(TaskBatchResult(op="update", status=status.HTTP_200_OK, id=task.id, task=task))
+        if changed:
+            Task.objects.bulk_update(changed, sorted(fields))
+
+        deleted = [pk for pk in batch.delete if pk in owned]
+        if deleted:
+            Task.objects.filter(owner_id=owner_id, pk__in=deleted).delete()
+            record_deletions(owner_id, deleted)
+            removed += [owned[pk].stats_state() for pk in deleted]
+        for pk in batch.delete:
+            if pk in owned:
+                results.append(TaskBatchResult(op="delete", status=status.HTTP_204_NO_CONTENT, id=pk))
+            else:
+                results.append(TaskBatchResult(op="delete", status=status.HTTP_404_NOT_FOUND, id=pk, detail="Task not found"))
+        record_changes(owner_id, removed, added)
+        bump_version(owner_id)
+    return results
+
+# Pages longer than this are encoded and sent in chunks of this many rows
+TASK_LIST_CHUNK_SIZE = 1000
+
+def task_rows_json(rows):
+    """JSON array of TaskDisplay objects for value tuples in TASK_ROW_FIELDS order."""
+    return task_rows_adapter.dump_json([dict(zip(TASK_ROW_FIELDS, row)) for row in rows])
+
+def task_rows_response(rows, headers):
+    if len(rows) <= TASK_LIST_CHUNK_SIZE:
+        return Response(task_rows_json(rows), media_type="application/json", headers=headers)
+
+    def chunks():
+        for start in range(0, len(rows), TASK_LIST_CHUNK_SIZE):
+            # Strip each chunk's brackets and stitch the pieces into one array
+            yield (b"[" if start == 0 else b",") + task_rows_json(rows[start:start + TASK_LIST_CHUNK_SIZE])[1:-1]
+        yield b"]"
+
+    return StreamingResponse(chunks(), media_type="application/json", headers=headers)
+
+def task_payload(task):
+    return TaskDisplay.model_validate(task).model_dump(mode="json")
+
+async def publish_batch_events(owner_id, results):
+    for result in results:
+        if result.status == status.HTTP_201_CREATED:
+            await publish(owner_id, "task.created", task=result.task.model_dump(mode="json"))
+        elif result.status == status.HTTP_200_OK:
+            await publish(owner_id, "task.updated", task=result.task.model_dump(mode="json"))
+        elif result.status == status.HTTP_204_NO_CONTENT:
+            await publish(owner_id, "task.deleted", id=result.id)
+
+async def publish_reorder(owner_id, changed):
+    if changed:
+        await publish(owner_id, "tasks.reordered", tasks=[{"id": task.id, "order": task.order} for task in changed])
+
 # --- Endpoints ---
 
 @router.get("/profile", response_model=ProfileDisplay)
-async def get_profile(current_user: User = Depends(get_current_user)):
-    profile, _ = await sync_to_async(Profile.objects.get_or_create)(user=current_user)
+async def get_profile(request: Request, response: Response, current_user: User = Depends(get_reading_user)):
+    etag = make_etag(current_user.id, await aget_version(current_user.id), "profile")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers.update(etag_headers(etag))
+    try:
+        profile = await Profile.objects.aget(user=current_user)
+    except Profile.DoesNotExist:
+        # get_or_create always runs on the primary, so only look there when it's missing
+        profile, _ = await Profile.objects.aget_or_create(user=current_user)
     return {
         "username": current_user.username,
         "email": current_user.email,
@@ -111,11 +387,12 @@ async def get_profile(current_user: User = Depends(get_current_user)):
 
 @router.put("/profile", response_model=ProfileDisplay)
 async def update_profile(profile_data: ProfileBase, current_user: User = Depends(get_current_user)):
-    profile, _ = await sync_to_async(Profile.objects.get_or_create)(user=current_user)
+    profile, _ = await Profile.objects.aget_or_create(user=current_user)
     update_data = profile_data.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(profile, key, value)
-    await sync_to_async(profile.save)()
+    await profile.asave()
+    await abump_version(current_user.id)
     return {
         "username": current_user.username,
         "email": current_user.email,
@@ -125,73 +402,335 @@ async def update_profile(profile_data: ProfileBase, current_user: User = Depends
         "avatar_url": profile.avatar_url
     }
 
+@sync_to_async
+def insert_task(owner_id: int, task_dict: dict):
+    # New tasks go to the end of the list, one ORDER_STEP after the current last task
+    with transaction.atomic():
+        task_dict['order'] = next_order(owner_id)
+        return Task.objects.create(owner_id=owner_id, **task_dict)
+
 @router.post("/", response_model=TaskDisplay, status_code=status.HTTP_201_CREATED)
-async def create_task(task_data: TaskBase, current_user: User = Depends(get_current_user)):
-    try:
-        task_dict = task_data.dict()
-        if task_dict.get('description') is None:
-            task_dict['description'] = ""
-        task_dict['status'] = 'Queue'
-        
-        # NEW: Automatically set order based on timestamp to ensure unique sort position
-        task_dict['order'] = datetime.now().timestamp()
-        
-        new_task = await sync_to_async(Task.objects.create)(owner=current_user, **task_dict)
-        return new_task
-    except Exception as e:
-        # Log the full error server-side (in a real app, use a logger)
-        print(f"Error creating task: {e}") 
-        # Return generic error to client
-        raise HTTPException(status_code=500, detail="Internal Server Error")
+async def create_task(task_data: TaskBase, current_user: TokenPrincipal = Depends(get_current_principal)):
+    task_dict = task_data.dict()
+    if task_dict.get('description') is None:
+        task_dict['description'] = ""
+    task_dict['status'] = 'Queue'
+
+    new_task = await insert_task(current_user.id, task_dict)
+    await abump_version(current_user.id)
+    await publish(current_user.id, "task.created", task=task_payload(new_task))
+    return new_task
 
 @router.get("/", response_model=List[TaskDisplay])
-async def list_tasks(current_user: User = Depends(get_current_user)):
-    # Tasks are auto-sorted by 'order' because we added "ordering = ['order']" in models.py
-    tasks = await sync_to_async(list)(Task.objects.filter(owner=current_user))
+async def list_tasks(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=5000),
+    status_filter: Optional[str] = Query(None, alias="status", pattern='^(Queue|In Progress|Completed|Aborted)$'),
+    priority: Optional[str] = Query(None, pattern='^(Low|Medium|High)$'),
+    due_after: Optional[date] = None,
+    due_before: Optional[date] = None,
+    current_user: TokenPrincipal = Depends(get_reading_principal),
+):
+    """
+    One page of the user's tasks in (order, -created_at, id) order. When there are more,
+    the opaque cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    etag = make_etag(current_user.id, await aget_version(current_user.id), "list", request.url.query)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    headers = etag_headers(etag)
+
+    tasks = Task.objects.filter(owner_id=current_user.id).order_by(*TASK_LIST_ORDERING)
+    if status_filter:
+        tasks = tasks.filter(status=status_filter)
+    if priority:
+        tasks = tasks.filter(priority=priority)
+    if due_after:
+        tasks = tasks.filter(due_date__gte=due_after)
+    if due_before:
+        tasks = tasks.filter(due_date__lte=due_before)
+    if cursor:
+        tasks = tasks.filter(after_task_cursor(cursor))
+
+    # Plain tuples encoded straight to JSON: no model instances, no per-row validation.
+    # Fetch one extra row to know whether another page follows.
+    rows = await sync_to_async(list)(tasks.values_list(*TASK_ROW_FIELDS)[:limit + 1])
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = dict(zip(TASK_ROW_FIELDS, rows[-1]))
+        headers["X-Next-Cursor"] = task_cursor(last["order"], last["created_at"], last["id"])
+    return task_rows_response(rows, headers)
+
+@router.get("/search", response_model=List[TaskDisplay])
+async def search(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: TokenPrincipal = Depends(get_current_principal),
+):
+    """
+    The user's tasks whose title or description contains every word of `q` (as a word
+    prefix), best matches first. The next page's cursor comes in X-Next-Cursor.
+
+    Only the newest 1000 matches are ranked and paged through. When more tasks matched,
+    the response carries `X-Search-Truncated: true`; a more specific query finds the rest.
+    """
+    tasks, next_cursor, truncated = await sync_to_async(search_tasks)(current_user.id, q, limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if truncated:
+        response.headers["X-Search-Truncated"] = "true"
     return tasks
 
+@router.get("/stats", response_model=TaskStatsDisplay)
+async def task_stats(current_user: TokenPrincipal = Depends(get_current_principal)):
+    """Task counts by status and priority, overdue and completed this week, from the user's counters row."""
+    stats = await sync_to_async(get_stats)(current_user.id)
+    return TaskStatsDisplay.from_stats(stats)
+
+@router.get("/changes", response_model=TaskChanges)
+async def list_changes(
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=1000),
+    current_user: TokenPrincipal = Depends(get_current_principal),
+):
+    """
+    Tasks created/updated and ids of tasks deleted since the `since` cursor. Without a
+    cursor this starts a full sync. Keep calling while `has_more` is true.
+    """
+    return await changes_since(current_user.id, since, limit)
+
+@router.get("/export")
+async def export(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_user: TokenPrincipal = Depends(get_current_principal),
+):
+    """Stream every task as NDJSON (one JSON object per line) or CSV."""
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    return StreamingResponse(
+        export_tasks(current_user.id, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="tasks.{format}"'},
+    )
+
+@router.post("/import", response_model=TaskImportResult)
+async def import_(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    current_user: TokenPrincipal = Depends(get_current_principal),
+):
+    """
+    Import tasks from an NDJSON or CSV request body (format taken from the query string or
+    the Content-Type), parsed and inserted in chunks as it streams in. Invalid records are
+    skipped and reported; the valid ones are appended to the end of the list.
+    """
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    result = await import_tasks(current_user.id, request.stream(), format, TaskBase)
+    if result["created"]:
+        await abump_version(current_user.id)
+        await publish(current_user.id, "tasks.imported", count=result["created"])
+    return result
+
+@router.post("/batch", response_model=TaskBatchResponse)
+async def batch_tasks(batch: TaskBatch, current_user: TokenPrincipal = Depends(get_current_principal)):
+    ids = [item.id for item in batch.update] + batch.delete
+    if len(ids) != len(set(ids)):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Each task id may appear only once per batch")
+    results = await apply_task_batch(current_user.id, batch)
+    await publish_batch_events(current_user.id, results)
+    return {"results": results}
+
+@router.put("/order", response_model=List[TaskOrder])
+async def reorder(order_data: TaskReorder, current_user: TokenPrincipal = Depends(get_current_principal)):
+    """Apply a new ordering in one request; returns the tasks whose order changed."""
+    changed = await sync_to_async(reorder_tasks)(current_user.id, order_data.ids)
+    await publish_reorder(current_user.id, changed)
+    return changed
+
 @router.get("/{task_id}", response_model=TaskDisplay)
-async def get_task(task_id: int, current_user: User = Depends(get_current_user)):
-    task = await get_task_or_404(task_id)
-    if task.owner != current_user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+async def get_task(task_id: int, request: Request, response: Response, current_user: TokenPrincipal = Depends(get_reading_principal)):
+    etag = make_etag(current_user.id, await aget_version(current_user.id), "task", task_id)
+    cached = not_modified(request, etag)
+    # The tag doesn't say whether the task exists (If-None-Match: * matches anything), so a
+    # 304 still needs an owned row; the primary key lookup is cheaper than loading it
+    if cached and await Task.objects.filter(pk=task_id, owner_id=current_user.id).aexists():
+        return cached
+    task = await get_task_or_404(task_id, current_user.id)
+    response.headers.update(etag_headers(etag))
     return task
 
-@router.put("/{task_id}", response_model=TaskDisplay)
-async def update_task(task_id: int, task_data: TaskBase, current_user: User = Depends(get_current_user)):
-    task = await get_task_or_404(task_id)
-    if task.owner != current_user:
+@sync_to_async
+def update_owned_task(owner_id: int, task_id: int, changes: dict):
+    """Apply `changes` with one UPDATE ... RETURNING scoped to the owner; 404 if nothing matched."""
+    # As in create_task, a missing description is an empty one; the other columns need a value
+    if 'description' in changes and changes['description'] is None:
+        changes['description'] = ""
+    nulls = sorted(key for key, value in changes.items() if value is None and not Task._meta.get_field(key).null)
+    if nulls:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"{', '.join(nulls)} may not be null")
+    tasks = Task.objects.filter(pk=task_id, owner_id=owner_id)
+    if not changes.keys() & set(STATS_STATE_FIELDS):
+        # Title, description or order only: the stats can't change, a single statement will do
+        updated = tasks.update_returning(**Task.status_updates(changes))
+    else:
+        with transaction.atomic():
+            old = tasks.select_for_update().values_list(*STATS_STATE_FIELDS).first()
+            updated = tasks.update_returning(**Task.status_updates(changes))
+            if updated:
+                record_changes(owner_id, removed=[old], added=[updated[0].stats_state()])
+    if not updated:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
-    
-    for key, value in task_data.dict().items():
-        setattr(task, key, value)
-    
-    await sync_to_async(task.save)()
+    return updated[0]
+
+@sync_to_async
+def delete_owned_task(owner_id: int, task_id: int):
+    with transaction.atomic():
+        deleted = Task.objects.filter(pk=task_id, owner_id=owner_id).delete_returning()
+        if not deleted:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+        record_deletions(owner_id, [task_id])
+        record_changes(owner_id, removed=[deleted[0].stats_state()])
+
+@router.put("/{task_id}", response_model=TaskDisplay)
+async def update_task(task_id: int, task_data: TaskBase, current_user: TokenPrincipal = Depends(get_current_principal)):
+    task = await update_owned_task(current_user.id, task_id, task_data.dict())
+    await abump_version(current_user.id)
+    await publish(current_user.id, "task.updated", task=task_payload(task))
     return task
 
 @router.patch("/{task_id}", response_model=TaskDisplay)
-async def partial_update_task(task_id: int, task_data: TaskUpdate, current_user: User = Depends(get_current_user)):
-    task = await get_task_or_404(task_id)
-    if task.owner != current_user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
-    
-    update_data = task_data.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(task, key, value)
-    
-    await sync_to_async(task.save)()
+async def partial_update_task(task_id: int, task_data: TaskUpdate, current_user: TokenPrincipal = Depends(get_current_principal)):
+    # Only the columns the client sent (plus the derived ones) are written
+    task = await update_owned_task(current_user.id, task_id, task_data.dict(exclude_unset=True))
+    await abump_version(current_user.id)
+    await publish(current_user.id, "task.updated", task=task_payload(task))
     return task
 
+@router.post("/{task_id}/move", response_model=List[TaskOrder])
+async def move(task_id: int, move_data: TaskMove, current_user: TokenPrincipal = Depends(get_current_principal)):
+    """Move a task next to another one; returns every task whose order changed (more than one after a rebalance)."""
+    changed = await sync_to_async(move_task)(current_user.id, task_id, move_data.after_id)
+    await publish_reorder(current_user.id, changed)
+    return changed
+
 @router.delete("/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_task(task_id: int, current_user: User = Depends(get_current_user)):
-    task = await get_task_or_404(task_id)
-    if task.owner != current_user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
-        
-    await sync_to_async(task.delete)()
+async def delete_task(task_id: int, current_user: TokenPrincipal = Depends(get_current_principal)):
+    await delete_owned_task(current_user.id, task_id)
+    await abump_version(current_user.id)
+    await publish(current_user.id, "task.deleted", id=task_id)
     return None
 
 # --- Main App ---
 api = FastAPI(title="Todo API", description="API for managing tasks")
+# ORM calls lease one of API_DB_THREADS long-lived threads while they run (0 = a new thread per request)
+db_threads = DatabaseThreadPool(settings.API_DB_THREADS) if settings.API_DB_THREADS else None
+api.add_middleware(ThreadSensitiveMiddleware, pool=db_threads)
+# Outermost: over-budget and excess requests are turned away before they touch the database
+api.add_middleware(RateLimitMiddleware)
+if db_threads:
+    metrics.register_gauge(
+        "todo_db_threads", "API DB thread pool: size, leased threads and waiting calls.", "state",
+        lambda: {key: value for key, value in db_threads.stats().items() if key in ("size", "busy", "waiting")},
+    )
 api.include_router(auth_api.router, prefix="/auth", tags=["Authentication"])
-api.include_router(router, prefix="/tasks", tags=["Tasks"])
\ No newline at end of file
+api.include_router(router, prefix="/tasks", tags=["Tasks"])
+
+@sync_to_async
+def database_health():
+    connection = connections['default']
+    start = time.perf_counter()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    health = {"vendor": connection.vendor, "ping_ms": round((time.perf_counter() - start) * 1000, 3)}
+    # Only the PostgreSQL backend has a pool (when OPTIONS["pool"] is set)
+    pool = getattr(connection, "pool", None)
+    if pool is not None:
+        health["pool"] = pool.get_stats()
+    return health
+
+@api.get("/health")
+async def health_check():
+    """Database reachability plus connection pool and DB thread pool metrics."""
+    body = {"status": "ok", "db_threads": db_threads.stats() if db_threads else None}
+    try:
+        body["database"] = await database_health()
+    except DatabaseError as e:
+        body.update(status="unavailable", database={"error": str(e)})
+        return JSONResponse(body, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return body
+
+@api.get("/profiles", dependencies=[Depends(get_staff_user)])
+async def list_profiles():
+    """Stored request profiles (see todo.profiling), newest first."""
+    return await asyncio.to_thread(profiling.store.list)
+
+@api.get("/profiles/{profile_id}", dependencies=[Depends(get_staff_user)])
+async def download_profile(profile_id: str, format: str = Query("json", pattern="^(json|folded)$")):
+    """One profile as JSON, or its samples as collapsed stacks for flame graph tools."""
+    profile = await asyncio.to_thread(profiling.store.load, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    headers = {"Content-Disposition": f'attachment; filename="{profile_id}.{"txt" if format == "folded" else "json"}"'}
+    if format == "folded":
+        body = "".join(f"{stack} {count}\n" for stack, count in profile["samples"].items())
+        return Response(body, media_type="text/plain", headers=headers)
+    return JSONResponse(profile, headers=headers)
+
+@api.websocket("/ws")
+async def task_events(websocket: WebSocket, token: str = Query(...)):
+    """
+    Push channel for the user's task changes on other devices. Browsers cannot set headers
+    on a WebSocket, so the access token comes in the query string. A client that falls
+    too far behind is disconnected (1013) and should reconnect and resync. The socket is
+    closed with 1008 when the token expires or the user is deactivated; reconnect with a
+    fresh token.
+    """
+    access_token = decode_token(token)
+    user = await get_cached_user(access_token) if access_token else None
+    if not user:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    subscription = get_broker().subscribe(user.id)
+    signed_out = False
+
+    async def wait_for_disconnect():
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            subscription.close()
+
+    async def watch_credentials():
+        # The token is only checked on connect otherwise. Deactivation is seen within
+        # EVENTS_AUTH_RECHECK_SECONDS (plus the user cache's TTL on other workers).
+        nonlocal signed_out
+        while True:
+            remaining = access_token['exp'] - time.time()
+            await asyncio.sleep(max(0, min(remaining, settings.EVENTS_AUTH_RECHECK_SECONDS)))
+            if access_token['exp'] <= time.time() or await get_cached_user(access_token) is None:
+                signed_out = True
+                subscription.close()
+                return
+
+    reader = asyncio.create_task(wait_for_disconnect())
+    watcher = asyncio.create_task(watch_credentials())
+    try:
+        async for event in subscription:
+            if signed_out:
+                break
+            await websocket.send_json(event)
+        if signed_out:
+            await websocket.close(code=1008)
+        elif subscription.dropped:
+            await websocket.close(code=1013)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        subscription.close()
+        reader.cancel()
+        watcher.cancel()
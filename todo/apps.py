@@ -1,6 +1,45 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class TodoConfig(AppConfig):
+    # This module may also hold DeferredSocialAccountConfig, so say which config is the app's
+    default = True
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'todo'
+
+    def ready(self):
+        from . import metrics, profiling
+        from .search import repair_search_index
+
+        post_migrate.connect(repair_search_index, sender=self)
+        connection_created.connect(metrics.install_query_wrapper)
+        connection_created.connect(profiling.install_query_wrapper)
+
+
+def deferred_social_account_config():
+    from allauth.socialaccount.apps import SocialAccountConfig
+
+    class DeferredSocialAccountConfig(SocialAccountConfig):
+        """
+        allauth.socialaccount without the eager provider import in ready(): every provider
+        module (and what it imports, requests included) loads when the social account URLs
+        first ask the registry for its providers, not on every worker boot. Used when
+        LEAN_STARTUP is on.
+        """
+
+        def ready(self):
+            from allauth.socialaccount import checks  # noqa: F401
+
+    DeferredSocialAccountConfig.__module__ = __name__
+    DeferredSocialAccountConfig.__qualname__ = 'DeferredSocialAccountConfig'
+    return DeferredSocialAccountConfig
+
+
+def __getattr__(name):
+    # Built on first use, so loading TodoConfig doesn't import allauth.socialaccount
+    if name == 'DeferredSocialAccountConfig':
+        globals()[name] = deferred_social_account_config()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
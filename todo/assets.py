@@ -0,0 +1,205 @@
+"""
+Static assets and the SPA shell, served without going through Django.
+
+`collectstatic` with CompressedManifestStaticFilesStorage writes every asset under a
+content-hashed name (todo/script.3f2a9c1b7d4e.js) plus a gzip copy of the text assets.
+StaticAssets serves STATIC_ROOT from the ASGI app: hashed names are cached by browsers
+and proxies for a year (a changed file gets a new name), the .gz copy is sent to clients
+that accept gzip, and Range requests and conditional GETs are answered by Starlette's
+FileResponse, which hands the file to the server via the `http.response.pathsend`
+extension where the server supports it. With DEBUG the app directories are searched
+too, so nothing has to be collected during development; without DEBUG the server refuses
+to start until STATIC_ROOT exists.
+
+ShellCache answers GET / for visitors without a session from a copy of the page Django
+rendered last, so page loads cost no template rendering or middleware.
+"""
+import gzip
+import os
+import re
+import time
+
+import anyio
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from starlette.datastructures import Headers
+from starlette.staticfiles import StaticFiles
+
+COMPRESSIBLE = ('.css', '.js', '.mjs', '.map', '.json', '.svg', '.html', '.txt', '.xml')
+# Names written by ManifestStaticFilesStorage: <name>.<12 hex digits>.<ext>
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def accepts_gzip(headers):
+    for coding in headers.get('accept-encoding', '').split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() == 'gzip':
+            try:
+                return float(params.strip().removeprefix('q=') or 1) > 0
+            except ValueError:
+                return True
+    return False
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also writes <name>.gz next to each text asset."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as f:
+            content = f.read()
+        # mtime=0 so the same input always gives the same bytes
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) < len(content):
+            with open(path + '.gz', 'wb') as f:
+                f.write(compressed)
+        elif os.path.exists(path + '.gz'):
+            os.remove(path + '.gz')
+
+
+class StaticAssets(StaticFiles):
+    """ASGI app serving the collected static files as described in the module docstring."""
+
+    def __init__(self, directory=None, use_finders=None):
+        super().__init__(directory=directory or settings.STATIC_ROOT, check_dir=False)
+        self.use_finders = settings.DEBUG if use_finders is None else use_finders
+
+    def check_collected(self):
+        """Raise ImproperlyConfigured if there is nothing to serve; the ASGI lifespan calls it at startup."""
+        if not self.use_finders and not os.path.isdir(self.directory):
+            raise ImproperlyConfigured(
+                f"STATIC_ROOT ({self.directory}) does not exist. Run `python manage.py collectstatic` "
+                "before starting the server, or set DEBUG to serve the files from the app directories."
+            )
+
+    async def check_config(self):
+        # A missing directory answers 404 (Starlette would raise, i.e. 500, on every request);
+        # check_collected() reports it once at startup. With finders nothing needs collecting.
+        if os.path.isdir(self.directory):
+            await super().check_config()
+
+    def lookup_path(self, path):
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is None and self.use_finders:
+            try:
+                found = finders.find(path)
+            except SuspiciousFileOperation:
+                found = None
+            if found:
+                return found, os.stat(found)
+        return full_path, stat_result
+
+    async def get_response(self, path, scope):
+        headers = Headers(scope=scope)
+        # Ranges are offsets into the uncompressed file, so those requests get the original
+        if scope['method'] in ('GET', 'HEAD') and path.endswith(COMPRESSIBLE) and 'range' not in headers and accepts_gzip(headers):
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + '.gz')
+            if stat_result is not None:
+                return self.file_response(full_path, stat_result, scope, encoding='gzip', name=path)
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result, scope, status_code=200, encoding=None, name=None):
+        name = name or os.path.basename(full_path)
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if encoding:
+            # The content type is already the original's: mimetypes reads x.js.gz as gzipped JS
+            response.headers['content-encoding'] = encoding
+        if name.endswith(COMPRESSIBLE):
+            response.headers['vary'] = 'Accept-Encoding'
+        # Anything without a hash in its name may change under the same URL: revalidate it
+        response.headers['cache-control'] = IMMUTABLE if HASHED_NAME.search(name) else 'no-cache'
+        return response
+
+
+class ShellCache:
+    """
+    ASGI app in front of Django for the SPA shell's URL. The first anonymous GET goes to
+    Django; a 200 response that sets no cookies and isn't private is then replayed for
+    `max_age` seconds to requests without a session cookie, Origin or query string (gzipped if
+    accepted, 304 for a matching If-None-Match). Everything else goes to Django.
+    """
+
+    def __init__(self, app, max_age=None):
+        self.app = app
+        self.max_age = settings.SPA_SHELL_CACHE_SECONDS if max_age is None else max_age
+        self.entry = None
+
+    def cacheable_request(self, scope):
+        if not self.max_age or scope['method'] not in ('GET', 'HEAD') or scope['query_string']:
+            return False
+        headers = Headers(scope=scope)
+        # CORS headers depend on Origin, so only plain navigations share the copy
+        return 'origin' not in headers and f'{settings.SESSION_COOKIE_NAME}=' not in headers.get('cookie', '')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.cacheable_request(scope):
+            await self.app(scope, receive, send)
+            return
+        entry = self.entry
+        if entry is not None and entry['expires'] > time.monotonic():
+            await self.replay(entry, scope, send)
+            return
+        if scope['method'] != 'GET':
+            await self.app(scope, receive, send)
+            return
+
+        start, chunks = None, []
+
+        async def capture(message):
+            nonlocal start
+            if message['type'] == 'http.response.start':
+                start = message
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+                if not message.get('more_body', False):
+                    self.store(start, b''.join(chunks))
+            await send(message)
+
+        await self.app(scope, receive, capture)
+
+    def store(self, start, body):
+        headers = [(key.lower(), value) for key, value in start.get('headers', [])]
+        names = {key for key, _ in headers}
+        cache_control = dict(headers).get(b'cache-control', b'').lower()
+        if (start['status'] != 200 or b'set-cookie' in names or b'content-encoding' in names
+                or b'private' in cache_control or b'no-store' in cache_control):
+            return
+        vary = b', '.join(filter(None, [dict(headers).get(b'vary'), b'Accept-Encoding']))
+        headers = [(key, value) for key, value in headers if key not in (b'content-length', b'vary')]
+        self.entry = {
+            'headers': headers + [(b'vary', vary)],
+            'body': body,
+            'gzip': gzip.compress(body, mtime=0),
+            'etag': dict(headers).get(b'etag'),
+            'expires': time.monotonic() + self.max_age,
+        }
+
+    async def replay(self, entry, scope, send):
+        headers = Headers(scope=scope)
+        etag = entry['etag'].decode() if entry['etag'] else None
+        response_headers = entry['headers']
+        if etag and etag in [tag.strip().removeprefix('W/') for tag in headers.get('if-none-match', '').split(',')]:
+            status, body = 304, b''
+            response_headers = [(key, value) for key, value in response_headers if key != b'content-type']
+        else:
+            status, body = 200, entry['body']
+            if accepts_gzip(headers):
+                body = entry['gzip']
+                # Like GZipMiddleware: the compressed bytes only match the ETag weakly
+                response_headers = [(key, value) for key, value in response_headers if key != b'etag']
+                response_headers += [(b'content-encoding', b'gzip')] + ([(b'etag', f'W/{etag}'.encode())] if etag else [])
+            response_headers = response_headers + [(b'content-length', str(len(body)).encode())]
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+        await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else body})
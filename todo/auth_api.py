@@ -1,12 +1,24 @@
 # todo/auth_api.py
+import contextvars
+import functools
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth import get_backends, get_user_model
+from django.contrib.auth.base_user import AbstractBaseUser
+from django.contrib.auth.hashers import identify_hasher, get_hasher
 from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_login_failed
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
 from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
 from pydantic import BaseModel
 
+from . import hashing, outbox, tokens
+from .outbox import enqueue_confirmation
+
 User = get_user_model()
 router = APIRouter()
 
@@ -19,38 +31,114 @@ class Token(BaseModel):
     access: str
     refresh: str
 
+class RefreshRequest(BaseModel):
+    refresh: str
+
+invalid_refresh_token = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Invalid or expired refresh token",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
 @sync_to_async
 def get_tokens_for_user(user):
-    refresh = RefreshToken.for_user(user)
-    return {
-        'access': str(refresh.access_token),
-        'refresh': str(refresh),
-    }
+    return tokens.issue_tokens(user)
 
-@router.post("/register", status_code=status.HTTP_201_CREATED)
-async def register_user(user_data: UserCreate):
-    try:
-        user = await sync_to_async(User.objects.create_user)(
-            username=user_data.username,
-            password=user_data.password,
-            email=user_data.email
+# Set while login_candidates() runs the configured backends: a password check records the
+# user it was asked about and fails, and the dummy hash for an unknown user is skipped, so
+# the backends only look users up. The hashes then run on the hashing pool.
+_recorded_users = contextvars.ContextVar('recorded_users', default=None)
+
+def _recording(check_password, set_password):
+    @functools.wraps(check_password)
+    def recording_check_password(user, raw_password):
+        recorded = _recorded_users.get()
+        if recorded is None:
+            return check_password(user, raw_password)
+        recorded.append(user)
+        return False
+
+    @functools.wraps(set_password)
+    def recording_set_password(user, raw_password):
+        if _recorded_users.get() is None:
+            set_password(user, raw_password)
+
+    return recording_check_password, recording_set_password
+
+AbstractBaseUser.check_password, AbstractBaseUser.set_password = _recording(
+    AbstractBaseUser.check_password, AbstractBaseUser.set_password
+)
+
+@sync_to_async
+def login_candidates(username, password):
+    """
+    (user, backend) for each user the configured backends would check the password of,
+    in their order. Each user is listed once, so a wrong password costs one hash per
+    distinct account, not per lookup.
+    """
+    candidates, seen = [], set()
+    for backend in get_backends():
+        recorded = []
+        token = _recorded_users.set(recorded)
+        try:
+            backend.authenticate(None, username=username, password=password)
+        except PermissionDenied:
+            break
+        finally:
+            _recorded_users.reset(token)
+        for user in recorded:
+            if user.pk not in seen:
+                seen.add(user.pk)
+                candidates.append((user, backend))
+    return candidates
+
+async def authenticate_user(username, password):
+    """`authenticate()` for the API with the password hashes run on the hashing pool."""
+    candidates = await login_candidates(username, password)
+    if not candidates:
+        # Hash anyway so unknown usernames take as long as wrong passwords
+        await hashing.make_password(password)
+    for user, backend in candidates:
+        if await hashing.check_password(password, user.password) and backend.user_can_authenticate(user):
+            preferred = get_hasher()
+            if identify_hasher(user.password).algorithm != preferred.algorithm or preferred.must_update(user.password):
+                # Upgrade the stored hash like User.check_password() would
+                user.password = await hashing.make_password(password)
+                await user.asave(update_fields=['password'])
+            return user
+    await sync_to_async(user_login_failed.send)(
+        sender=__name__, credentials={'username': username, 'password': '********'}, request=None
+    )
+    return None
+
+@sync_to_async
+def create_account(user_data: UserCreate, encoded_password):
+    """Create the user, its allauth EmailAddress and the queued confirmation email atomically."""
+    # Imported here so allauth models load after the app registry is ready
+    from allauth.account.models import EmailAddress
+
+    with transaction.atomic():
+        # What create_user() does, with the password already hashed on the hashing pool
+        user = User(
+            username=User.normalize_username(user_data.username),
+            email=User.objects.normalize_email(user_data.email),
+            password=encoded_password
         )
-        
-        # Create EmailAddress for allauth
-        from allauth.account.models import EmailAddress
-        
-        email_address = await sync_to_async(EmailAddress.objects.create)(
+        user.save()
+        email_address = EmailAddress.objects.create(
             user=user,
             email=user.email,
             primary=True,
             verified=False
         )
-        
-        # Send confirmation email
-        # We pass request=None, relying on the Sites framework
-        await sync_to_async(email_address.send_confirmation)(request=None)
-        
-        return {"username": user.username, "email": user.email}
+        enqueue_confirmation(email_address)
+    return user
+
+@router.post("/register", status_code=status.HTTP_201_CREATED)
+async def register_user(user_data: UserCreate):
+    encoded_password = await hashing.make_password(user_data.password)
+    try:
+        user = await create_account(user_data, encoded_password)
     except Exception as e:
         # Log error server-side
         print(f"Registration error: {e}")
@@ -58,13 +146,13 @@ async def register_user(user_data: UserCreate):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Registration failed. Please check your input."
         )
+    # The confirmation email is sent by the outbox dispatcher, not on the request path
+    outbox.notify()
+    return {"username": user.username, "email": user.email}
 
 @router.post("/login", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = await sync_to_async(authenticate)(
-        username=form_data.username, 
-        password=form_data.password
-    )
+    user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -72,4 +160,22 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             headers={"WWW-Authenticate": "Bearer"},
         )
     tokens = await get_tokens_for_user(user)
-    return tokens
\ No newline at end of file
+    return tokens
+
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(body: RefreshRequest):
+    """Trade a refresh token for a new access token (and, with rotation, a new refresh token)."""
+    try:
+        return await tokens.refresh_tokens(body.refresh)
+    except TokenError:
+        raise invalid_refresh_token
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(body: RefreshRequest):
+    """Revoke a refresh token. Access tokens already issued stay valid until they expire."""
+    try:
+        token = RefreshToken(body.refresh)
+    except TokenError:
+        raise invalid_refresh_token
+    await tokens.arevoke(token)
+    return None
@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class TTLCache:
+    """
+    A small, thread-safe, in-process LRU cache whose entries expire after `ttl` seconds.
+    It is shared between the event loop and the sync_to_async worker threads, so every
+    operation takes the lock.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            # Evict the least recently used entries once we are over capacity
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        """Drop every entry whose key matches `predicate`."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Full User rows for authenticated API requests, keyed on (user_id, token jti)
+user_cache = TTLCache(
+    maxsize=getattr(settings, 'API_USER_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'API_USER_CACHE_TTL', 60),
+)
+
+# Access tokens handed to Django sessions by the index page, keyed on (user_id, session key);
+# entries expire on their own once half the token's lifetime is gone (todo.tokens)
+session_token_cache = TTLCache(maxsize=getattr(settings, 'SESSION_TOKEN_CACHE_SIZE', 4096))
+
+
+def invalidate_user(user_id):
+    """Forget every cached entry for a user (e.g. after deactivation or a password change)."""
+    user_cache.delete_where(lambda key: key[0] == user_id)
+    session_token_cache.delete_where(lambda key: key[0] == user_id)
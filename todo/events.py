@@ -0,0 +1,150 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections import defaultdict
+from contextlib import closing
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """One client's bounded queue of events. Iterating ends once the subscription is closed."""
+
+    def __init__(self, broker, user_id, maxsize):
+        self.broker = broker
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.closed = False
+        self.dropped = False
+
+    def offer(self, event):
+        """Queue an event without waiting; a consumer that has fallen behind is dropped."""
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped = True
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.broker.unsubscribe(self)
+        # Wake up a consumer blocked in __anext__; if the queue is full it is already awake
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed and self.queue.empty():
+            raise StopAsyncIteration
+        event = await self.queue.get()
+        if event is None or self.dropped:
+            raise StopAsyncIteration
+        return event
+
+
+class InProcessBroker:
+    """Per-user fan-out of task events to the subscribers in this process."""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id, self.queue_size)
+        self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+
+    def deliver(self, user_id, event):
+        for subscription in list(self._subscribers.get(user_id, ())):
+            subscription.offer(event)
+
+    async def publish(self, user_id, event):
+        self.deliver(user_id, event)
+
+
+class SQLiteBroker(InProcessBroker):
+    """
+    Stand-in for a shared bus when running several workers on one host: events are
+    appended to a SQLite file that every worker polls, and each worker fans them out
+    to its own subscribers. Swap in a real bus (Redis, NATS, ...) for multi-host setups.
+    """
+
+    def __init__(self, path, queue_size=100, poll_interval=0.2, retention=60):
+        super().__init__(queue_size=queue_size)
+        self.path = str(path)
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._last_id = None
+        self._poller = None
+        with closing(self._connect()) as db, db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS events ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, payload TEXT, created REAL)'
+            )
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=5)
+        db.execute('PRAGMA journal_mode=WAL')
+        return db
+
+    def _append(self, user_id, payload):
+        with closing(self._connect()) as db, db:
+            db.execute('INSERT INTO events (user_id, payload, created) VALUES (?, ?, ?)', (user_id, payload, time.time()))
+            db.execute('DELETE FROM events WHERE created < ?', (time.time() - self.retention,))
+
+    def _read(self, last_id):
+        with closing(self._connect()) as db:
+            if last_id is None:
+                return db.execute('SELECT COALESCE(MAX(id), 0), NULL, NULL FROM events').fetchall()
+            return db.execute('SELECT id, user_id, payload FROM events WHERE id > ? ORDER BY id', (last_id,)).fetchall()
+
+    def subscribe(self, user_id):
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.get_running_loop().create_task(self._poll())
+        return super().subscribe(user_id)
+
+    async def publish(self, user_id, event):
+        await asyncio.to_thread(self._append, user_id, json.dumps(event))
+
+    async def _poll(self):
+        while self._subscribers:
+            for row_id, user_id, payload in await asyncio.to_thread(self._read, self._last_id):
+                self._last_id = row_id
+                if payload is not None:
+                    self.deliver(user_id, json.loads(payload))
+            await asyncio.sleep(self.poll_interval)
+        # Nobody is listening; the next subscriber starts from the newest event again
+        self._last_id = None
+
+
+_broker = None
+
+
+def get_broker():
+    """The broker configured by EVENTS_BROKER / EVENTS_BROKER_OPTIONS, created on first use."""
+    global _broker
+    if _broker is None:
+        broker_class = import_string(getattr(settings, 'EVENTS_BROKER', 'todo.events.InProcessBroker'))
+        _broker = broker_class(**getattr(settings, 'EVENTS_BROKER_OPTIONS', {}))
+    return _broker
+
+
+async def publish(user_id, event_type, **data):
+    await get_broker().publish(user_id, {"type": event_type, **data})
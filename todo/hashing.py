@@ -0,0 +1,95 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import hashers
+from fastapi import HTTPException, status
+
+# Seconds a client is asked to wait after being turned away
+RETRY_AFTER = 1
+
+
+class HashingOverloaded(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-in requests, please retry shortly",
+            headers={"Retry-After": str(RETRY_AFTER)},
+        )
+
+
+def _init_worker(password_hashers):
+    # Workers only need the hasher configuration, not the whole project; importing this
+    # module has usually loaded DJANGO_SETTINGS_MODULE already
+    if not settings.configured:
+        settings.configure(PASSWORD_HASHERS=password_hashers)
+
+
+def _verify(password, encoded):
+    return hashers.check_password(password, encoded)
+
+
+def _make(password):
+    return hashers.make_password(password)
+
+
+class PasswordHasherPool:
+    """
+    Runs the deliberately slow password hashes in a few worker processes, so a burst of
+    logins can neither hold the GIL nor pile up threads next to the request handlers.
+    At most `workers` hashes run at once and `queue_size` more may wait; past that the
+    caller gets a 503 with Retry-After instead of joining an ever-growing backlog.
+
+    With `workers=0` hashes run in the request's sync_to_async thread, as before.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = None
+        self._admitted = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                # A forked child would inherit the event loop, threads and DB connections
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(settings.PASSWORD_HASHERS,),
+            )
+        return self._executor
+
+    async def run(self, fn, *args):
+        if not self.workers:
+            return await sync_to_async(fn)(*args)
+        if self._admitted >= self.workers + self.queue_size:
+            raise HashingOverloaded()
+        self._admitted += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._admitted -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+pool = PasswordHasherPool(
+    workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', min(4, os.cpu_count() or 1)),
+    queue_size=getattr(settings, 'PASSWORD_HASHING_QUEUE_SIZE', 32),
+)
+
+
+async def check_password(password, encoded):
+    return await pool.run(_verify, password, encoded)
+
+
+async def make_password(password):
+    return await pool.run(_make, password)
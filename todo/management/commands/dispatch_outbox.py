@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from todo.outbox import dispatch_batch
+
+
+class Command(BaseCommand):
+    help = "Send queued emails from the outbox, retrying failures with backoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain what is due now and exit")
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep when the outbox is empty")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = dispatch_batch(options['batch_size'])
+            if processed:
+                self.stdout.write(f"Processed {processed} email(s)")
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['interval'])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from todo.stats import reconcile_stats
+
+
+class Command(BaseCommand):
+    help = "Recount every user's task stats from their tasks and fix any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help="Only this user id (repeatable)")
+
+    def handle(self, *args, **options):
+        drifted = reconcile_stats(options['users'])
+        self.stdout.write(self.style.SUCCESS(f"Reconciled task stats, {drifted} user(s) had drifted"))
@@ -0,0 +1,51 @@
+import sqlite3
+import time
+from collections import deque
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Copy the SQLite primary to its replica file with a delay, to try replica reads locally"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='replica', help="Replica alias to write to")
+        parser.add_argument('--lag', type=float, default=2.0, help="Seconds the replica trails the primary")
+        parser.add_argument('--interval', type=float, default=0.5, help="Seconds between snapshots of the primary")
+        parser.add_argument('--once', action='store_true', help="Copy the primary once, without lag, and exit")
+
+    def handle(self, *args, **options):
+        primary, replica = settings.DATABASES['default'], settings.DATABASES.get(options['database'])
+        if replica is None or options['database'] not in settings.DATABASE_REPLICAS:
+            raise CommandError(f"{options['database']!r} is not in DATABASE_REPLICAS")
+        if 'sqlite3' not in primary['ENGINE'] or 'sqlite3' not in replica['ENGINE']:
+            raise CommandError("Replication can only be simulated between SQLite databases")
+
+        if options['once']:
+            self.apply(self.snapshot(primary['NAME']), replica['NAME'])
+            return
+        # Snapshots of the primary, each applied to the replica `lag` seconds after it was taken
+        pending = deque()
+        while True:
+            now = time.monotonic()
+            pending.append((now, self.snapshot(primary['NAME'])))
+            due = None
+            while pending and pending[0][0] <= now - options['lag']:
+                if due is not None:
+                    due.close()
+                due = pending.popleft()[1]
+            if due is not None:
+                self.apply(due, replica['NAME'])
+            time.sleep(options['interval'])
+
+    def snapshot(self, path):
+        copy = sqlite3.connect(':memory:')
+        with closing(sqlite3.connect(path, timeout=30)) as source:
+            source.backup(copy)
+        return copy
+
+    def apply(self, snapshot, path):
+        with closing(snapshot), closing(sqlite3.connect(path, timeout=30)) as target:
+            snapshot.backup(target)
@@ -0,0 +1,233 @@
+"""
+In-process request metrics in the Prometheus text format.
+
+MetricsMiddleware wraps the top-level ASGI app and records, per route template, request
+latency, status codes and requests in flight. While a request runs, a RequestMetrics
+object sits in a context variable; sync_to_async carries it into the DB threads, where
+the ORM's execute wrapper adds each query's count and time and the API's DB thread pool
+adds the time calls spent waiting for a thread. Everything is plain counters updated on
+the event loop, so it is cheap enough to leave on.
+"""
+import contextvars
+import functools
+import hmac
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+from starlette.responses import PlainTextResponse
+from starlette.staticfiles import StaticFiles
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'query_seconds', 'executor_wait')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.executor_wait = 0.0
+
+
+def current_request():
+    """The running request's RequestMetrics, or None outside a request."""
+    return _current.get()
+
+
+def record_executor_wait(seconds):
+    request = _current.get()
+    if request is not None:
+        request.executor_wait += seconds
+
+
+def record_queries(execute, sql, params, many, context):
+    """Django execute wrapper: count and time the query against the running request."""
+    request = _current.get()
+    if request is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request.queries += 1
+        request.query_seconds += time.perf_counter() - start
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """connection_created hook: add record_queries to every new connection."""
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_queries)
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels):
+        self.name, self.help, self.buckets, self.labels = name, help, buckets, labels
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self.series = {}
+
+    def observe(self, label_values, value):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label_values, series in sorted(self.series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {series[-1]}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels, type='counter'):
+        self.name, self.help, self.labels, self.type = name, help, labels, type
+        self.series = defaultdict(int)
+
+    def inc(self, label_values, amount=1):
+        self.series[label_values] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        for label_values, value in sorted(self.series.items()):
+            labels = _labels(self.labels, label_values)
+            lines.append(f'{self.name}{{{labels}}} {value}' if labels else f'{self.name} {value}')
+        return lines
+
+
+def _labels(names, values):
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+request_duration = Histogram(
+    'todo_http_request_duration_seconds', 'Time from request start to the last response byte.',
+    LATENCY_BUCKETS, ('method', 'route'),
+)
+requests_total = Counter(
+    'todo_http_requests_total', 'Finished requests by status code.', ('method', 'route', 'status'),
+)
+requests_in_flight = Counter(
+    'todo_http_requests_in_flight', 'Requests being served.', (), type='gauge',
+)
+db_queries = Histogram(
+    'todo_db_queries_per_request', 'ORM queries run by one request.', QUERY_COUNT_BUCKETS, ('route',),
+)
+db_query_duration = Histogram(
+    'todo_db_query_duration_seconds_per_request', 'Time one request spent in ORM queries.',
+    LATENCY_BUCKETS, ('route',),
+)
+executor_wait = Histogram(
+    'todo_executor_wait_seconds_per_request',
+    'Time one request waited for a DB thread and for its sync_to_async calls to start.',
+    LATENCY_BUCKETS, ('route',),
+)
+METRICS = [request_duration, requests_total, requests_in_flight, db_queries, db_query_duration, executor_wait]
+
+
+def register(metric):
+    """Add a Histogram or Counter defined elsewhere to the scrape output; returns it."""
+    METRICS.append(metric)
+    return metric
+
+
+# name -> (help, callable returning {label value: number}) read at scrape time
+_gauges = {}
+
+
+def register_gauge(name, help, label, collect):
+    """Export `collect()` (a dict of label value -> number) as a gauge on every scrape."""
+    _gauges[name] = (help, label, collect)
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, (help, label, collect) in _gauges.items():
+        lines += [f'# HELP {name} {help}', f'# TYPE {name} gauge']
+        lines += [f'{name}{{{_labels((label,), (key,))}}} {value}' for key, value in collect().items()]
+    return '\n'.join(lines) + '\n'
+
+
+def route_label(scope):
+    """The route template that served the request, so label values stay few."""
+    route = scope.get('route')
+    if route is not None and hasattr(route, 'path'):
+        # FastAPI puts the matched route in the scope; root_path holds the mount prefix
+        return scope.get('root_path', '') + route.path
+    endpoint = scope.get('endpoint')
+    if endpoint is metrics_endpoint:
+        return '/metrics'
+    if isinstance(endpoint, StaticFiles):
+        # Every file under a static mount shares one label
+        return scope.get('root_path', '') + '/{path}'
+    if scope['path'].startswith('/api/'):
+        return 'unmatched'
+    return django_route(scope['path'])
+
+
+@functools.lru_cache(maxsize=1024)
+def django_route(path):
+    """Django's route template for `path`; resolved once per path, not on every request."""
+    try:
+        return '/' + resolve(path).route
+    except Resolver404:
+        return 'unmatched'
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the metrics above for every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        request = RequestMetrics()
+        token = _current.set(request)
+        status_code = 500
+        start = time.perf_counter()
+        requests_in_flight.inc(())
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            requests_in_flight.inc((), -1)
+            _current.reset(token)
+            route = route_label(scope)
+            request_duration.observe((scope['method'], route), elapsed)
+            requests_total.inc((scope['method'], route, status_code))
+            db_queries.observe((route,), request.queries)
+            db_query_duration.observe((route,), request.query_seconds)
+            executor_wait.observe((route,), request.executor_wait)
+
+
+async def metrics_endpoint(request):
+    """Starlette endpoint serving render(); guarded by METRICS_TOKEN when it is set."""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and not hmac.compare_digest(request.headers.get('authorization', ''), f'Bearer {token}'):
+        return PlainTextResponse('Unauthorized\n', status_code=401)
+    return PlainTextResponse(render(), media_type='text/plain; version=0.0.4')
@@ -0,0 +1,174 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from asgiref.sync import SyncToAsync, ThreadSensitiveContext, sync_to_async
+from django.db import close_old_connections, connections
+
+from . import metrics, profiling
+
+
+class TimedExecutor(ThreadPoolExecutor):
+    """
+    A ThreadPoolExecutor that reports how long each call queued before it started, and
+    lets a profiled request sample the thread while it runs the request's calls.
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        # submit() runs on the event loop, in the calling request's context
+        request = metrics.current_request()
+        profile = profiling.current_profile()
+        if request is None and profile is None:
+            return super().submit(fn, *args, **kwargs)
+        queued = time.perf_counter()
+
+        def timed(*args, **kwargs):
+            if request is not None:
+                request.executor_wait += time.perf_counter() - queued
+            with profiling.sampling_thread(profile):
+                return fn(*args, **kwargs)
+
+        return super().submit(timed, *args, **kwargs)
+
+
+class DatabaseThreadPool:
+    """
+    A fixed set of long-lived single-thread executors leased for one thread-sensitive
+    sync_to_async call at a time (see LeasedExecutor). Each thread keeps its database
+    connection between requests (subject to CONN_MAX_AGE / the connection pool), so
+    connection setup stays off the request path, and at most `size` calls touch the
+    database at once; the rest wait for a free thread.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._idle = [
+            TimedExecutor(max_workers=1, thread_name_prefix=f'db-{i}') for i in range(size)
+        ]
+        # Waiting requests are served strictly in arrival order: a freed thread goes to the
+        # oldest waiter, never to a request that happens to arrive at that moment
+        self._waiters = deque()
+        self.leases = 0
+        self.wait_seconds = 0.0
+
+    async def acquire(self):
+        start = time.perf_counter()
+        if self._idle and not self._waiters:
+            executor = self._idle.pop()
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                executor = await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Handed a thread just as we were cancelled: pass it on
+                    self.release(waiter.result())
+                else:
+                    self._waiters.remove(waiter)
+                raise
+        waited = time.perf_counter() - start
+        self.leases += 1
+        self.wait_seconds += waited
+        metrics.record_executor_wait(waited)
+        return executor
+
+    def release(self, executor):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(executor)
+                return
+        self._idle.append(executor)
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'busy': self.size - len(self._idle),
+            'waiting': len(self._waiters),
+            'leases': self.leases,
+            'wait_seconds': round(self.wait_seconds, 6),
+        }
+
+
+class LeasedExecutor:
+    """
+    Stands in for a request's thread-sensitive executor: every call leases a thread from
+    `pool` just for as long as it runs. A request awaiting anything else (the password
+    hashing pool, its client's upload, a slow reader of its response) holds no thread.
+    The request's calls still run one at a time and in order, since each is awaited, but
+    not necessarily on the same thread.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.used = set()
+
+    def submit(self, fn, /, *args, **kwargs):
+        # Called on the event loop by run_in_executor, in the calling request's context
+        future = Future()
+        asyncio.get_running_loop().create_task(self._run(future, fn, args, kwargs))
+        return future
+
+    async def _run(self, future, fn, args, kwargs):
+        executor = await self.pool.acquire()
+        try:
+            if not future.set_running_or_notify_cancel():
+                return
+            self.used.add(executor)
+            try:
+                result = await asyncio.wrap_future(executor.submit(fn, *args, **kwargs))
+            except BaseException as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+        finally:
+            self.pool.release(executor)
+
+    def shutdown(self, wait=True, **kwargs):
+        # The threads belong to the pool
+        pass
+
+
+class ThreadSensitiveMiddleware:
+    """
+    Run each HTTP request in its own ThreadSensitiveContext, the same way Django's own
+    ASGIHandler does. Without it every thread-sensitive sync_to_async call (which is what
+    the async ORM uses under the hood) in the process shares one executor thread, so
+    concurrent requests queue behind each other's queries.
+
+    With a `pool` each of the request's calls runs on a thread leased from that
+    DatabaseThreadPool for the duration of the call, instead of on a fresh thread per
+    request.
+    """
+
+    def __init__(self, app, pool=None):
+        self.app = app
+        self.pool = pool
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        if self.pool is None:
+            async with ThreadSensitiveContext():
+                try:
+                    await self.app(scope, receive, send)
+                finally:
+                    # The request's thread goes away with the context, so release its connections
+                    await sync_to_async(connections.close_all)()
+            return
+
+        executor = LeasedExecutor(self.pool)
+        async with ThreadSensitiveContext() as context:
+            SyncToAsync.context_to_thread_executor[context] = executor
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                SyncToAsync.context_to_thread_executor.pop(context, None)
+                # Like Django's request_finished: drop broken or expired connections on the
+                # threads this request used. Queued on them directly; it's quick.
+                for thread in executor.used:
+                    await asyncio.wrap_future(thread.submit(close_old_connections))
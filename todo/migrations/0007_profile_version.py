@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0006_task_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:27
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0009_emailaddress_unique_primary_email'),
+        ('todo', '0008_task_tombstones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('confirmation', 'Email confirmation')], max_length=20)),
+                ('state', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('email_address', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox', to='account.emailaddress')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['state', 'next_attempt_at'], name='outbox_due_idx')],
+            },
+        ),
+    ]
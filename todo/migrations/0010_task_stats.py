@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:43
+
+import django.db.models.deletion
+import django.utils.timezone
+import todo.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('todo', '0009_email_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStats',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='task_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total', models.IntegerField(default=0)),
+                ('queue', models.IntegerField(default=0)),
+                ('in_progress', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('aborted', models.IntegerField(default=0)),
+                ('priority_low', models.IntegerField(default=0)),
+                ('priority_medium', models.IntegerField(default=0)),
+                ('priority_high', models.IntegerField(default=0)),
+                ('overdue', models.IntegerField(default=0)),
+                ('overdue_as_of', models.DateField(default=django.utils.timezone.localdate)),
+                ('completed_this_week', models.IntegerField(default=0)),
+                ('week_start', models.DateField(default=todo.models.current_week_start)),
+            ],
+            options={
+                'verbose_name_plural': 'task stats',
+            },
+        ),
+    ]
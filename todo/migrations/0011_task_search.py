@@ -0,0 +1,88 @@
+from django.db import migrations
+
+# The DDL is spelled out here rather than imported from todo.search, so this migration
+# keeps creating the same schema whatever that module becomes.
+
+# PostgreSQL: a generated tsvector (title weighted above description) behind a GIN index
+POSTGRES_INSTALL = [
+    """
+    ALTER TABLE todo_task ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS task_search_idx ON todo_task USING GIN (search_vector)",
+]
+POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS task_search_idx",
+    "ALTER TABLE todo_task DROP COLUMN IF EXISTS search_vector",
+]
+
+# SQLite: an external-content FTS5 table kept in sync by triggers, filled from todo_task.
+# todo.search.repair_search_index() recreates the triggers from SQLITE_TRIGGERS when a
+# later migration has rebuilt todo_task (and dropped them with it).
+SQLITE_TRIGGERS = {
+    'todo_task_fts_insert': """
+    CREATE TRIGGER IF NOT EXISTS todo_task_fts_insert AFTER INSERT ON todo_task BEGIN
+        INSERT INTO todo_task_fts (rowid, title, description, owner_id)
+        VALUES (new.id, new.title, new.description, new.owner_id);
+    END
+    """,
+    'todo_task_fts_delete': """
+    CREATE TRIGGER IF NOT EXISTS todo_task_fts_delete AFTER DELETE ON todo_task BEGIN
+        INSERT INTO todo_task_fts (todo_task_fts, rowid, title, description, owner_id)
+        VALUES ('delete', old.id, old.title, old.description, old.owner_id);
+    END
+    """,
+    'todo_task_fts_update': """
+    CREATE TRIGGER IF NOT EXISTS todo_task_fts_update AFTER UPDATE OF title, description, owner_id ON todo_task BEGIN
+        INSERT INTO todo_task_fts (todo_task_fts, rowid, title, description, owner_id)
+        VALUES ('delete', old.id, old.title, old.description, old.owner_id);
+        INSERT INTO todo_task_fts (rowid, title, description, owner_id)
+        VALUES (new.id, new.title, new.description, new.owner_id);
+    END
+    """,
+}
+SQLITE_INSTALL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS todo_task_fts USING fts5(
+        title, description, owner_id, content='todo_task', content_rowid='id',
+        tokenize='porter unicode61', prefix='2 3 4'
+    )
+    """,
+    *SQLITE_TRIGGERS.values(),
+    "INSERT INTO todo_task_fts (todo_task_fts) VALUES ('rebuild')",
+]
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS todo_task_fts_insert",
+    "DROP TRIGGER IF EXISTS todo_task_fts_delete",
+    "DROP TRIGGER IF EXISTS todo_task_fts_update",
+    "DROP TABLE IF EXISTS todo_task_fts",
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+    """
+    Full-text search index over task titles and descriptions: a generated tsvector
+    column with a GIN index on PostgreSQL, an FTS5 table with triggers on SQLite. Other
+    databases get nothing and search with LIKE. Neither is visible to the ORM; see
+    todo.search for the queries.
+    """
+
+    dependencies = [
+        ('todo', '0010_task_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'postgresql': POSTGRES_INSTALL, 'sqlite': SQLITE_INSTALL}),
+            run_for_vendor({'postgresql': POSTGRES_UNINSTALL, 'sqlite': SQLITE_UNINSTALL}),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0012_revoked_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='last_write_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,16 +1,26 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import connections, models, transaction
+from django.db.models import sql
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
+from .cache import invalidate_user
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     full_name = models.CharField(max_length=100, blank=True)
     bio = models.TextField(max_length=500, blank=True)
     location = models.CharField(max_length=30, blank=True)
     avatar_url = models.CharField(max_length=500, blank=True, default="https://via.placeholder.com/150")
+    # Bumped on every task or profile write through the API; backs the ETags in todo.versioning
+    version = models.PositiveBigIntegerField(default=0)
+    # Set with the version bump; keeps the user's reads on the primary (todo.replicas)
+    last_write_at = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
         return f'{self.user.username} Profile'
@@ -29,6 +39,80 @@ def save_user_profile(sender, instance, **kwargs):
         # If the profile doesn't exist (e.g. old user), create it now
         Profile.objects.create(user=instance)
 
+@receiver(post_save, sender=User)
+def create_task_stats(sender, instance, created, **kwargs):
+    if created:
+        TaskStats.objects.create(owner=instance)
+
+# Drop cached API users whenever the row changes (deactivation, password change, ...)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+# The Task columns TaskStats counters depend on
+STATS_STATE_FIELDS = ('status', 'priority', 'due_date', 'completed_at')
+
+
+class TaskQuerySet(models.QuerySet):
+    def _returning(self, query):
+        connection = connections[self.db]
+        compiler = query.get_compiler(self.db)
+        compiler.pre_sql_setup()
+        statement, params = compiler.as_sql()
+        fields = self.model._meta.concrete_fields
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        with connection.cursor() as cursor:
+            cursor.execute(f'{statement} RETURNING {columns}', params)
+            rows = cursor.fetchall()
+
+        # Same per-field conversions the SELECT compiler applies (e.g. SQLite datetimes)
+        converters = [
+            connection.ops.get_db_converters(field.cached_col) + field.get_db_converters(connection)
+            for field in fields
+        ]
+        names = [field.attname for field in fields]
+        instances = []
+        for row in rows:
+            values = list(row)
+            for i, field_converters in enumerate(converters):
+                for converter in field_converters:
+                    values[i] = converter(values[i], fields[i].cached_col, connection)
+            instances.append(self.model.from_db(self.db, names, values))
+        return instances
+
+    def _supports_returning(self):
+        return connections[self.db].vendor in ('postgresql', 'sqlite')
+
+    def update_returning(self, **kwargs):
+        """
+        `update(**kwargs)` that also returns the updated rows as model instances, in one
+        UPDATE ... RETURNING statement where the database supports it (PostgreSQL,
+        SQLite >= 3.35). Elsewhere it falls back to an update() followed by a SELECT.
+        """
+        if not self._supports_returning():
+            pks = list(self.values_list('pk', flat=True))
+            self.model._base_manager.filter(pk__in=pks).update(**kwargs)
+            return list(self.model._base_manager.using(self.db).filter(pk__in=pks))
+
+        query = self.query.chain(sql.UpdateQuery)
+        query.add_update_values(kwargs)
+        return self._returning(query)
+
+    def delete_returning(self):
+        """
+        Delete the rows and return them as they were, in one DELETE ... RETURNING. Like
+        update(), this skips Model.delete(), signals and cascades, so it is only for
+        models nothing else points at.
+        """
+        if not self._supports_returning():
+            instances = list(self)
+            self.model._base_manager.filter(pk__in=[obj.pk for obj in instances]).delete()
+            return instances
+
+        return self._returning(self.query.chain(sql.DeleteQuery))
+
+
 class Task(models.Model):
     class Priority(models.TextChoices):
         LOW = 'Low', 'Low'
@@ -62,11 +146,22 @@ class Task(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='tasks')
+
+    objects = TaskQuerySet.as_manager()
     
     class Meta:
         ordering = ['order', '-created_at'] # Sort by order first, then by created_at descending
+        # Composite indexes backing the keyset-paginated, filterable task list
+        indexes = [
+            models.Index(fields=['owner', 'order', '-created_at', 'id'], name='task_owner_order_idx'),
+            models.Index(fields=['owner', 'status', 'order', '-created_at', 'id'], name='task_owner_status_idx'),
+            models.Index(fields=['owner', 'priority', 'order', '-created_at', 'id'], name='task_owner_priority_idx'),
+            models.Index(fields=['owner', 'due_date'], name='task_owner_due_date_idx'),
+            # Delta sync walks a user's changes in (updated_at, id) order
+            models.Index(fields=['owner', 'updated_at', 'id'], name='task_owner_updated_idx'),
+        ]
     
-    def save(self, *args, **kwargs):
+    def sync_status(self):
         # Sync legacy is_completed field with new status
         if self.status == self.Status.COMPLETED:
             self.is_completed = True
@@ -75,8 +170,162 @@ class Task(models.Model):
         else:
             self.is_completed = False
             self.completed_at = None
-            
-        super().save(*args, **kwargs)
+
+    @classmethod
+    def status_updates(cls, changes):
+        """
+        The sync_status() rules as column updates for a queryset update(): rewrite
+        `changes` so is_completed/completed_at follow a new status, and drop a standalone
+        is_completed that save() would have overwritten from the current status anyway.
+        """
+        now = timezone.now()
+        changes = dict(changes)
+        if 'status' in changes:
+            completed = changes['status'] == cls.Status.COMPLETED
+            changes['is_completed'] = completed
+            # Keep the original completion time when a completed task is saved again
+            changes['completed_at'] = (
+                Coalesce('completed_at', models.Value(now, output_field=models.DateTimeField())) if completed else None
+            )
+        else:
+            changes.pop('is_completed', None)
+        # auto_now is only applied by save()
+        changes['updated_at'] = now
+        return changes
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the row looked like when loaded, so save() can update TaskStats by difference
+        instance._stats_state = instance.stats_state() if set(STATS_STATE_FIELDS) <= set(field_names) else None
+        return instance
+
+    def stats_state(self):
+        return tuple(getattr(self, field) for field in STATS_STATE_FIELDS)
+
+    def save(self, *args, **kwargs):
+        # bulk_create/bulk_update bypass save(), so callers using them must call sync_status()
+        # and todo.stats.record_changes() themselves
+        from .stats import record_changes
+
+        self.sync_status()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not set(update_fields) & set(STATS_STATE_FIELDS):
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic(using=kwargs.get('using')):
+            old = None
+            if not self._state.adding:
+                old = getattr(self, '_stats_state', None)
+                if old is None:
+                    old = Task._base_manager.filter(pk=self.pk).values_list(*STATS_STATE_FIELDS).first()
+            super().save(*args, **kwargs)
+            self._stats_state = self.stats_state()
+            record_changes(self.owner_id, removed=[old] if old else [], added=[self._stats_state])
+
+    def delete(self, *args, **kwargs):
+        from .stats import record_changes
+
+        with transaction.atomic(using=kwargs.get('using')):
+            removed = getattr(self, '_stats_state', None) or self.stats_state()
+            owner_id = self.owner_id
+            result = super().delete(*args, **kwargs)
+            record_changes(owner_id, removed=[removed])
+        return result
         
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+class TaskTombstone(models.Model):
+    """Records a deleted task so delta-syncing clients can drop it."""
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='task_tombstones')
+    task_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'deleted_at', 'id'], name='tombstone_owner_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'Deleted task {self.task_id}'
+
+
+class EmailOutbox(models.Model):
+    """
+    Emails waiting to be sent. Rows are written in the same transaction as the data they
+    are about and delivered later by the outbox dispatcher (see todo.outbox).
+    """
+    class Kind(models.TextChoices):
+        CONFIRMATION = 'confirmation', 'Email confirmation'
+
+    class State(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        SENT = 'sent', 'Sent'
+        FAILED = 'failed', 'Failed'
+
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    email_address = models.ForeignKey('account.EmailAddress', on_delete=models.CASCADE, related_name='outbox')
+    state = models.CharField(max_length=10, choices=State.choices, default=State.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # Due time for pending rows; also acts as a lease while a dispatcher is sending it
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['state', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} for {self.email_address.email} ({self.state})'
+
+
+def current_week_start():
+    today = timezone.localdate()
+    return today - timedelta(days=today.weekday())
+
+
+class TaskStats(models.Model):
+    """
+    Per-user task counters, kept up to date in the same transaction as every task write
+    (see todo.stats) so GET /api/tasks/stats is a primary key lookup. `overdue` and
+    `completed_this_week` are relative to `overdue_as_of` and `week_start` and are
+    recounted when those dates go stale.
+    """
+    owner = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='task_stats')
+    total = models.IntegerField(default=0)
+    queue = models.IntegerField(default=0)
+    in_progress = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    aborted = models.IntegerField(default=0)
+    priority_low = models.IntegerField(default=0)
+    priority_medium = models.IntegerField(default=0)
+    priority_high = models.IntegerField(default=0)
+    # Open (Queue / In Progress) tasks due before overdue_as_of
+    overdue = models.IntegerField(default=0)
+    overdue_as_of = models.DateField(default=timezone.localdate)
+    # Tasks completed in the week (Monday to Sunday) starting on week_start
+    completed_this_week = models.IntegerField(default=0)
+    week_start = models.DateField(default=current_week_start)
+
+    class Meta:
+        verbose_name_plural = 'task stats'
+
+    def __str__(self):
+        return f'Task stats for user {self.owner_id}'
+
+
+class RevokedToken(models.Model):
+    """
+    A refresh token that may no longer be used: rotated away or logged out. Only the
+    token's jti is kept, and only until the token would have expired anyway (see
+    todo.tokens.prune_revoked_tokens), so the table stays small.
+    """
+    jti = models.UUIDField(primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'Revoked token {self.jti}'
@@ -0,0 +1,121 @@
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from fastapi import HTTPException, status
+
+from .models import Profile, Task
+from .pagination import TASK_LIST_ORDERING, after_task
+from .versioning import bump_version
+
+# Spacing between neighbouring keys after a rebalance; new tasks are appended one step after the last
+ORDER_STEP = 1024.0
+
+
+def key_between(before, after):
+    """
+    Fractional key strictly between two neighbouring orders (either may be None at the
+    ends of the list), or None when float precision has run out between them.
+    """
+    if before is None and after is None:
+        return ORDER_STEP
+    if before is None:
+        return after - ORDER_STEP
+    if after is None:
+        return before + ORDER_STEP
+    middle = (before + after) / 2
+    if before < middle < after:
+        return middle
+    return None
+
+
+def next_order(owner_id):
+    """
+    Key one ORDER_STEP after the user's last task, for appending. Call it inside the
+    transaction that inserts the tasks: it locks the user's Profile row first, so
+    concurrent appends for one user take turns instead of reading the same last key.
+    """
+    list(Profile.objects.select_for_update().filter(user_id=owner_id).values_list('pk', flat=True))
+    last = Task.objects.filter(owner_id=owner_id).aggregate(last=Max('order'))['last']
+    return key_between(last, None)
+
+
+def _save_orders(owner_id, tasks, orders):
+    """bulk_update only the rows whose key actually changes; returns those rows."""
+    now = timezone.now()
+    changed = []
+    for task, order in zip(tasks, orders):
+        if task.order != order:
+            task.order = order
+            task.updated_at = now
+            changed.append(task)
+    if changed:
+        Task.objects.bulk_update(changed, ['order', 'updated_at'])
+        bump_version(owner_id)
+    return changed
+
+
+def _owner_tasks(owner_id):
+    return list(
+        Task.objects.select_for_update()
+        .filter(owner_id=owner_id)
+        .order_by(*TASK_LIST_ORDERING)
+        .only('id', 'order', 'updated_at')
+    )
+
+
+def move_task(owner_id, task_id, after_id):
+    """
+    Place a task directly after `after_id` (or at the top when it is None). Normally this
+    reads the two neighbours and writes a single row; when the gap between them is
+    exhausted the whole list is respaced by ORDER_STEP in one bulk_update.
+    """
+    if task_id == after_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="A task cannot be moved after itself")
+    with transaction.atomic():
+        owned = Task.objects.select_for_update().filter(owner_id=owner_id)
+        found = {task.id: task for task in owned.filter(pk__in=[task_id, after_id])}
+        if task_id not in found or (after_id is not None and after_id not in found):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+
+        moved = found[task_id]
+        others = owned.exclude(pk=task_id).order_by(*TASK_LIST_ORDERING)
+        if after_id is None:
+            before = None
+            successor = others.first()
+        else:
+            anchor = found[after_id]
+            before = anchor.order
+            successor = others.filter(after_task(anchor.order, anchor.created_at, anchor.id)).first()
+
+        order = key_between(before, successor.order if successor else None)
+        if order is not None:
+            return _save_orders(owner_id, [moved], [order])
+
+        tasks = list(others.only('id', 'order', 'updated_at'))
+        position = 0 if after_id is None else [task.id for task in tasks].index(after_id) + 1
+        tasks.insert(position, moved)
+        return _save_orders(owner_id, tasks, [(i + 1) * ORDER_STEP for i in range(len(tasks))])
+
+
+def reorder_tasks(owner_id, ids):
+    """
+    Apply a new relative order to the given tasks. The listed tasks swap keys among
+    themselves, so tasks that are not listed keep their place; if the listed tasks share
+    a key the user's whole list is respaced first.
+    """
+    if len(ids) != len(set(ids)):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Each task id may appear only once")
+    with transaction.atomic():
+        tasks = _owner_tasks(owner_id)
+        by_id = {task.id: task for task in tasks}
+        if any(pk not in by_id for pk in ids):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+
+        listed = [by_id[pk] for pk in ids]
+        slots = sorted(task.order for task in listed)
+        changed = {}
+        if len(set(slots)) < len(slots):
+            changed = {task.id: task for task in _save_orders(owner_id, tasks, [(i + 1) * ORDER_STEP for i in range(len(tasks))])}
+            slots = sorted(task.order for task in listed)
+        changed.update({task.id: task for task in _save_orders(owner_id, listed, slots)})
+        return list(changed.values())
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed row stays invisible to other dispatchers while it is being sent
+LEASE = timedelta(minutes=5)
+
+
+def enqueue_confirmation(email_address):
+    """Queue a confirmation email; call inside the transaction that created the address."""
+    return EmailOutbox.objects.create(kind=EmailOutbox.Kind.CONFIRMATION, email_address=email_address)
+
+
+def backoff(attempts):
+    """Exponential retry delay: 30s, 1m, 2m, ... capped at one hour."""
+    return timedelta(seconds=min(30 * 2 ** (attempts - 1), 3600))
+
+
+def _claim(batch_size):
+    """
+    Lease up to `batch_size` due rows. Each row is taken by a conditional UPDATE that only
+    matches while it is still due, so when dispatchers race for a row exactly one of them
+    updates it and the others skip it. Unlike SELECT ... FOR UPDATE SKIP LOCKED this also
+    holds on SQLite.
+    """
+    now = timezone.now()
+    due = EmailOutbox.objects.filter(state=EmailOutbox.State.PENDING, next_attempt_at__lte=now)
+    candidates = list(due.select_related('email_address__user').order_by('next_attempt_at')[:batch_size])
+    return [row for row in candidates if _lease(due, row, now + LEASE)]
+
+
+def _lease(due, row, until):
+    if not due.filter(pk=row.pk).update(next_attempt_at=until):
+        # Another dispatcher got there first
+        return False
+    row.next_attempt_at = until
+    return True
+
+
+def _send(row):
+    if row.kind == EmailOutbox.Kind.CONFIRMATION:
+        # No request here; allauth builds the link from the Sites framework
+        row.email_address.send_confirmation(request=None)
+
+
+def dispatch_batch(batch_size=50):
+    """
+    Send up to `batch_size` due emails. Rows are claimed with a short lease first, so
+    several dispatchers can run side by side and a crashed one only delays its batch.
+    Failures are retried with exponential backoff until EMAIL_OUTBOX_MAX_ATTEMPTS.
+    Returns the number of rows processed.
+    """
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    rows = _claim(batch_size)
+    for row in rows:
+        row.attempts += 1
+        try:
+            _send(row)
+        except Exception as e:
+            logger.warning("Outbox email %s failed (attempt %s): %s", row.pk, row.attempts, e)
+            row.last_error = str(e)
+            if row.attempts >= max_attempts:
+                row.state = EmailOutbox.State.FAILED
+            else:
+                row.next_attempt_at = timezone.now() + backoff(row.attempts)
+        else:
+            row.state = EmailOutbox.State.SENT
+            row.sent_at = timezone.now()
+            row.last_error = ''
+        row.save(update_fields=['attempts', 'state', 'next_attempt_at', 'sent_at', 'last_error'])
+    return len(rows)
+
+
+def _dispatch_from_loop(batch_size):
+    try:
+        return dispatch_batch(batch_size)
+    finally:
+        close_old_connections()
+
+
+async def _dispatch_to_completion(batch_size):
+    # If the dispatcher is cancelled mid-batch, the batch's thread carries on regardless;
+    # wait for it so the emails it sends are also recorded as sent before shutdown
+    batch = asyncio.ensure_future(sync_to_async(_dispatch_from_loop, thread_sensitive=False)(batch_size))
+    try:
+        return await asyncio.shield(batch)
+    except asyncio.CancelledError:
+        await batch
+        raise
+
+
+_wakeup = None
+
+
+def notify():
+    """Wake the in-process dispatcher so freshly queued mail goes out without waiting."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+async def run_dispatcher(interval=5.0, batch_size=50):
+    """Background asyncio loop draining the outbox; started from the ASGI lifespan."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    while True:
+        try:
+            while await _dispatch_to_completion(batch_size) == batch_size:
+                pass
+        except Exception:
+            logger.exception("Outbox dispatcher failed")
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
@@ -0,0 +1,51 @@
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from fastapi import HTTPException, status
+
+# Keyset used by the task list; must match the queryset ordering below
+TASK_LIST_ORDERING = ('order', '-created_at', 'id')
+
+
+def encode_cursor(values):
+    """Opaque, URL-safe cursor for a list of JSON-serialisable values."""
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list):
+            raise ValueError(cursor)
+        return values
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def task_cursor(order, created_at, pk):
+    return encode_cursor([order, created_at.isoformat(), pk])
+
+
+def after_task(order, created_at, pk):
+    """
+    Filter selecting the rows that sort strictly after (order, created_at, pk) in
+    (order ASC, created_at DESC, id ASC) order.
+    """
+    return (
+        Q(order__gt=order)
+        | Q(order=order, created_at__lt=created_at)
+        | Q(order=order, created_at=created_at, id__gt=pk)
+    )
+
+
+def after_task_cursor(cursor):
+    try:
+        order, created_at, pk = decode_cursor(cursor)
+        order, created_at, pk = float(order), datetime.fromisoformat(created_at), int(pk)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return after_task(order, created_at, pk)
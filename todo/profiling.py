@@ -0,0 +1,265 @@
+"""
+On-demand profiles of single requests.
+
+ProfilingMiddleware profiles a request when a staff user sends `X-Profile-Request: 1`,
+or at random for PROFILING_SAMPLE_RATE of all requests. A sampler thread then records
+the request's stacks every PROFILING_INTERVAL seconds: the event loop thread while the
+request's task is the one running, and any thread while it runs a sync_to_async call or
+an ORM query for the request. Samples where none of these is busy count as "(waiting)".
+The SQL statements run for the request are captured with their timings.
+
+Profiles are JSON files in PROFILING_DIR, of which the newest PROFILING_MAX_FILES are
+kept. The response carries the profile's id in X-Profile-Id; GET /api/profiles lists
+them and GET /api/profiles/{id} downloads one (?format=folded gives collapsed stacks for
+flame graph tools).
+"""
+import asyncio
+import contextlib
+import contextvars
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .tokens import access_token_from_scope
+
+PROFILE_HEADER = b'x-profile-request'
+MAX_QUERIES = 1000
+PROFILE_ID = re.compile(r'^\d+-[0-9a-f]{8}$')
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+def current_profile():
+    return _current.get()
+
+
+def _folded(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        filename = '/'.join(code.co_filename.replace('\\', '/').rsplit('/', 2)[-2:])
+        names.append(f'{code.co_name} ({filename}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Profile:
+    def __init__(self, method, path):
+        self.id = f'{time.time_ns()}-{uuid.uuid4().hex[:8]}'
+        self.method, self.path = method, path
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        self.loop_thread = threading.get_ident()
+        # Thread idents currently working for this request -> nesting depth
+        self.threads = Counter()
+        self.samples = Counter()
+        self.queries = []
+        self.started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def thread(self):
+        ident = threading.get_ident()
+        self.threads[ident] += 1
+        try:
+            yield
+        finally:
+            self.threads[ident] -= 1
+            if not self.threads[ident]:
+                del self.threads[ident]
+
+    def sample(self, frames):
+        busy = False
+        if asyncio.current_task(self.loop) is self.task and self.loop_thread in frames:
+            self.samples['loop;' + _folded(frames[self.loop_thread])] += 1
+            busy = True
+        for ident in list(self.threads):
+            frame = frames.get(ident)
+            if frame is not None and ident != self.loop_thread:
+                self.samples['thread;' + _folded(frame)] += 1
+                busy = True
+        if not busy:
+            self.samples['(waiting)'] += 1
+
+    def as_dict(self, status_code):
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'status': status_code,
+            'duration_ms': round((time.perf_counter() - self.started) * 1000, 3),
+            'interval_ms': settings.PROFILING_INTERVAL * 1000,
+            'samples': dict(self.samples.most_common()),
+            'queries': self.queries,
+        }
+
+
+class Sampler:
+    """One daemon thread sampling every active profile; it exits when none are left."""
+
+    def __init__(self):
+        self._profiles = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, profile):
+        with self._lock:
+            self._profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+
+    def remove(self, profile):
+        with self._lock:
+            self._profiles.discard(profile)
+
+    def _run(self):
+        while True:
+            time.sleep(settings.PROFILING_INTERVAL)
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                profiles = list(self._profiles)
+            frames = sys._current_frames()
+            for profile in profiles:
+                profile.sample(frames)
+
+
+sampler = Sampler()
+
+
+def sampling_thread(profile):
+    """Context manager marking the current thread as working for `profile` (None: no-op)."""
+    return profile.thread() if profile is not None else contextlib.nullcontext()
+
+
+def capture_queries(execute, sql, params, many, context):
+    """Django execute wrapper: record the query (and sample its thread) for a profiled request."""
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        with profile.thread():
+            return execute(sql, params, many, context)
+    finally:
+        if len(profile.queries) < MAX_QUERIES:
+            profile.queries.append({
+                'sql': sql,
+                'many': many,
+                'ms': round((time.perf_counter() - start) * 1000, 3),
+                'thread': threading.current_thread().name,
+            })
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    if capture_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(capture_queries)
+
+
+class ProfileStore:
+    """The newest `max_files` profiles as JSON files in `directory`."""
+
+    def __init__(self, directory, max_files):
+        self.directory = str(directory)
+        self.max_files = max_files
+
+    def _path(self, profile_id):
+        return os.path.join(self.directory, f'{profile_id}.json')
+
+    def save(self, data):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self._path(data['id']) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, self._path(data['id']))
+        for profile_id in self.ids()[self.max_files:]:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._path(profile_id))
+
+    def ids(self):
+        """Stored profile ids, newest first."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        ids = [name[:-5] for name in names if name.endswith('.json') and PROFILE_ID.match(name[:-5])]
+        return sorted(ids, key=lambda profile_id: int(profile_id.split('-')[0]), reverse=True)
+
+    def list(self):
+        entries = []
+        for profile_id in self.ids():
+            with contextlib.suppress(FileNotFoundError):
+                stat = os.stat(self._path(profile_id))
+                entries.append({'id': profile_id, 'created': int(profile_id.split('-')[0]) / 1e9, 'size': stat.st_size})
+        return entries
+
+    def load(self, profile_id):
+        """The stored profile, or None for an unknown or malformed id."""
+        if not PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+
+store = ProfileStore(settings.PROFILING_DIR, settings.PROFILING_MAX_FILES)
+
+
+async def is_staff_request(scope):
+    """Whether the request's Bearer token belongs to an active staff user."""
+    access_token = access_token_from_scope(scope)
+    if access_token is None:
+        return False
+    return await User.objects.filter(
+        pk=access_token[jwt_settings.USER_ID_CLAIM], is_staff=True, is_active=True
+    ).aexists()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling the requests picked as described in the module docstring."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def should_profile(self, scope):
+        if dict(scope['headers']).get(PROFILE_HEADER) == b'1':
+            return await is_staff_request(scope)
+        rate = settings.PROFILING_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not await self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope['method'], scope['path'])
+        status_code = 500
+
+        async def send_with_id(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                message['headers'] = list(message.get('headers', [])) + [(b'x-profile-id', profile.id.encode())]
+            await send(message)
+
+        token = _current.set(profile)
+        sampler.add(profile)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.remove(profile)
+            _current.reset(token)
+            await asyncio.to_thread(store.save, profile.as_dict(status_code))
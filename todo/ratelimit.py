@@ -0,0 +1,200 @@
+"""
+Rate limiting and admission control for the API mount.
+
+RateLimitMiddleware gives each client a token bucket per rule in RATE_LIMITS: the first
+rule whose methods and path prefix match the request applies, keyed on the user of a
+valid Bearer token ("user" rules) or the client IP. A client that has used up its
+bucket gets 429 with Retry-After. Independently of the buckets, at most
+API_MAX_CONCURRENT_REQUESTS requests run at once; the rest are shed with 503.
+
+Buckets live in the backend named by RATE_LIMIT_BACKEND: InMemoryBackend (per worker)
+or SQLiteBackend (shared by the workers on one host).
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import metrics
+from .tokens import access_token_from_scope
+
+
+def refill(tokens, updated, now, rate, burst):
+    """Token count after refilling `tokens` (last seen at `updated`) up to `now`."""
+    return min(burst, tokens + (now - updated) * rate)
+
+
+def _take(state, now, rate, burst):
+    """Take one token from a (tokens, updated) state; returns (new state, seconds to wait)."""
+    tokens = burst if state is None else refill(*state, now, rate, burst)
+    if tokens >= 1:
+        return (tokens - 1, now), 0.0
+    return (tokens, now), (1 - tokens) / rate
+
+
+class InMemoryBackend:
+    """
+    Buckets in this process, split over `shards` LRU dicts with a lock each so threads
+    rarely contend. A shard forgets its least recently used buckets beyond `max_keys`,
+    which only ever hands an idle client a full bucket.
+    """
+
+    def __init__(self, shards=16, max_keys=10000):
+        self._shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+        self.max_keys = max_keys
+
+    def take_now(self, key, rate, burst):
+        lock, buckets = self._shards[hash(key) % len(self._shards)]
+        with lock:
+            buckets[key], wait = _take(buckets.get(key), time.monotonic(), rate, burst)
+            buckets.move_to_end(key)
+            if len(buckets) > self.max_keys:
+                buckets.popitem(last=False)
+        return wait
+
+    async def take(self, key, rate, burst):
+        """Take a token from `key`'s bucket; returns 0, or how many seconds until one is free."""
+        return self.take_now(key, rate, burst)
+
+
+class SQLiteBackend:
+    """
+    Buckets in a SQLite file every worker on the host opens, updated in an IMMEDIATE
+    transaction so concurrent workers never both spend the last token. Swap in a shared
+    store (Redis, ...) for multi-host setups.
+    """
+
+    def __init__(self, path, idle_seconds=3600):
+        self.path = str(path)
+        self.idle_seconds = idle_seconds
+        with closing(self._connect()) as db:
+            db.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')
+        return db
+
+    def take_now(self, key, rate, burst):
+        # Wall-clock time: the timestamps are compared across processes
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                state = db.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                (tokens, updated), wait = _take(state, now, rate, burst)
+                db.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)', (key, tokens, updated))
+                if random.random() < 0.001:
+                    db.execute('DELETE FROM buckets WHERE updated < ?', (now - self.idle_seconds,))
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+        return wait
+
+    async def take(self, key, rate, burst):
+        return await asyncio.to_thread(self.take_now, key, rate, burst)
+
+
+_backend = None
+
+
+def get_backend():
+    """The backend configured by RATE_LIMIT_BACKEND / RATE_LIMIT_BACKEND_OPTIONS, created on first use."""
+    global _backend
+    if _backend is None:
+        backend_class = import_string(getattr(settings, 'RATE_LIMIT_BACKEND', 'todo.ratelimit.InMemoryBackend'))
+        _backend = backend_class(**getattr(settings, 'RATE_LIMIT_BACKEND_OPTIONS', {}))
+    return _backend
+
+
+rejected = metrics.register(metrics.Counter(
+    'todo_rate_limited_requests_total', 'Requests turned away by rate limits or admission control.',
+    ('rule', 'status'),
+))
+
+
+def match_rule(method, path):
+    for rule in settings.RATE_LIMITS:
+        if path.startswith(rule['path']) and method in rule.get('methods', (method,)):
+            return rule
+    return None
+
+
+def client_ip(scope):
+    if settings.RATE_LIMIT_TRUST_X_FORWARDED_FOR:
+        forwarded = dict(scope['headers']).get(b'x-forwarded-for')
+        if forwarded:
+            return forwarded.decode().split(',')[0].strip()
+    return scope['client'][0] if scope.get('client') else 'unknown'
+
+
+def client_key(scope, rule):
+    """'user:<id>' for a valid Bearer token on a "user" rule, otherwise 'ip:<address>'."""
+    if rule.get('key') == 'user':
+        token = access_token_from_scope(scope)
+        if token is not None:
+            return f'user:{token[jwt_settings.USER_ID_CLAIM]}'
+    return f'ip:{client_ip(scope)}'
+
+
+async def reject(send, status_code, detail, retry_after):
+    body = json.dumps({'detail': detail}, separators=(',', ':')).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status_code,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'retry-after', str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, backend=None, max_concurrent=None):
+        self.app = app
+        self.backend = backend
+        self.max_concurrent = settings.API_MAX_CONCURRENT_REQUESTS if max_concurrent is None else max_concurrent
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        path = scope['path']
+        root_path = scope.get('root_path', '')
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        rule = match_rule(scope['method'], path)
+        if rule is not None:
+            backend = self.backend or get_backend()
+            # Hashed so raw tokens or addresses never end up as keys in a shared store
+            key = hashlib.blake2b(f"{rule['name']}|{client_key(scope, rule)}".encode(), digest_size=16).hexdigest()
+            wait = await backend.take(key, rule['rate'], rule['burst'])
+            if wait:
+                rejected.inc((rule['name'], 429))
+                await reject(send, 429, 'Too many requests, please slow down', wait)
+                return
+
+        if self.max_concurrent and self.in_flight >= self.max_concurrent:
+            rejected.inc(('concurrency', 503))
+            await reject(send, 503, 'The server is busy, please retry shortly', 1)
+            return
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
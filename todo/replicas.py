@@ -0,0 +1,85 @@
+"""
+Read replicas with read-your-writes.
+
+PrimaryReplicaRouter sends every write to `default`. Reads go there too, except in a
+request that called `use_replica(user_id)` (the API's read-only task and profile
+endpoints do, through their dependencies): that request's reads go to one of the
+DATABASE_REPLICAS, picked at random. A user who wrote in the last REPLICA_PIN_SECONDS
+is pinned to the primary, so they always read their own changes; keep the window above
+the replicas' usual lag.
+
+The pin is Profile.last_write_at, stamped by the version bump every task and profile
+write ends with (todo.versioning). It is looked up on the primary and compared with the
+primary's clock, so it holds whichever worker or host serves the next read. The same
+query reads the user's version, which the request's ETag then uses (aget_version), so
+an opted-in read costs one primary lookup.
+"""
+import contextvars
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.db.models.functions import Now
+
+from .models import Profile
+
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+# (user_id, version) as read on the primary by use_replica()
+_primary_version = contextvars.ContextVar('primary_version', default=None)
+
+
+async def version_and_pin(user_id):
+    """
+    `user_id`'s version, and whether they wrote in the last REPLICA_PIN_SECONDS, in one
+    query on the primary.
+    """
+    window_start = Now() - timedelta(seconds=settings.REPLICA_PIN_SECONDS)
+    pinned = ExpressionWrapper(Q(last_write_at__gte=window_start), output_field=BooleanField())
+    row = await Profile.objects.using(DEFAULT_DB_ALIAS).filter(
+        user_id=user_id).values_list('version', pinned).afirst()
+    if row is None:
+        return 0, False
+    version, pinned = row
+    return version, bool(pinned)
+
+
+def primary_version(user_id):
+    """The version use_replica() read for `user_id` in the current request, or None."""
+    checked = _primary_version.get()
+    if checked is not None and checked[0] == user_id:
+        return checked[1]
+    return None
+
+
+async def use_replica(user_id):
+    """
+    Let the rest of the current request (or task) read from a replica, unless `user_id`
+    is pinned. Returns the alias reads will use.
+    """
+    if not settings.DATABASE_REPLICAS:
+        alias = DEFAULT_DB_ALIAS
+    else:
+        version, pinned = await version_and_pin(user_id)
+        _primary_version.set((user_id, version))
+        alias = DEFAULT_DB_ALIAS if pinned else random.choice(settings.DATABASE_REPLICAS)
+    _read_alias.set(alias)
+    return alias
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # None: Django's default (the database the related instance came from, or 'default')
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary through replication
+        return db not in settings.DATABASE_REPLICAS
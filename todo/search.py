@@ -0,0 +1,134 @@
+import re
+from importlib import import_module
+
+from django.db import connections
+from django.db.models import Q
+from fastapi import HTTPException, status
+
+from .models import Task
+from .pagination import TASK_LIST_ORDERING, decode_cursor, encode_cursor
+
+# Only this many words of a query are used
+MAX_TERMS = 16
+# Only the newest matches are ranked, so a word found in most of a user's tasks costs
+# about as much as a rare one; pages stop at this many results. search_tasks() reports
+# when matches were left out (the API's X-Search-Truncated header).
+SEARCH_CANDIDATES = 1000
+
+# The search index itself is created by migration 0011_task_search. On SQLite, altering
+# todo_task in a later migration rebuilds the table and drops the triggers with it, so
+# repair_search_index() puts them back after every migrate, from the migration's DDL.
+SEARCH_MIGRATION = 'todo.migrations.0011_task_search'
+
+
+def repair_search_index(sender, using, **kwargs):
+    """post_migrate hook: put back the SQLite triggers if a migration rebuilt todo_task."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or 'todo_task_fts' not in connection.introspection.table_names():
+        return
+    triggers = import_module(SEARCH_MIGRATION).SQLITE_TRIGGERS
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'todo_task_fts_%'")
+        if {row[0] for row in cursor.fetchall()} == set(triggers):
+            return
+        for statement in triggers.values():
+            cursor.execute(statement)
+        # Rows written while the triggers were missing: reindex everything
+        cursor.execute("INSERT INTO todo_task_fts (todo_task_fts) VALUES ('rebuild')")
+
+
+def search_terms(q):
+    return re.findall(r'\w+', q.lower())[:MAX_TERMS]
+
+
+def _task_columns(alias):
+    # The model's columns only: on PostgreSQL t.* would drag search_vector along
+    return ', '.join(f'{alias}."{field.column}"' for field in Task._meta.concrete_fields)
+
+
+def _postgres_search(owner_id, terms, limit, offset):
+    # The last word is a prefix match, so results follow the user as they type
+    query = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+    return Task.objects.raw(
+        f"""
+        WITH query AS (SELECT to_tsquery('english', %s) AS q),
+        matches AS (
+            -- One past the cap, to tell whether any match is left out
+            SELECT id FROM todo_task, query
+            WHERE owner_id = %s AND search_vector @@ query.q
+            ORDER BY id DESC LIMIT %s
+        ),
+        candidates AS (SELECT id FROM matches ORDER BY id DESC LIMIT %s)
+        SELECT {_task_columns('t')}, (SELECT count(*) FROM matches) > %s AS truncated
+        FROM todo_task t JOIN candidates c ON c.id = t.id, query
+        ORDER BY ts_rank_cd(t.search_vector, query.q) DESC, t.id DESC
+        LIMIT %s OFFSET %s
+        """,
+        [query, owner_id, SEARCH_CANDIDATES + 1, SEARCH_CANDIDATES, SEARCH_CANDIDATES, limit, offset],
+    )
+
+
+def _sqlite_search(owner_id, terms, limit, offset):
+    words = ' AND '.join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+    match = f'owner_id : "{int(owner_id)}" AND {{title description}} : ({words})'
+    # FTS5's bm25() first counts every row matching each phrase (the owner's included),
+    # which costs as much as the whole result set. Score the candidates directly instead:
+    # words found in the title weigh more than ones in the description, then newest first.
+    score = ' + '.join(
+        '10 * (instr(lower(t.title), %s) > 0) + (instr(lower(t.description), %s) > 0)' for _ in terms
+    )
+    return Task.objects.raw(
+        f"""
+        WITH matches AS (
+            -- FTS5 walks rowids in descending order natively and stops at the LIMIT, here
+            -- one past the cap to tell whether any match is left out
+            SELECT rowid FROM todo_task_fts WHERE todo_task_fts MATCH %s
+            ORDER BY rowid DESC LIMIT %s
+        ),
+        candidates AS (SELECT rowid FROM matches ORDER BY rowid DESC LIMIT %s)
+        SELECT {_task_columns('t')}, (SELECT count(*) FROM matches) > %s AS truncated
+        FROM todo_task t JOIN candidates ON t.id = candidates.rowid
+        ORDER BY {score} DESC, t.id DESC
+        LIMIT %s OFFSET %s
+        """,
+        [match, SEARCH_CANDIDATES + 1, SEARCH_CANDIDATES, SEARCH_CANDIDATES,
+         *[term for term in terms for _ in (0, 1)], limit, offset],
+    )
+
+
+def _fallback_search(owner_id, terms, limit, offset):
+    # Unindexed LIKE scan, for databases without a search index here
+    tasks = Task.objects.filter(owner_id=owner_id).order_by(*TASK_LIST_ORDERING)
+    for term in terms:
+        tasks = tasks.filter(Q(title__icontains=term) | Q(description__icontains=term))
+    return tasks[offset:offset + limit]
+
+
+def search_tasks(owner_id, q, limit, cursor=None):
+    """
+    One page of the owner's tasks matching every word of `q`, best matches first.
+    Returns (tasks, next_cursor, truncated); the cursor is an opaque offset into the
+    ranking, and `truncated` is true when more than SEARCH_CANDIDATES tasks matched, so
+    only the newest of them were ranked.
+    """
+    offset = 0
+    if cursor:
+        try:
+            (offset,) = decode_cursor(cursor)
+            offset = int(offset)
+            if offset < 0:
+                raise ValueError(offset)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    terms = search_terms(q)
+    if not terms:
+        return [], None, False
+
+    vendor = connections['default'].vendor
+    backend = {'postgresql': _postgres_search, 'sqlite': _sqlite_search}.get(vendor, _fallback_search)
+    # Fetch one extra row to know whether another page follows
+    tasks = list(backend(owner_id, terms, limit + 1, offset))
+    truncated = bool(tasks) and bool(getattr(tasks[0], 'truncated', False))
+    if len(tasks) > limit:
+        return tasks[:limit], encode_cursor([offset + limit]), truncated
+    return tasks, None, truncated
@@ -61,6 +61,7 @@ document.addEventListener("DOMContentLoaded", () => {
                 localStorage.setItem("accessToken", tokenContent);
             } else if (tokenContent === "null") {
                 localStorage.removeItem("accessToken");
+                localStorage.removeItem("refreshToken");
             }
         }
 
@@ -139,6 +140,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
             closeAllModals();
             fetchTasks();
+            connectEvents();
             triggerWelcomeMessage();
         } else {
             // LOGGED OUT
@@ -190,11 +192,35 @@ document.addEventListener("DOMContentLoaded", () => {
     };
 
     // --- API Helper ---
-    const fetchWithAuth = async (url, options = {}) => {
+    // Swap the refresh token for a new pair instead of asking for the password again
+    const refreshTokens = async () => {
+        const refresh = localStorage.getItem("refreshToken");
+        if (!refresh) return false;
+        const response = await fetch(`${API_BASE_URL}/auth/refresh`, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ refresh }),
+        });
+        if (!response.ok) {
+            localStorage.removeItem("refreshToken");
+            return false;
+        }
+        const data = await response.json();
+        localStorage.setItem("accessToken", data.access);
+        localStorage.setItem("refreshToken", data.refresh);
+        token = data.access;
+        return true;
+    };
+
+    const fetchWithAuth = async (url, options = {}, retry = true) => {
         const currentToken = localStorage.getItem("accessToken");
         const headers = { "Content-Type": "application/json", ...options.headers };
         if (currentToken) headers["Authorization"] = `Bearer ${currentToken}`;
-        return await fetch(url, { ...options, headers });
+        const response = await fetch(url, { ...options, headers });
+        if (response.status === 401 && retry && await refreshTokens()) {
+            return await fetchWithAuth(url, options, false);
+        }
+        return response;
     };
 
     // --- Auth Logic ---
@@ -207,6 +233,7 @@ document.addEventListener("DOMContentLoaded", () => {
             const data = await response.json();
             
             localStorage.setItem("accessToken", data.access);
+            localStorage.setItem("refreshToken", data.refresh);
             token = data.access;
             updateUIForAuthState();
         } catch (error) {
@@ -243,10 +270,20 @@ document.addEventListener("DOMContentLoaded", () => {
     // --- Task Logic ---
     const fetchTasks = async () => {
         try {
-            const response = await fetchWithAuth(`${API_BASE_URL}/tasks/`);
-            if (response.status === 401) return;
-            if (!response.ok) throw new Error("Failed to fetch tasks.");
-            allTasks = await response.json();
+            // The list is paginated: follow X-Next-Cursor until the last page
+            const tasks = [];
+            let cursor = null;
+            do {
+                const url = cursor
+                    ? `${API_BASE_URL}/tasks/?limit=500&cursor=${encodeURIComponent(cursor)}`
+                    : `${API_BASE_URL}/tasks/?limit=500`;
+                const response = await fetchWithAuth(url);
+                if (response.status === 401) return;
+                if (!response.ok) throw new Error("Failed to fetch tasks.");
+                tasks.push(...(await response.json()));
+                cursor = response.headers.get("X-Next-Cursor");
+            } while (cursor);
+            allTasks = tasks;
             // Sort by order field
             allTasks.sort((a, b) => a.order - b.order); 
             renderTasks();
@@ -256,6 +293,47 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     };
 
+    // --- Live Updates ---
+    // Changes made on other devices are pushed over /api/ws and applied locally
+    let eventSocket = null;
+    let reconnectDelay = 1000;
+
+    const applyTaskEvent = (event) => {
+        if (event.type === "tasks.imported") {
+            fetchTasks();
+            return;
+        }
+        if (event.type === "task.created" || event.type === "task.updated") {
+            allTasks = allTasks.filter(t => t.id !== event.task.id);
+            allTasks.push(event.task);
+        } else if (event.type === "task.deleted") {
+            allTasks = allTasks.filter(t => t.id !== event.id);
+        } else if (event.type === "tasks.reordered") {
+            for (const changed of event.tasks) {
+                const task = allTasks.find(t => t.id === changed.id);
+                if (task) task.order = changed.order;
+            }
+        }
+        allTasks.sort((a, b) => a.order - b.order);
+        renderTasks();
+    };
+
+    const connectEvents = () => {
+        const currentToken = localStorage.getItem("accessToken");
+        if (!currentToken || eventSocket) return;
+        const scheme = window.location.protocol === "https:" ? "wss" : "ws";
+        eventSocket = new WebSocket(`${scheme}://${window.location.host}${API_BASE_URL}/ws?token=${encodeURIComponent(currentToken)}`);
+        eventSocket.onopen = () => { reconnectDelay = 1000; };
+        eventSocket.onmessage = (message) => applyTaskEvent(JSON.parse(message.data));
+        eventSocket.onclose = (event) => {
+            eventSocket = null;
+            if (event.code === 1008 || !localStorage.getItem("accessToken")) return;
+            // We may have missed events (or were dropped as a slow consumer): resync, then reconnect
+            setTimeout(() => { fetchTasks(); connectEvents(); }, reconnectDelay);
+            reconnectDelay = Math.min(reconnectDelay * 2, 30000);
+        };
+    };
+
     const renderTasks = () => {
         if (!taskList) return;
         taskList.innerHTML = "";
@@ -371,44 +449,31 @@ document.addEventListener("DOMContentLoaded", () => {
     }
 
     const updateTaskOrder = async (draggedId, newIndex, allItems) => {
-        // Calculate new order value to fit between neighbors
+        // The server computes the new order key from the task we were dropped after
         const currentItems = Array.from(document.querySelectorAll('.task-item'));
         const draggedItem = currentItems.find(item => item.dataset.id === draggedId);
         
         if (!draggedItem) return;
 
         const index = currentItems.indexOf(draggedItem);
-        let newOrder = 0;
-        
-        const getOrder = (id) => {
-            const t = allTasks.find(x => x.id == id);
-            return t ? t.order : 0;
-        };
-
         const prevItem = currentItems[index - 1];
-        const nextItem = currentItems[index + 1];
-
-        if (!prevItem && nextItem) {
-            newOrder = getOrder(nextItem.dataset.id) - 1.0;
-        } else if (prevItem && !nextItem) {
-            newOrder = getOrder(prevItem.dataset.id) + 1.0;
-        } else if (prevItem && nextItem) {
-            newOrder = (getOrder(prevItem.dataset.id) + getOrder(nextItem.dataset.id)) / 2.0;
-        } else {
-            newOrder = new Date().getTime();
-        }
+        const afterId = prevItem ? Number(prevItem.dataset.id) : null;
 
         try {
-            const task = allTasks.find(t => t.id == draggedId);
-            if(task) task.order = newOrder;
-            
-            await fetchWithAuth(`${API_BASE_URL}/tasks/${draggedId}`, {
-                method: 'PATCH',
-                body: JSON.stringify({ order: newOrder })
+            const response = await fetchWithAuth(`${API_BASE_URL}/tasks/${draggedId}/move`, {
+                method: 'POST',
+                body: JSON.stringify({ after_id: afterId })
             });
-            fetchTasks(); 
+            if (!response.ok) throw new Error("Failed to move task.");
+            // Only the rows whose order changed are returned
+            for (const changed of await response.json()) {
+                const task = allTasks.find(t => t.id === changed.id);
+                if (task) task.order = changed.order;
+            }
+            allTasks.sort((a, b) => a.order - b.order);
         } catch (error) {
             console.error("Failed to reorder", error);
+            fetchTasks();
         }
     };
 
@@ -0,0 +1,122 @@
+import operator
+from collections import Counter
+from datetime import datetime, time, timedelta
+from functools import reduce
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.utils import timezone
+
+from .models import Task, TaskStats, current_week_start
+
+OPEN_STATUSES = (Task.Status.QUEUE, Task.Status.IN_PROGRESS)
+
+STATUS_COUNTERS = {
+    Task.Status.QUEUE: 'queue',
+    Task.Status.IN_PROGRESS: 'in_progress',
+    Task.Status.COMPLETED: 'completed',
+    Task.Status.ABORTED: 'aborted',
+}
+
+PRIORITY_COUNTERS = {
+    Task.Priority.LOW: 'priority_low',
+    Task.Priority.MEDIUM: 'priority_medium',
+    Task.Priority.HIGH: 'priority_high',
+}
+
+
+def week_of(moment):
+    day = timezone.localdate(moment)
+    return day - timedelta(days=day.weekday())
+
+
+def _bucketed(counts, lookup):
+    # One CASE per distinct date: the row's own as-of date decides whether a task counts
+    terms = [
+        Case(When(**{lookup: day}, then=Value(delta)), default=Value(0))
+        for day, delta in counts.items() if delta
+    ]
+    return reduce(operator.add, terms) if terms else None
+
+
+def record_changes(owner_id, removed=(), added=()):
+    """
+    Apply the counter changes for tasks leaving (`removed`) and entering (`added`) a
+    user's list, given as Task.stats_state() tuples, with a single UPDATE of their
+    TaskStats row. Call it inside the transaction that writes the tasks. A user without
+    a row yet is skipped; get_stats() builds it from the tasks.
+    """
+    counts, overdue, completed = Counter(), Counter(), Counter()
+    for sign, states in ((-1, removed), (1, added)):
+        for task_status, priority, due_date, completed_at in states:
+            counts['total'] += sign
+            counts[STATUS_COUNTERS.get(task_status)] += sign
+            counts[PRIORITY_COUNTERS.get(priority)] += sign
+            if task_status in OPEN_STATUSES:
+                overdue[due_date] += sign
+            if task_status == Task.Status.COMPLETED and completed_at:
+                completed[week_of(completed_at)] += sign
+
+    updates = {field: F(field) + delta for field, delta in counts.items() if field and delta}
+    overdue_delta = _bucketed(overdue, 'overdue_as_of__gt')
+    if overdue_delta is not None:
+        updates['overdue'] = F('overdue') + overdue_delta
+    completed_delta = _bucketed(completed, 'week_start')
+    if completed_delta is not None:
+        updates['completed_this_week'] = F('completed_this_week') + completed_delta
+    if updates:
+        TaskStats.objects.filter(owner_id=owner_id).update(**updates)
+
+
+def _dated_counts(today, week_start):
+    since = timezone.make_aware(datetime.combine(week_start, time.min))
+    return {
+        'overdue': Count('pk', filter=Q(status__in=OPEN_STATUSES, due_date__lt=today)),
+        'completed_this_week': Count('pk', filter=Q(status=Task.Status.COMPLETED, completed_at__gte=since)),
+    }
+
+
+def _all_counts(today, week_start):
+    counts = {'total': Count('pk')}
+    counts.update({field: Count('pk', filter=Q(status=value)) for value, field in STATUS_COUNTERS.items()})
+    counts.update({field: Count('pk', filter=Q(priority=value)) for value, field in PRIORITY_COUNTERS.items()})
+    counts.update(_dated_counts(today, week_start))
+    return counts
+
+
+def refresh_stats(owner_id, full=False):
+    """
+    Recount a user's stats from their tasks with one aggregate query: only the dated
+    counters, or every counter with `full` (a missing row, or reconciliation). The row
+    lock keeps concurrent record_changes() calls from being lost or counted twice.
+    """
+    today, week_start = timezone.localdate(), current_week_start()
+    with transaction.atomic():
+        stats, created = TaskStats.objects.select_for_update().get_or_create(owner_id=owner_id)
+        full = full or created
+        aggregates = _all_counts(today, week_start) if full else _dated_counts(today, week_start)
+        counts = Task.objects.filter(owner_id=owner_id).aggregate(**aggregates)
+        changed = not created and any(getattr(stats, field) != value for field, value in counts.items())
+        for field, value in counts.items():
+            setattr(stats, field, value)
+        stats.overdue_as_of, stats.week_start = today, week_start
+        stats.save()
+    return stats, changed
+
+
+def get_stats(owner_id):
+    stats = TaskStats.objects.filter(owner_id=owner_id).first()
+    if stats is None:
+        stats, _ = refresh_stats(owner_id, full=True)
+    elif stats.overdue_as_of != timezone.localdate() or stats.week_start != current_week_start():
+        # At most once a day per user: move the dated counters to today
+        stats, _ = refresh_stats(owner_id)
+    return stats
+
+
+def reconcile_stats(owner_ids=None):
+    """Recount every user's stats (or `owner_ids`') from scratch; returns how many had drifted."""
+    if owner_ids is None:
+        owner_ids = list(get_user_model().objects.values_list('pk', flat=True))
+    return sum(refresh_stats(owner_id, full=True)[1] for owner_id in owner_ids)
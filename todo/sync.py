@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from fastapi import HTTPException, status
+
+from .models import Task, TaskTombstone
+from .pagination import decode_cursor, encode_cursor
+
+# Rows written in the last few seconds may belong to transactions that commit out of
+# updated_at order, so cursors never move past now - CHANGES_SETTLE_SECONDS. Clients
+# simply see those rows again on their next sync.
+CHANGES_SETTLE_SECONDS = 2
+
+
+def tombstone_retention():
+    return timedelta(days=getattr(settings, 'TASK_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def record_deletions(owner_id, task_ids):
+    TaskTombstone.objects.bulk_create([TaskTombstone(owner_id=owner_id, task_id=pk) for pk in task_ids])
+
+
+async def arecord_deletions(owner_id, task_ids):
+    await TaskTombstone.objects.abulk_create([TaskTombstone(owner_id=owner_id, task_id=pk) for pk in task_ids])
+
+
+def _position(values, index):
+    return datetime.fromisoformat(values[index]), int(values[index + 1])
+
+
+def _after(field, position):
+    moment, pk = position
+    return Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'id__gt': pk})
+
+
+def _capped(position, horizon):
+    return position if position[0] <= horizon else (horizon, 0)
+
+
+async def changes_since(owner_id, since, limit):
+    """
+    Tasks created or updated and tasks deleted after the `since` cursor, each walked in
+    (timestamp, id) order over the (owner, updated_at, id) and (owner, deleted_at, id)
+    indexes, so the cost follows the number of changes rather than the size of the list.
+    """
+    now = timezone.now()
+    horizon = now - timedelta(seconds=CHANGES_SETTLE_SECONDS)
+    if since:
+        try:
+            values = decode_cursor(since)
+            task_position, tombstone_position = _position(values, 0), _position(values, 2)
+        except (IndexError, TypeError, ValueError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        if tombstone_position[0] < now - tombstone_retention():
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="Cursor expired, start a full sync")
+    else:
+        # A full sync: every task, and only deletions that happen from now on
+        task_position, tombstone_position = (datetime.min.replace(tzinfo=now.tzinfo), 0), (horizon, 0)
+
+    tasks = Task.objects.filter(owner_id=owner_id).filter(_after('updated_at', task_position))
+    changed = [task async for task in tasks.order_by('updated_at', 'id')[:limit + 1]]
+    tombstones = TaskTombstone.objects.filter(owner_id=owner_id).filter(_after('deleted_at', tombstone_position))
+    deleted = [row async for row in tombstones.order_by('deleted_at', 'id').values_list('deleted_at', 'id', 'task_id')[:limit + 1]]
+
+    more_deleted = len(deleted) > limit
+    has_more = len(changed) > limit or more_deleted
+    changed, deleted = changed[:limit], deleted[:limit]
+    if changed:
+        task_position = (changed[-1].updated_at, changed[-1].id)
+    if more_deleted:
+        tombstone_position = deleted[-1][:2]
+    else:
+        # Every tombstone up to now has been read, so the cursor moves on to the horizon even
+        # when none came back; otherwise a client that saw no deletions for the retention
+        # window would get a 410 having missed nothing
+        tombstone_position = (horizon, 0)
+    capped_task_position = _capped(task_position, horizon)
+    capped_tombstone_position = _capped(tombstone_position, horizon)
+    if (capped_task_position, capped_tombstone_position) != (task_position, tombstone_position):
+        # Everything after the horizon comes back next time; stop here instead of looping
+        has_more = False
+
+    cursor = encode_cursor([
+        capped_task_position[0].isoformat(), capped_task_position[1],
+        capped_tombstone_position[0].isoformat(), capped_tombstone_position[1],
+    ])
+    return {
+        "changed": changed,
+        "deleted": [task_id for _, _, task_id in deleted],
+        "cursor": cursor,
+        "has_more": has_more,
+    }
+
+
+def prune_tombstones():
+    """Delete tombstones older than the retention window; cursors older than that get 410."""
+    cutoff = timezone.now() - tombstone_retention()
+    deleted, _ = TaskTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
@@ -1,3 +1,1346 @@
-from django.test import TestCase
+import asyncio
+import json
+import math
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, OperationalError, connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from todoproject import settings as project_settings
+
+from . import hashing, profiling
+from .api import api
+from .apps import TodoConfig
+from .assets import StaticAssets
+from .cache import invalidate_user, user_cache
+from .events import InProcessBroker
+from .metrics import django_route, route_label
+from .middleware import DatabaseThreadPool, LeasedExecutor, ThreadSensitiveMiddleware
+from .models import EmailOutbox, Profile, RevokedToken, Task, TaskStats
+from .ordering import ORDER_STEP
+from .outbox import LEASE, _claim, _lease, dispatch_batch, enqueue_confirmation, run_dispatcher
+from .pagination import encode_cursor
+from .profiling import ProfileStore
+from .ratelimit import InMemoryBackend, RateLimitMiddleware, match_rule
+from .search import repair_search_index
+from .stats import reconcile_stats
+from .tokens import issue_tokens, prune_revoked_tokens, session_access_token
+from .transfer import IMPORT_CHUNK_SIZE, MAX_REPORTED_ERRORS
+
+
+class APIResponse:
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+@async_to_sync
+async def call_api(method, path, token=None, json_body=None, params=None, headers=None, app=api, content=None):
+    """
+    One request to the FastAPI app (or another ASGI `app`), in-process. Through async_to_sync the ORM calls it makes
+    run on the test's own thread, so they see (and roll back with) the test's transaction. `content` is a raw body.
+    """
+    body = content if content is not None else b'' if json_body is None else json.dumps(json_body).encode()
+    request_headers = {'content-type': 'application/json', 'content-length': str(len(body)), **(headers or {})}
+    if token:
+        request_headers['authorization'] = f'Bearer {token}'
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'root_path': '',
+        'query_string': urlencode(params or {}).encode(),
+        'headers': [(key.encode(), value.encode()) for key, value in request_headers.items()],
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    status_code, response_headers, chunks = None, {}, []
+    response_complete = asyncio.Event()
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        # The client stays connected until the whole response is in; streaming responses
+        # stop as soon as they see a disconnect
+        await response_complete.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status_code
+        if message['type'] == 'http.response.start':
+            status_code = message['status']
+            response_headers.update((key.decode().lower(), value.decode()) for key, value in message.get('headers', []))
+        elif message['type'] == 'http.response.body':
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                response_complete.set()
+
+    # In a task of its own, like a server's connection handler: context variables set while
+    # handling the request (the read replica choice) must not leak into the next one
+    await asyncio.create_task(app(scope, receive, send))
+    return APIResponse(status_code, response_headers, b''.join(chunks))
+
+
+@override_settings(RATE_LIMITS=[], DATABASE_REPLICAS=[])
+class APITestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        # Ids come back after each test's rollback; don't serve a previous test's user
+        invalidate_user(self.user.pk)
+        self.token = issue_tokens(self.user)['access']
+
+    def request(self, method, path, json_body=None, token=None, **kwargs):
+        return call_api(method, path, token=token or self.token, json_body=json_body, **kwargs)
+
+    def create_task(self, title='Task', due_date='2030-01-01', **fields):
+        response = self.request('POST', '/tasks/', {'title': title, 'due_date': due_date, **fields})
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+
+@skipUnless('replica' in settings.DATABASES, "needs the 'replica' alias (DATABASE_BACKEND=sqlite)")
+class ReadReplicaTests(APITestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        super().setUp()
+        self.task = self.create_task('Before')
+        # The replica catches up with the primary, then the task is renamed there
+        for model in (User, Profile, Task):
+            model.objects.using('replica').bulk_create(model.objects.using('default').all())
+        response = self.request('PATCH', f"/tasks/{self.task['id']}", {'title': 'After'})
+        self.assertEqual(response.status_code, 200)
+
+    def read_titles(self):
+        with override_settings(DATABASE_REPLICAS=['replica']):
+            single = self.request('GET', f"/tasks/{self.task['id']}").json()['title']
+            listed = [row['title'] for row in self.request('GET', '/tasks/').json()]
+        return single, listed
+
+    def test_read_after_write_goes_to_primary(self):
+        self.assertEqual(self.read_titles(), ('After', ['After']))
+
+    def test_reads_go_to_replica_once_pin_expires(self):
+        profile = Profile.objects.get(user=self.user)
+        self.assertIsNotNone(profile.last_write_at)
+        # The pin is a column on the primary, so every worker sees it; move it out of the window
+        profile.last_write_at = timezone.now() - timedelta(seconds=settings.REPLICA_PIN_SECONDS + 60)
+        profile.save(update_fields=['last_write_at'])
+        self.assertEqual(self.read_titles(), ('Before', ['Before']))
+
+    def test_one_primary_lookup_per_read(self):
+        version = Profile.objects.get(user=self.user).version
+        # The pin check and the ETag's version are the same query
+        for path in (f"/tasks/{self.task['id']}", '/tasks/'):
+            with self.subTest(path=path), override_settings(DATABASE_REPLICAS=['replica']):
+                with CaptureQueriesContext(connections['default']) as queries:
+                    response = self.request('GET', path)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.headers['etag'].startswith(f'"{self.user.pk}-{version}-'))
+                self.assertEqual(len([query for query in queries if 'todo_profile' in query['sql']]), 1)
+
+
+class TaskStatsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.yesterday = (timezone.localdate() - timedelta(days=1)).isoformat()
+
+    def assertStats(self, **expected):
+        stats = TaskStats.objects.get(owner=self.user)
+        self.assertEqual({field: getattr(stats, field) for field in expected}, expected)
+        # The incrementally kept counters match a full recount
+        self.assertEqual(reconcile_stats([self.user.pk]), 0)
+
+    def test_save_and_delete(self):
+        task = Task.objects.create(owner=self.user, title='Model', due_date=self.yesterday)
+        self.assertStats(total=1, queue=1, priority_low=1, overdue=1, completed_this_week=0)
+        task.status = Task.Status.IN_PROGRESS
+        task.priority = Task.Priority.HIGH
+        task.save()
+        self.assertStats(total=1, queue=0, in_progress=1, priority_low=0, priority_high=1, overdue=1)
+        task.status = Task.Status.COMPLETED
+        task.save()
+        self.assertStats(total=1, in_progress=0, completed=1, overdue=0, completed_this_week=1)
+        task.status = Task.Status.ABORTED
+        task.save()
+        self.assertStats(total=1, completed=0, aborted=1, overdue=0, completed_this_week=0)
+        task.delete()
+        self.assertStats(total=0, aborted=0, priority_high=0)
+
+    def test_update_returning(self):
+        task = self.create_task('API', due_date=self.yesterday)
+        path = f"/tasks/{task['id']}"
+        self.assertStats(total=1, queue=1, overdue=1)
+        self.request('PATCH', path, {'status': 'In Progress'})
+        self.assertStats(queue=0, in_progress=1, overdue=1)
+        self.request('PATCH', path, {'status': 'Completed'})
+        self.assertStats(in_progress=0, completed=1, overdue=0, completed_this_week=1)
+        # PUT writes every field, including a status back to Queue
+        self.request('PUT', path, {'title': 'API', 'description': '', 'due_date': '2030-01-01', 'priority': 'Medium', 'status': 'Queue'})
+        self.assertStats(completed=0, queue=1, priority_low=0, priority_medium=1, overdue=0, completed_this_week=0)
+        # Order-only PATCHes take the single-statement path and leave the counters alone
+        self.request('PATCH', path, {'order': 5.0})
+        self.assertStats(total=1, queue=1)
+        self.assertEqual(self.request('DELETE', path).status_code, 204)
+        self.assertStats(total=0, queue=0, priority_medium=0)
+
+    def test_batch(self):
+        first, second = self.create_task('One', due_date=self.yesterday), self.create_task('Two')
+        response = self.request('POST', '/tasks/batch', {
+            'create': [{'title': 'Three', 'due_date': self.yesterday, 'priority': 'High'}],
+            'update': [{'id': first['id'], 'status': 'Completed'}, {'id': second['id'], 'status': 'Aborted'}],
+            'delete': [second['id'] + 1000],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertStats(total=3, queue=1, completed=1, aborted=1, priority_high=1, overdue=1, completed_this_week=1)
+        response = self.request('POST', '/tasks/batch', {'delete': [first['id'], second['id']]})
+        self.assertEqual([result['status'] for result in response.json()['results']], [204, 204])
+        self.assertStats(total=1, queue=1, completed=0, aborted=0, overdue=1, completed_this_week=0)
+
+    def test_reconcile_reports_drift(self):
+        self.create_task()
+        self.assertEqual(reconcile_stats([self.user.pk]), 0)
+        # A write that bypasses the model leaves the counters behind until reconciled
+        Task.objects.filter(owner=self.user).update(status=Task.Status.ABORTED)
+        self.assertEqual(reconcile_stats([self.user.pk]), 1)
+        self.assertStats(queue=0, aborted=1)
+
+
+class TaskReturningTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.task = self.create_task('Original', description='Details', priority='High')
+        self.path = f"/tasks/{self.task['id']}"
+
+    def test_update_returning_converts_columns(self):
+        before = Task.objects.get(pk=self.task['id'])
+        [task] = Task.objects.filter(pk=before.pk).update_returning(**Task.status_updates({'status': 'Completed'}))
+        self.assertIsInstance(task, Task)
+        self.assertEqual((task.title, task.status, task.is_completed), ('Original', 'Completed', True))
+        # Datetimes come back as aware datetimes, as from a SELECT
+        self.assertEqual(task.created_at, before.created_at)
+        self.assertIsNotNone(task.completed_at.tzinfo)
+        self.assertEqual(Task.objects.filter(pk=0).update_returning(title='Nothing'), [])
+
+    def test_delete_returning(self):
+        [task] = Task.objects.filter(pk=self.task['id']).delete_returning()
+        self.assertEqual((task.pk, task.title), (self.task['id'], 'Original'))
+        self.assertFalse(Task.objects.filter(pk=self.task['id']).exists())
+        self.assertEqual(Task.objects.filter(pk=self.task['id']).delete_returning(), [])
+
+    def test_put_replaces_every_field(self):
+        response = self.request('PUT', self.path, {'title': 'Replaced', 'due_date': '2031-02-03'})
+        self.assertEqual(response.status_code, 200)
+        task = response.json()
+        # Fields left out get TaskBase's defaults; no description is an empty one
+        self.assertEqual((task['title'], task['description'], task['priority'], task['status']), ('Replaced', '', 'Low', 'Queue'))
+        self.assertEqual(task['due_date'], '2031-02-03')
+        self.assertEqual(self.request('GET', self.path).json(), task)
+
+    def test_patch_writes_only_sent_fields(self):
+        response = self.request('PATCH', self.path, {'title': 'Renamed'})
+        self.assertEqual(response.status_code, 200)
+        task = response.json()
+        self.assertEqual((task['title'], task['description'], task['priority']), ('Renamed', 'Details', 'High'))
+
+    def test_patch_nulls(self):
+        # Nullable (or defaulted) columns accept null ...
+        response = self.request('PATCH', self.path, {'description': None})
+        self.assertEqual((response.status_code, response.json()['description']), (200, ''))
+        # ... the others are rejected without touching the row
+        response = self.request('PATCH', self.path, {'title': None, 'due_date': None})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()['detail'], 'due_date, title may not be null')
+        self.assertEqual(Task.objects.get(pk=self.task['id']).title, 'Original')
+
+    def test_completed_at_is_kept(self):
+        completed = self.request('PATCH', self.path, {'status': 'Completed'}).json()
+        self.assertTrue(completed['is_completed'])
+        self.assertIsNotNone(completed['completed_at'])
+        # Saving a completed task again keeps the original completion time (Coalesce)
+        again = self.request('PUT', self.path, {'title': 'Still done', 'due_date': '2030-01-01', 'status': 'Completed'}).json()
+        self.assertEqual(again['completed_at'], completed['completed_at'])
+        reopened = self.request('PATCH', self.path, {'status': 'Queue'}).json()
+        self.assertEqual((reopened['is_completed'], reopened['completed_at']), (False, None))
+        # A standalone is_completed doesn't override the status
+        self.assertFalse(self.request('PATCH', self.path, {'is_completed': True}).json()['is_completed'])
+
+    def test_other_users_task_is_not_found(self):
+        other = User.objects.create_user('mallory', password='pw')
+        invalidate_user(other.pk)
+        token = issue_tokens(other)['access']
+        for method, body in (('GET', None), ('PUT', {'title': 'Mine', 'due_date': '2030-01-01'}),
+                             ('PATCH', {'title': 'Mine'}), ('DELETE', None)):
+            with self.subTest(method=method):
+                self.assertEqual(self.request(method, self.path, body, token=token).status_code, 404)
+        self.assertEqual(Task.objects.get(pk=self.task['id']).title, 'Original')
+
+
+class TaskListCursorTests(APITestCase):
+    def make_tasks(self, specs):
+        tasks = Task.objects.bulk_create(
+            Task(owner=self.user, title=f'Task {i}', due_date=due_date, status=task_status, priority=priority, order=order)
+            for i, (order, due_date, task_status, priority) in enumerate(specs)
+        )
+        return [task.pk for task in tasks]
+
+    def pages(self, limit, **params):
+        """Ids on every page of the list, following X-Next-Cursor to the end."""
+        pages, cursor = [], None
+        while True:
+            response = self.request('GET', '/tasks/', params={**params, 'limit': limit, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200, response.content)
+            pages.append([row['id'] for row in response.json()])
+            cursor = response.headers.get('x-next-cursor')
+            if cursor is None:
+                return pages
+
+    def test_ties_on_order_and_created_at(self):
+        ids = self.make_tasks([(1.0, '2030-01-01', 'Queue', 'Low')] * 7 + [(0.5, '2030-01-01', 'Queue', 'Low')])
+        # Same order and creation time: the id breaks the tie
+        Task.objects.filter(pk__in=ids[:7]).update(created_at=timezone.now())
+        pages = self.pages(limit=2)
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 2])
+        self.assertEqual(sum(pages, []), [ids[7]] + ids[:7])
+
+    def test_filters_with_cursor(self):
+        self.make_tasks([
+            (float(i % 3), f'2030-01-{i + 1:02d}', ('Queue', 'Completed')[i % 2], ('Low', 'High')[i % 4 == 0])
+            for i in range(20)
+        ])
+        for params in ({'status': 'Queue'}, {'priority': 'High'}, {'due_after': '2030-01-05', 'due_before': '2030-01-15'},
+                       {'status': 'Completed', 'due_after': '2030-01-10'}):
+            with self.subTest(**params):
+                expected = [row['id'] for row in self.request('GET', '/tasks/', params={**params, 'limit': 100}).json()]
+                self.assertTrue(expected)
+                self.assertEqual(sum(self.pages(limit=3, **params), []), expected)
+
+    def test_last_page_has_no_cursor(self):
+        self.make_tasks([(float(i), '2030-01-01', 'Queue', 'Low') for i in range(4)])
+        # Exactly `limit` rows left: no empty page after it
+        self.assertEqual([len(page) for page in self.pages(limit=2)], [2, 2])
+        self.assertEqual([len(page) for page in self.pages(limit=4)], [4])
+        self.assertEqual(self.pages(limit=5, status='Aborted'), [[]])
+
+    def test_malformed_cursor(self):
+        for cursor in ('not a cursor', encode_cursor({'order': 1}), encode_cursor([1.0, 7]),
+                       encode_cursor([None, '2030-01-01T00:00:00+00:00', 1]), encode_cursor([1.0, 'yesterday', 1])):
+            with self.subTest(cursor=cursor):
+                response = self.request('GET', '/tasks/', params={'cursor': cursor})
+                self.assertEqual((response.status_code, response.json()), (400, {'detail': 'Invalid cursor'}))
+
+
+class TaskOrderingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.ids = [self.create_task(f'Task {i}')['id'] for i in range(4)]
+
+    def listed(self):
+        return [row['id'] for row in self.request('GET', '/tasks/').json()]
+
+    def move(self, task_id, after_id):
+        response = self.request('POST', f'/tasks/{task_id}/move', {'after_id': after_id})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_new_tasks_are_appended(self):
+        orders = list(Task.objects.filter(pk__in=self.ids).order_by('pk').values_list('order', flat=True))
+        self.assertEqual(orders, [ORDER_STEP * (i + 1) for i in range(4)])
+
+    def test_batch_creates_are_appended(self):
+        response = self.request('POST', '/tasks/batch', {'create': [{'title': 'Five', 'due_date': '2030-01-01'},
+                                                                    {'title': 'Six', 'due_date': '2030-01-01'}]})
+        new_ids = [result['id'] for result in response.json()['results']]
+        self.create_task('Seven')
+        orders = list(Task.objects.filter(owner=self.user).order_by('pk').values_list('order', flat=True))
+        self.assertEqual(orders, [ORDER_STEP * (i + 1) for i in range(7)])
+        self.assertEqual(self.listed()[4:6], new_ids)
+
+    def test_move_to_head_and_tail(self):
+        a, b, c, d = self.ids
+        changed = self.move(c, None)
+        self.assertEqual([row['id'] for row in changed], [c])
+        self.assertEqual(self.listed(), [c, a, b, d])
+        self.move(a, d)
+        self.assertEqual(self.listed(), [c, b, d, a])
+        self.move(d, c)
+        self.assertEqual(self.listed(), [c, d, b, a])
+
+    def test_exhausted_gap_rebalances(self):
+        a, b, c, d = self.ids
+        # No float strictly between a and b any more
+        Task.objects.filter(pk=b).update(order=math.nextafter(ORDER_STEP, math.inf))
+        changed = self.move(d, a)
+        self.assertGreater(len(changed), 1)
+        self.assertEqual(self.listed(), [a, d, b, c])
+        orders = list(Task.objects.filter(pk__in=self.ids).order_by('order').values_list('order', flat=True))
+        self.assertEqual(orders, [ORDER_STEP * (i + 1) for i in range(4)])
+
+    def test_reorder_with_shared_keys_respaces(self):
+        a, b, c, d = self.ids
+        Task.objects.filter(pk__in=[b, c]).update(order=ORDER_STEP * 2)
+        response = self.request('PUT', '/tasks/order', {'ids': [c, b]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.listed(), [a, c, b, d])
+        self.assertEqual(len(set(Task.objects.filter(owner=self.user).values_list('order', flat=True))), 4)
+
+    def test_move_errors(self):
+        a, b = self.ids[:2]
+        self.assertEqual(self.request('POST', f'/tasks/{a}/move', {'after_id': a}).status_code, 400)
+        self.assertEqual(self.request('POST', f'/tasks/{a}/move', {'after_id': b + 1000}).status_code, 404)
+
+
+@mock.patch('todo.sync.CHANGES_SETTLE_SECONDS', 0)
+class TaskChangesTests(APITestCase):
+    def sync(self, since=None, **params):
+        response = self.request('GET', '/tasks/changes', params={**({'since': since} if since else {}), **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def later(self, days):
+        return mock.patch('todo.sync.timezone.now', return_value=timezone.now() + timedelta(days=days))
+
+    def test_full_then_incremental(self):
+        a, b, c = (self.create_task(f'Task {i}')['id'] for i in range(3))
+        full = self.sync()
+        self.assertEqual(([row['id'] for row in full['changed']], full['deleted'], full['has_more']), ([a, b, c], [], False))
+
+        self.request('PATCH', f'/tasks/{b}', {'title': 'Renamed'})
+        self.request('DELETE', f'/tasks/{c}')
+        d = self.create_task('New')['id']
+        delta = self.sync(full['cursor'])
+        self.assertEqual([row['id'] for row in delta['changed']], [b, d])
+        self.assertEqual(delta['changed'][0]['title'], 'Renamed')
+        self.assertEqual(delta['deleted'], [c])
+
+        quiet = self.sync(delta['cursor'])
+        self.assertEqual((quiet['changed'], quiet['deleted']), ([], []))
+
+    def test_pages_through_deletions(self):
+        ids = [self.create_task(f'Task {i}')['id'] for i in range(3)]
+        cursor = self.sync()['cursor']
+        for pk in ids:
+            self.request('DELETE', f'/tasks/{pk}')
+        first = self.sync(cursor, limit=2)
+        self.assertEqual((first['deleted'], first['has_more']), (ids[:2], True))
+        second = self.sync(first['cursor'], limit=2)
+        self.assertEqual((second['deleted'], second['has_more']), (ids[2:], False))
+
+    def test_cursor_moves_on_without_deletions(self):
+        self.create_task()
+        cursor = self.sync()['cursor']
+        retention = settings.TASK_TOMBSTONE_RETENTION_DAYS
+        # A client that syncs regularly but never sees a deletion keeps a live cursor
+        with self.later(retention - 1):
+            cursor = self.sync(cursor)['cursor']
+        with self.later(2 * retention - 2):
+            self.assertEqual(self.sync(cursor)['changed'], [])
+
+    def test_stale_cursor_is_gone(self):
+        cursor = self.sync()['cursor']
+        with self.later(settings.TASK_TOMBSTONE_RETENTION_DAYS + 1):
+            response = self.request('GET', '/tasks/changes', params={'since': cursor})
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(self.request('GET', '/tasks/changes', params={'since': 'junk'}).status_code, 400)
+
+
+class ETagTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.a, self.b = self.create_task('A')['id'], self.create_task('B')['id']
+
+    def etag(self, path, **params):
+        response = self.request('GET', path, params=params)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.headers['cache-control'], 'private, no-cache')
+        return response.headers['etag']
+
+    def revalidate(self, path, etag):
+        return self.request('GET', path, headers={'if-none-match': etag}).status_code
+
+    def test_matching_tag_is_not_modified(self):
+        for path in ('/tasks/', f'/tasks/{self.a}', '/tasks/profile'):
+            with self.subTest(path=path):
+                etag = self.etag(path)
+                self.assertEqual(self.revalidate(path, etag), 304)
+                self.assertEqual(self.revalidate(path, f'"other", W/{etag}'), 304)
+                self.assertEqual(self.revalidate(path, '"other"'), 200)
+        # Each view of the same data has its own tag
+        self.assertNotEqual(self.etag('/tasks/'), self.etag('/tasks/', status='Queue'))
+
+    def test_every_write_changes_the_tag(self):
+        writes = [
+            ('POST', '/tasks/', {'title': 'C', 'due_date': '2030-01-01'}),
+            ('PATCH', f'/tasks/{self.a}', {'title': 'A2'}),
+            ('PUT', f'/tasks/{self.a}', {'title': 'A3', 'due_date': '2030-01-02'}),
+            ('POST', '/tasks/batch', {'update': [{'id': self.a, 'status': 'Completed'}]}),
+            ('POST', f'/tasks/{self.b}/move', {'after_id': None}),
+            ('PUT', '/tasks/order', {'ids': [self.a, self.b]}),
+            ('PUT', '/tasks/profile', {'bio': 'Hello'}),
+            ('DELETE', f'/tasks/{self.b}', None),
+        ]
+        paths = ('/tasks/', f'/tasks/{self.a}', '/tasks/profile')
+        for method, path, body in writes:
+            with self.subTest(method=method, path=path):
+                before = {view: self.etag(view) for view in paths}
+                self.assertLess(self.request(method, path, body).status_code, 300)
+                for view in paths:
+                    self.assertNotEqual(self.etag(view), before[view])
+                    self.assertEqual(self.revalidate(view, before[view]), 200)
+
+    def test_missing_task_is_not_found(self):
+        other = User.objects.create_user('mallory', password='pw')
+        foreign = Task.objects.create(owner=other, title='Secret', due_date='2030-01-01').id
+        for task_id in (foreign, self.b + 1000):
+            self.assertEqual(self.revalidate(f'/tasks/{task_id}', '*'), 404)
+        self.assertEqual(self.revalidate(f'/tasks/{self.a}', '*'), 304)
+
+
+def ndjson(records):
+    return ''.join(line if isinstance(line, str) else json.dumps(line) for line in records).encode()
+
+
+class TaskImportTests(APITestCase):
+    def import_(self, content, fmt='ndjson'):
+        response = self.request('POST', '/tasks/import', params={'format': fmt}, content=content)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_csv_quoted_fields(self):
+        content = (
+            'title,description,due_date,priority\r\n'
+            '"Milk, eggs","First line\nsecond, with ""quotes""",2030-01-01,High\r\n'
+            '\r\n'
+            'Plain,,2030-01-02,\r\n'
+        ).encode()
+        result = self.import_(content, 'csv')
+        self.assertEqual((result['created'], result['failed']), (2, 0))
+        rows = list(Task.objects.filter(owner=self.user).order_by('order').values_list('title', 'description', 'priority'))
+        self.assertEqual(rows, [('Milk, eggs', 'First line\nsecond, with "quotes"', 'High'), ('Plain', '', 'Low')])
+
+    def test_invalid_rows_are_skipped_and_reported(self):
+        content = ndjson([
+            {'title': 'Good', 'due_date': '2030-01-01'}, '\n',
+            '{not json\n',
+            {'title': '', 'due_date': '2030-01-01'}, '\n',
+            '\n',
+            {'title': 'Also good', 'due_date': '2030-01-01', 'status': 'Completed'}, '\n',
+            {'title': 'No date'},
+        ])
+        result = self.import_(content)
+        self.assertEqual((result['created'], result['failed']), (2, 3))
+        self.assertEqual([error['line'] for error in result['errors']], [2, 3, 6])
+        self.assertEqual(result['errors'][2]['detail'][0]['loc'], ['due_date'])
+        self.assertEqual(Task.objects.get(title='Also good').is_completed, True)
+
+    def test_reported_errors_are_capped(self):
+        result = self.import_(ndjson([{'title': f'Bad {i}'}, '\n'][i % 2] for i in range(2 * (MAX_REPORTED_ERRORS + 20))))
+        self.assertEqual((result['created'], result['failed'], len(result['errors'])), (0, MAX_REPORTED_ERRORS + 20, MAX_REPORTED_ERRORS))
+        self.assertEqual(result['errors'][-1]['line'], MAX_REPORTED_ERRORS)
+
+    def test_crosses_bulk_create_chunks(self):
+        self.create_task('Existing')
+        count = IMPORT_CHUNK_SIZE + 5
+        records = [line for i in range(count) for line in ({'title': f'Imported {i}', 'due_date': '2030-01-01'}, '\n')]
+        with mock.patch('todo.transfer.Task.objects.bulk_create', wraps=Task.objects.bulk_create) as bulk_create:
+            self.assertEqual(self.import_(ndjson(records))['created'], count)
+        self.assertEqual([len(call.args[0]) for call in bulk_create.call_args_list], [IMPORT_CHUNK_SIZE, 5])
+        # Appended after the existing task, in file order and across the chunk boundary
+        titles = list(Task.objects.filter(owner=self.user).order_by('order').values_list('title', flat=True))
+        self.assertEqual(titles, ['Existing'] + [f'Imported {i}' for i in range(count)])
+        self.assertEqual(Task.objects.filter(owner=self.user).values('order').distinct().count(), count + 1)
+
+    def test_updates_stats_version_and_subscribers(self):
+        etag = self.request('GET', '/tasks/').headers['etag']
+        content = ndjson([
+            {'title': 'Done', 'due_date': '2030-01-01', 'status': 'Completed', 'priority': 'High'}, '\n',
+            {'title': 'Queued', 'due_date': '2030-01-01'}, '\n',
+        ])
+        with mock.patch('todo.api.publish') as publish:
+            self.import_(content)
+        publish.assert_called_once_with(self.user.pk, 'tasks.imported', count=2)
+        stats = TaskStats.objects.get(owner=self.user)
+        self.assertEqual((stats.total, stats.completed, stats.queue, stats.priority_high), (2, 1, 1, 1))
+        self.assertEqual(reconcile_stats([self.user.pk]), 0)
+        self.assertEqual(self.request('GET', '/tasks/', headers={'if-none-match': etag}).status_code, 200)
+        # Nothing imported, nothing to announce
+        with mock.patch('todo.api.publish') as publish:
+            self.assertEqual(self.import_(b'{}\n')['created'], 0)
+        publish.assert_not_called()
+
+
+@override_settings(RATE_LIMITS=[])
+class TaskExportTests(TransactionTestCase):
+    # The export reads on a connection of its own, which only sees committed rows
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        invalidate_user(self.user.pk)
+        self.token = issue_tokens(self.user)['access']
+
+    def round_trip(self, fmt):
+        exported = call_api('GET', '/tasks/export', token=self.token, params={'format': fmt})
+        self.assertEqual(exported.status_code, 200)
+        other = User.objects.create_user(f'bob-{fmt}', password='pw')
+        response = call_api('POST', '/tasks/import', token=issue_tokens(other)['access'], params={'format': fmt}, content=exported.content)
+        self.assertEqual(response.json()['failed'], 0, response.content)
+        fields = ('title', 'description', 'priority', 'status', 'due_date')
+        return [list(Task.objects.filter(owner=owner).order_by('order').values_list(*fields)) for owner in (self.user, other)]
+
+    def test_round_trip(self):
+        Task.objects.create(owner=self.user, title='Commas, "quotes"', description='Two\nlines, and\r\nmore', due_date='2030-01-01', order=1)
+        Task.objects.create(owner=self.user, title='Done', description='', due_date='2030-01-02', status='Completed', priority='High', order=2)
+        for fmt in ('csv', 'ndjson'):
+            with self.subTest(fmt=fmt):
+                original, imported = self.round_trip(fmt)
+                self.assertEqual(imported, original)
+
+
+# A fast hasher: these tests are about which hashes run where, not how long they take
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoginTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.bob = User.objects.create_user('bob', email='bob@example.com', password='a long password')
+
+    async def alogin(self, username, password='a long password'):
+        form = urlencode({'username': username, 'password': password}).encode()
+        return await call_api.awaitable('POST', '/auth/login', content=form, headers={'content-type': 'application/x-www-form-urlencoded'})
+
+    def login(self, username, password='a long password'):
+        return async_to_sync(self.alogin)(username, password)
+
+    @mock.patch.object(hashing.pool, 'workers', 0)
+    def test_configured_backends_find_the_user(self):
+        with mock.patch('todo.hashing._verify', wraps=hashing._verify) as verify:
+            self.assertEqual(self.login('bob').status_code, 200)
+            # allauth's email lookup
+            self.assertEqual(self.login('bob@example.com').status_code, 200)
+            # ModelBackend and allauth's username lookup find the same account: one hash
+            verify.reset_mock()
+            self.assertEqual(self.login('bob', 'wrong').status_code, 401)
+            self.assertEqual(verify.call_count, 1)
+        self.assertEqual(self.login('nobody').status_code, 401)
+        User.objects.filter(pk=self.bob.pk).update(is_active=False)
+        self.assertEqual(self.login('bob').status_code, 401)
+
+    @mock.patch.object(hashing.pool, 'workers', 0)
+    def test_password_checks_outside_login_still_hash(self):
+        self.assertTrue(self.bob.check_password('a long password'))
+        self.bob.set_password('another password')
+        self.assertTrue(self.bob.check_password('another password'))
+
+    def test_overloaded_pool_answers_503(self):
+        release = threading.Event()
+
+        def slow_verify(password, encoded):
+            release.wait(5)
+            return False
+
+        @async_to_sync
+        async def storm():
+            logins = [asyncio.create_task(self.alogin('bob')) for _ in range(3)]
+            done, pending = await asyncio.wait(logins, return_when=asyncio.FIRST_COMPLETED, timeout=5)
+            release.set()
+            return [task.result() for task in done], [(await task) for task in pending]
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        with mock.patch.multiple(hashing.pool, workers=1, queue_size=1, _executor=executor), \
+                mock.patch('todo.hashing._verify', slow_verify):
+            shed, finished = storm()
+        # One hash runs, one waits for the worker, the third is turned away at once
+        self.assertEqual([(response.status_code, response.headers['retry-after']) for response in shed], [(503, '1')])
+        self.assertEqual([response.status_code for response in finished], [401, 401])
+        self.assertEqual(hashing.pool._admitted, 0)
+
+
+class RefreshTokenTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.refresh = issue_tokens(self.user)['refresh']
+
+    def refresh_with(self, refresh):
+        return self.request('POST', '/auth/refresh', {'refresh': refresh}, token='')
+
+    def test_rotation_revokes_the_used_token(self):
+        response = self.refresh_with(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        rotated = response.json()['refresh']
+        self.assertNotEqual(rotated, self.refresh)
+        self.assertEqual(self.request('GET', '/tasks/', token=response.json()['access']).status_code, 200)
+        # Replaying the old token (e.g. a stolen copy) is refused; the new one still works
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+        self.assertEqual(self.refresh_with(rotated).status_code, 200)
+
+    def test_logout_revokes_the_token(self):
+        self.assertEqual(self.request('POST', '/auth/logout', {'refresh': self.refresh}, token='').status_code, 204)
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+
+    def test_inactive_user(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+
+    def test_prune_only_deletes_expired(self):
+        now = timezone.now()
+        expired = RevokedToken.objects.create(jti=uuid.uuid4(), expires_at=now - timedelta(seconds=1))
+        live = RevokedToken.objects.create(jti=uuid.uuid4(), expires_at=now + timedelta(days=1))
+        self.assertEqual(prune_revoked_tokens(), 1)
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), [live.jti])
+        self.assertFalse(RevokedToken.objects.filter(jti=expired.jti).exists())
+
+
+@mock.patch.object(hashing.pool, 'workers', 0)
+class UserCacheTests(APITestCase):
+    def cached(self):
+        return [key for key in user_cache._data if key[0] == self.user.pk]
+
+    def profile(self):
+        return self.request('GET', '/tasks/profile')
+
+    def test_saving_the_user_invalidates_it(self):
+        self.assertEqual(self.profile().json()['email'], '')
+        self.assertEqual(len(self.cached()), 1)
+        self.user.email = 'alice@example.com'
+        self.user.save()
+        self.assertEqual(self.cached(), [])
+        self.assertEqual(self.profile().json()['email'], 'alice@example.com')
+
+    def test_deactivated_user_is_not_served(self):
+        self.assertEqual(self.profile().status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.profile().status_code, 401)
+        self.assertEqual(self.cached(), [])
+
+    def test_deleted_user_is_not_served(self):
+        self.assertEqual(self.profile().status_code, 200)
+        self.user.delete()
+        self.assertEqual(self.cached(), [])
+        self.assertEqual(self.profile().status_code, 401)
+
+
+class SessionAccessTokenTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        invalidate_user(self.user.pk)
+        # The cache's clock; the tokens themselves are signed with the real time
+        patcher = mock.patch('todo.cache.time')
+        self.clock = patcher.start().monotonic
+        self.clock.return_value = 1000.0
+        self.addCleanup(patcher.stop)
+
+    def test_token_is_reused_for_half_its_lifetime(self):
+        half_life = jwt_settings.ACCESS_TOKEN_LIFETIME.total_seconds() / 2
+        token = session_access_token(self.user, 'session')
+        self.assertEqual(AccessToken(token)[jwt_settings.USER_ID_CLAIM], str(self.user.pk))
+        self.clock.return_value += half_life - 1
+        self.assertEqual(session_access_token(self.user, 'session'), token)
+        self.assertNotEqual(session_access_token(self.user, 'other session'), token)
+        self.clock.return_value += 2
+        renewed = session_access_token(self.user, 'session')
+        self.assertNotEqual(renewed, token)
+        self.assertEqual(session_access_token(self.user, 'session'), renewed)
+
+    def test_saving_the_user_drops_its_tokens(self):
+        token = session_access_token(self.user, 'session')
+        self.user.email = 'alice@example.com'
+        self.user.save()
+        self.assertNotEqual(session_access_token(self.user, 'session'), token)
+
+
+class EmailOutboxTests(APITestCase):
+    def register(self, username='bob'):
+        return self.request('POST', '/auth/register', {'username': username, 'password': 'a long password', 'email': f'{username}@example.com'}, token='')
+
+    def test_registration_queues_confirmation(self):
+        self.assertEqual(self.register().status_code, 201)
+        row = EmailOutbox.objects.get()
+        self.assertEqual((row.kind, row.state, row.email_address.email), ('confirmation', 'pending', 'bob@example.com'))
+        self.assertEqual(dispatch_batch(), 1)
+        row.refresh_from_db()
+        self.assertEqual((row.state, row.attempts), ('sent', 1))
+        self.assertEqual([message.to for message in mail.outbox], [['bob@example.com']])
+        self.assertEqual(dispatch_batch(), 0)
+
+    def test_rolled_back_registration_leaves_no_row(self):
+        def enqueue_then_fail(email_address):
+            enqueue_confirmation(email_address)
+            raise DatabaseError("connection lost")
+
+        with mock.patch('todo.auth_api.enqueue_confirmation', enqueue_then_fail):
+            self.assertEqual(self.register().status_code, 400)
+        self.assertFalse(User.objects.filter(username='bob').exists())
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=3)
+    def test_failed_send_backs_off(self):
+        self.register()
+        row = EmailOutbox.objects.get()
+        with mock.patch('todo.outbox._send', side_effect=OSError("SMTP down")), self.assertLogs('todo.outbox', 'WARNING'):
+            for attempt, delay in ((1, 30), (2, 60)):
+                before = timezone.now()
+                self.assertEqual(dispatch_batch(), 1)
+                row.refresh_from_db()
+                self.assertEqual((row.state, row.attempts, row.last_error), ('pending', attempt, 'SMTP down'))
+                self.assertGreaterEqual(row.next_attempt_at, before + timedelta(seconds=delay))
+                self.assertLessEqual(row.next_attempt_at, timezone.now() + timedelta(seconds=delay))
+                # Not due again until the backoff has passed
+                self.assertEqual(dispatch_batch(), 0)
+                EmailOutbox.objects.filter(pk=row.pk).update(next_attempt_at=timezone.now())
+            self.assertEqual(dispatch_batch(), 1)
+        row.refresh_from_db()
+        self.assertEqual((row.state, row.attempts), ('failed', 3))
+        self.assertEqual(dispatch_batch(), 0)
+
+    def test_expired_lease_is_reclaimed(self):
+        self.register()
+        # A dispatcher claims the row and dies before sending it
+        [claimed] = _claim(10)
+        self.assertEqual(_claim(10), [])
+        later = timezone.now() + LEASE + timedelta(seconds=1)
+        with mock.patch('todo.outbox.timezone.now', return_value=later):
+            self.assertEqual([row.pk for row in _claim(10)], [claimed.pk])
+
+    def test_row_leased_by_another_dispatcher_is_skipped(self):
+        self.register('bob')
+        self.register('carol')
+        first, second = EmailOutbox.objects.order_by('pk')
+
+        def racing_lease(due, row, until):
+            if row.pk == first.pk:
+                # Another dispatcher leases the row after this one read it
+                EmailOutbox.objects.filter(pk=row.pk).update(next_attempt_at=until)
+            return _lease(due, row, until)
+
+        with mock.patch('todo.outbox._lease', racing_lease):
+            self.assertEqual([row.pk for row in _claim(10)], [second.pk])
+
+    def test_shutdown_waits_for_the_batch_in_flight(self):
+        started, release, finished = threading.Event(), threading.Event(), []
+
+        def slow_batch(batch_size):
+            started.set()
+            release.wait(5)
+            finished.append(batch_size)
+            return 0
+
+        @async_to_sync
+        async def shutdown():
+            dispatcher = asyncio.create_task(run_dispatcher(interval=60, batch_size=7))
+            await asyncio.to_thread(started.wait, 5)
+            dispatcher.cancel()
+            asyncio.get_running_loop().call_later(0.05, release.set)
+            with self.assertRaises(asyncio.CancelledError):
+                await dispatcher
+            return list(finished)
+
+        with mock.patch('todo.outbox._dispatch_from_loop', slow_batch):
+            self.assertEqual(shutdown(), [7])
+
+
+def mounted(static):
+    # As in todoproject.asgi; the Starlette app turns StaticFiles' HTTPException into a 404
+    return Starlette(routes=[Mount('/static', app=static)])
+
+
+class StaticAssetsTests(TestCase):
+    def test_missing_static_root(self):
+        with tempfile.TemporaryDirectory() as parent:
+            static = StaticAssets(directory=os.path.join(parent, 'staticfiles'), use_finders=False)
+            with self.assertRaisesMessage(ImproperlyConfigured, 'collectstatic'):
+                static.check_collected()
+            self.assertEqual(call_api('GET', '/static/todo/script.js', app=mounted(static)).status_code, 404)
+
+    def test_serves_collected_files(self):
+        with tempfile.TemporaryDirectory() as root:
+            with open(os.path.join(root, 'app.0123456789ab.js'), 'w') as f:
+                f.write('console.log("hi");\n' * 100)
+            with open(os.path.join(root, 'robots.txt'), 'w') as f:
+                f.write('User-agent: *\n')
+            static = StaticAssets(directory=root, use_finders=False)
+            static.check_collected()
+            app = mounted(static)
+            hashed = call_api('GET', '/static/app.0123456789ab.js', app=app, headers={'accept-encoding': 'gzip'})
+            self.assertEqual(hashed.status_code, 200)
+            self.assertIn('immutable', hashed.headers['cache-control'])
+            self.assertEqual(call_api('GET', '/static/robots.txt', app=app).headers['cache-control'], 'no-cache')
+            self.assertEqual(call_api('GET', '/static/../settings.py', app=app).status_code, 404)
+
+
+class SearchTests(APITestCase):
+    def search(self, q, **params):
+        response = self.request('GET', '/tasks/search', params={'q': q, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_matches_every_word_best_first(self):
+        title = self.create_task('Buy milk', description='from the shop')['id']
+        described = self.create_task('Errands', description='milk and bread')['id']
+        self.create_task('Buy bread')
+        self.assertEqual([row['id'] for row in self.search('milk').json()], [title, described])
+        self.assertEqual([row['id'] for row in self.search('buy mil').json()], [title])
+        # The index follows updates and deletes
+        self.request('PATCH', f'/tasks/{described}', {'description': 'eggs'})
+        self.request('DELETE', f'/tasks/{title}')
+        self.assertEqual(self.search('milk').json(), [])
+
+    def test_other_users_tasks_are_not_found(self):
+        other = User.objects.create_user('mallory', password='pw')
+        Task.objects.create(owner=other, title='Secret milk', due_date='2030-01-01')
+        self.assertEqual(self.search('milk').json(), [])
+
+    def test_truncation_is_reported(self):
+        ids = [self.create_task(f'Report {i}')['id'] for i in range(5)]
+        with mock.patch('todo.search.SEARCH_CANDIDATES', 3):
+            response = self.search('report')
+            self.assertEqual(response.headers.get('x-search-truncated'), 'true')
+            # The newest matches are the ones ranked
+            self.assertEqual(sorted(row['id'] for row in response.json()), ids[2:])
+            self.assertNotIn('x-search-truncated', self.search('report 4').headers)
+        with mock.patch('todo.search.SEARCH_CANDIDATES', 5):
+            self.assertNotIn('x-search-truncated', self.search('report').headers)
+
+    @skipUnless(connection.vendor == 'sqlite', "SQLite's FTS5 triggers")
+    def test_repair_restores_dropped_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER todo_task_fts_insert")
+        missed = self.create_task('Unindexed milk')['id']
+        self.assertEqual(self.search('milk').json(), [])
+        repair_search_index(sender=None, using='default')
+        self.assertEqual([row['id'] for row in self.search('milk').json()], [missed])
+        self.assertIn(self.create_task('Indexed milk')['id'], [row['id'] for row in self.search('milk').json()])
+
+    def test_pages(self):
+        ids = [self.create_task(f'Page {i}')['id'] for i in range(5)]
+        first = self.search('page', limit=3)
+        second = self.search('page', limit=3, cursor=first.headers['x-next-cursor'])
+        self.assertNotIn('x-next-cursor', second.headers)
+        self.assertEqual(sorted(row['id'] for row in first.json() + second.json()), ids)
+
+
+class DatabaseThreadPoolTests(TestCase):
+    def test_waiters_are_served_in_arrival_order(self):
+        @async_to_sync
+        async def leases():
+            pool = DatabaseThreadPool(1)
+            self.addCleanup(pool._idle[0].shutdown)
+            executor = await pool.acquire()
+            order = []
+
+            async def lease(name):
+                leased = await pool.acquire()
+                order.append(name)
+                pool.release(leased)
+
+            waiters = [asyncio.create_task(lease(name)) for name in 'abc']
+            await settle()
+            self.assertEqual(pool.stats()['waiting'], 3)
+            pool.release(executor)
+            # A request arriving now queues behind the waiters instead of taking the thread
+            waiters.append(asyncio.create_task(lease('d')))
+            await asyncio.gather(*waiters)
+            return order, pool.stats()
+
+        order, stats = leases()
+        self.assertEqual(order, ['a', 'b', 'c', 'd'])
+        self.assertEqual((stats['busy'], stats['waiting'], stats['leases']), (0, 0, 5))
+
+    def test_lease_is_released_when_the_call_fails(self):
+        def fail():
+            raise ValueError('boom')
+
+        @async_to_sync
+        async def calls():
+            pool = DatabaseThreadPool(1)
+            self.addCleanup(pool._idle[0].shutdown)
+            executor = LeasedExecutor(pool)
+            loop = asyncio.get_running_loop()
+            with self.assertRaises(ValueError):
+                await loop.run_in_executor(executor, fail)
+            self.assertEqual(pool.stats()['busy'], 0)
+            return await loop.run_in_executor(executor, threading.current_thread)
+
+        self.assertEqual(calls().name, 'db-0_0')
+
+    def test_connections_are_closed_on_the_threads_a_request_used(self):
+        pool = DatabaseThreadPool(2)
+        for executor in pool._idle:
+            self.addCleanup(executor.shutdown)
+
+        async def app(scope, receive, send):
+            await sync_to_async(threading.current_thread)()
+
+        closed_on = []
+        with mock.patch('todo.middleware.close_old_connections', lambda: closed_on.append(threading.current_thread().name)):
+            # Not through async_to_sync, which would run the call on this thread instead
+            asyncio.run(ThreadSensitiveMiddleware(app, pool=pool)({'type': 'http'}, None, None))
+        self.assertEqual(closed_on, ['db-1_0'])
+
+
+class HealthTests(APITestCase):
+    def test_health(self):
+        response = self.request('GET', '/health')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['status'], body['database']['vendor']), ('ok', connection.vendor))
+
+    def test_database_down(self):
+        with mock.patch.object(type(connections['default']), 'cursor', side_effect=OperationalError('database is down')):
+            response = self.request('GET', '/health')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['status'], 'unavailable')
+        self.assertEqual(response.json()['database'], {'error': 'database is down'})
+
+
+class AccessTokenScopeTests(APITestCase):
+    @override_settings(RATE_LIMITS=[{'name': 'read', 'methods': ['GET'], 'path': '/', 'rate': 100, 'burst': 100, 'key': 'user'}])
+    def test_token_is_decoded_once_per_request(self):
+        from todoproject.asgi import application
+
+        self.create_task()
+        # Rate limiter (keyed on the user), profiler (staff check) and API principal
+        with mock.patch('todo.tokens.AccessToken', wraps=AccessToken) as decode:
+            response = call_api('GET', '/api/tasks/', token=self.token, headers={'x-profile-request': '1'}, app=application)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+        self.assertNotIn('x-profile-id', response.headers)
+        self.assertEqual(decode.call_count, 1)
+
+    def test_invalid_token(self):
+        response = self.request('GET', '/tasks/', token=self.token[:-2])
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(call_api('GET', '/tasks/').status_code, 401)
+
+
+def limit(name, path, key, burst=2, methods=('GET', 'POST')):
+    return {'name': name, 'methods': list(methods), 'path': path, 'rate': 0.01, 'burst': burst, 'key': key}
+
+
+class RateLimitTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        # The API's own limiter, with empty buckets for every test
+        backend = mock.patch('todo.ratelimit._backend', InMemoryBackend())
+        backend.start()
+        self.addCleanup(backend.stop)
+        self.other = issue_tokens(User.objects.create_user('bob', password='pw'))['access']
+
+    def get(self, token, **headers):
+        return call_api('GET', '/tasks/', token=token, headers=headers)
+
+    @override_settings(RATE_LIMITS=[limit('read', '/', 'user')])
+    def test_empty_bucket_is_429_with_retry_after(self):
+        self.assertEqual([self.get(self.token).status_code for _ in range(2)], [200, 200])
+        response = self.get(self.token)
+        self.assertEqual(response.status_code, 429)
+        # One token at 0.01/s is 100 seconds away
+        self.assertEqual(response.headers['retry-after'], '100')
+        self.assertEqual(self.get(self.other).status_code, 200)
+
+    @override_settings(RATE_LIMITS=[limit('read', '/', 'ip')])
+    def test_ip_rules_share_a_bucket_between_users(self):
+        self.assertEqual(self.get(self.token).status_code, 200)
+        self.assertEqual(self.get(self.other).status_code, 200)
+        self.assertEqual(self.get('').status_code, 429)
+        # Forwarded addresses only count behind a trusted proxy
+        self.assertEqual(self.get(self.token, **{'x-forwarded-for': '203.0.113.9'}).status_code, 429)
+        with override_settings(RATE_LIMIT_TRUST_X_FORWARDED_FOR=True):
+            self.assertEqual(self.get(self.token, **{'x-forwarded-for': '203.0.113.9, 10.0.0.1'}).status_code, 200)
+
+    @override_settings(RATE_LIMITS=[limit('login', '/auth/', 'ip', burst=1, methods=['POST']), limit('read', '/', 'user', burst=1)])
+    def test_first_matching_rule_applies(self):
+        refresh = issue_tokens(self.user)['refresh']
+        logout = lambda: call_api('POST', '/auth/logout', json_body={'refresh': refresh}).status_code
+        self.assertEqual([logout(), logout()], [204, 429])
+        # A user rule without a valid token falls back to the address: the first gets through
+        # to the API's 401, the second finds that bucket empty
+        self.assertEqual(self.get(self.token).status_code, 200)
+        self.assertEqual(self.get('').status_code, 401)
+        self.assertEqual(self.get('not-a-token').status_code, 429)
+
+    @override_settings(RATE_LIMITS=project_settings.RATE_LIMITS)
+    def test_auth_routes_have_their_own_rules(self):
+        rules = {path: match_rule('POST', path)['name'] for path in ('/auth/login', '/auth/register', '/auth/refresh', '/auth/logout')}
+        self.assertEqual(rules, {'/auth/login': 'login', '/auth/register': 'register', '/auth/refresh': 'refresh', '/auth/logout': 'logout'})
+
+    def test_sheds_above_max_concurrent(self):
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def slow(scope, receive, send):
+            started.set()
+            await release.wait()
+            await send({'type': 'http.response.start', 'status': 204, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        app = RateLimitMiddleware(slow, backend=InMemoryBackend(), max_concurrent=1)
+
+        @async_to_sync
+        async def overlapping():
+            first = asyncio.create_task(call_api.awaitable('GET', '/tasks/', app=app))
+            await started.wait()
+            second = await call_api.awaitable('GET', '/tasks/', app=app)
+            release.set()
+            return await first, second, await call_api.awaitable('GET', '/tasks/', app=app)
+
+        first, shed, after = overlapping()
+        self.assertEqual((first.status_code, shed.status_code, after.status_code), (204, 503, 204))
+        self.assertEqual(shed.headers['retry-after'], '1')
+        self.assertEqual(app.in_flight, 0)
+
+
+class SocketClient:
+    """A WebSocket connection to an ASGI app, driven from a coroutine."""
+
+    def __init__(self, token, app=api, buffer=0):
+        # With a `buffer`, the app's sends block once that many messages are unread
+        self.incoming, self.outgoing = asyncio.Queue(), asyncio.Queue(maxsize=buffer)
+        self.incoming.put_nowait({'type': 'websocket.connect'})
+        scope = {
+            'type': 'websocket',
+            'asgi': {'version': '3.0'},
+            'path': '/ws',
+            'raw_path': b'/ws',
+            'root_path': '',
+            'query_string': urlencode({'token': token}).encode(),
+            'headers': [],
+            'client': ('127.0.0.1', 50000),
+            'server': ('testserver', 80),
+            'subprotocols': [],
+        }
+        self.task = asyncio.create_task(app(scope, self.incoming.get, self.outgoing.put))
+
+    async def next(self):
+        return await asyncio.wait_for(self.outgoing.get(), timeout=5)
+
+    async def event(self):
+        message = await self.next()
+        return json.loads(message['text']) if message['type'] == 'websocket.send' else message
+
+    async def disconnect(self):
+        await self.incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(self.task, timeout=5)
+
+
+async def settle():
+    # Let the socket tasks run until they block again
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+class TaskEventsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        broker = mock.patch('todo.events._broker', InProcessBroker(queue_size=2))
+        self.broker = broker.start()
+        self.addCleanup(broker.stop)
+
+    def test_fan_out_to_the_users_sockets_only(self):
+        other = issue_tokens(User.objects.create_user('bob', password='pw'))['access']
+
+        @async_to_sync
+        async def session():
+            sockets = [SocketClient(self.token), SocketClient(self.token), SocketClient(other)]
+            for socket in sockets:
+                self.assertEqual((await socket.next())['type'], 'websocket.accept')
+            await settle()
+            response = await call_api.awaitable('POST', '/tasks/', self.token, {'title': 'Shared', 'due_date': '2030-01-01'})
+            events = [await socket.event() for socket in sockets[:2]]
+            await settle()
+            self.assertTrue(sockets[2].outgoing.empty())
+            for socket in sockets:
+                await socket.disconnect()
+            return response.json()['id'], events
+
+        task_id, events = session()
+        self.assertEqual([(event['type'], event['task']['id']) for event in events], [('task.created', task_id)] * 2)
+        self.assertEqual(self.broker._subscribers, {})
+
+    def test_slow_consumer_is_dropped(self):
+        @async_to_sync
+        async def session():
+            socket = SocketClient(self.token, buffer=1)
+            await socket.next()
+            await settle()
+            # One event waits in the client's buffer, one in the app's send; two fill the
+            # queue and the next overflows it
+            for i in range(5):
+                await self.broker.publish(self.user.pk, {'type': 'ping', 'n': i})
+                await settle()
+            received = [await socket.event() for _ in range(3)]
+            await asyncio.wait_for(socket.task, timeout=5)
+            return received
+
+        first, second, closed = session()
+        self.assertEqual([first['n'], second['n']], [0, 1])
+        self.assertEqual((closed['type'], closed['code']), ('websocket.close', 1013))
+
+    def test_invalid_token_is_refused(self):
+        @async_to_sync
+        async def session():
+            return await SocketClient(self.token[:-2]).next()
+
+        self.assertEqual(session()['code'], 1008)
+
+    def test_closed_when_the_token_expires(self):
+        token = AccessToken.for_user(self.user)
+        token.set_exp(lifetime=timedelta(seconds=1))
+
+        @async_to_sync
+        async def session():
+            socket = SocketClient(str(token))
+            await socket.next()
+            return await socket.next()
+
+        self.assertEqual(session()['code'], 1008)
+
+    @override_settings(EVENTS_AUTH_RECHECK_SECONDS=0.05)
+    def test_closed_when_the_user_is_deactivated(self):
+        @async_to_sync
+        async def session():
+            socket = SocketClient(self.token)
+            await socket.next()
+            await asyncio.sleep(0.1)
+            self.assertTrue(socket.outgoing.empty())
+            self.user.is_active = False
+            await self.user.asave(update_fields=['is_active'])
+            return await socket.next()
+
+        self.assertEqual(session()['code'], 1008)
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        from todoproject.asgi import application
+
+        self.app = application
+
+    def scrape(self, **headers):
+        return call_api('GET', '/metrics', headers=headers, app=self.app)
+
+    def test_requests_are_labelled_by_route(self):
+        task = self.create_task()
+        for path in ('/api/tasks/', f"/api/tasks/{task['id']}", '/api/nowhere', '/static/todo/missing.js', '/about/'):
+            call_api('GET', path, token=self.token, app=self.app)
+        response = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['content-type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        for series in (
+            'todo_http_requests_total{method="GET",route="/api/tasks/",status="200"}',
+            'todo_http_requests_total{method="GET",route="/api/tasks/{task_id}",status="200"}',
+            'todo_http_requests_total{method="GET",route="unmatched",status="404"}',
+            'todo_http_requests_total{method="GET",route="/static/{path}",status="404"}',
+            # Django's own routes ('/about/' answers 500 here: no collected static manifest)
+            'todo_http_requests_total{method="GET",route="/about/",',
+            'todo_db_queries_per_request_bucket{route="/api/tasks/{task_id}",le="+Inf"}',
+            'todo_http_requests_in_flight ',
+        ):
+            self.assertIn(series, text)
+        self.assertNotIn(f'route="/api/tasks/{task["id"]}"', text)
+
+    def test_django_routes_are_resolved_once_per_path(self):
+        django_route.cache_clear()
+        with mock.patch('todo.metrics.resolve', wraps=resolve) as resolver:
+            for _ in range(3):
+                self.assertEqual(route_label({'type': 'http', 'path': '/about/'}), '/about/')
+            self.assertEqual(route_label({'type': 'http', 'path': '/no/such/page'}), 'unmatched')
+        self.assertEqual(resolver.call_count, 2)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token_guard(self):
+        self.assertEqual(self.scrape().status_code, 401)
+        self.assertEqual(self.scrape(authorization='Bearer wrong').status_code, 401)
+        self.assertEqual(self.scrape(authorization='Bearer s3cret').status_code, 200)
+
+
+class ProfilingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        from todoproject.asgi import application
+
+        self.app = application
+        self.user.is_staff = True
+        self.user.save()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(profiling, 'store', ProfileStore(directory.name, max_files=2))
+        self.store = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def profiled(self, path='/api/tasks/', token=None):
+        return call_api('GET', path, token=token or self.token, headers={'x-profile-request': '1'}, app=self.app)
+
+    def test_staff_request_is_profiled(self):
+        self.create_task()
+        response = self.profiled()
+        self.assertEqual(response.status_code, 200)
+        profile_id = response.headers['x-profile-id']
+        self.assertEqual([entry['id'] for entry in self.store.list()], [profile_id])
+
+        downloaded = call_api('GET', f'/api/profiles/{profile_id}', token=self.token, app=self.app)
+        self.assertEqual(downloaded.status_code, 200)
+        profile = downloaded.json()
+        self.assertEqual((profile['id'], profile['method'], profile['path'], profile['status']), (profile_id, 'GET', '/api/tasks/', 200))
+        self.assertTrue(any('todo_task' in query['sql'] for query in profile['queries']))
+
+        folded = call_api('GET', f'/api/profiles/{profile_id}', token=self.token, params={'format': 'folded'}, app=self.app)
+        self.assertEqual(folded.status_code, 200)
+        self.assertTrue(folded.headers['content-type'].startswith('text/plain'))
+        lines = folded.content.decode().splitlines()
+        self.assertEqual(len(lines), len(profile['samples']))
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertEqual(profile['samples'][stack], int(count))
+
+    def test_other_users_are_not_profiled(self):
+        other = User.objects.create_user('bob', password='pw')
+        response = self.profiled(token=issue_tokens(other)['access'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('x-profile-id', response.headers)
+        self.assertEqual(self.store.ids(), [])
+        self.assertEqual(call_api('GET', '/api/profiles', token=issue_tokens(other)['access'], app=self.app).status_code, 403)
+
+    def test_oldest_profiles_are_evicted(self):
+        profile_ids = [self.profiled().headers['x-profile-id'] for _ in range(3)]
+        self.assertEqual(self.store.ids(), profile_ids[:0:-1])
+        listed = call_api('GET', '/api/profiles', token=self.token, app=self.app).json()
+        self.assertEqual([entry['id'] for entry in listed], profile_ids[:0:-1])
+        evicted = call_api('GET', f'/api/profiles/{profile_ids[0]}', token=self.token, app=self.app)
+        self.assertEqual(evicted.status_code, 404)
+
+
+class AppConfigTests(TestCase):
+    def test_todo_config_is_used(self):
+        # Its ready() installs the query wrappers and the search index repair hook
+        self.assertIsInstance(django_apps.get_app_config('todo'), TodoConfig)
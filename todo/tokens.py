@@ -0,0 +1,121 @@
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .cache import session_token_cache
+from .models import RevokedToken
+
+
+def _jti(token):
+    try:
+        return uuid.UUID(hex=str(token[jwt_settings.JTI_CLAIM]))
+    except (KeyError, ValueError):
+        raise TokenError("Token has no valid id")
+
+
+# Scope key under which access_token_from_scope() keeps the request's decoded token
+SCOPE_KEY = 'todo.access_token'
+
+
+def access_token_from_scope(scope):
+    """
+    The validated AccessToken from an ASGI request's Bearer header, or None. The result
+    is kept in the scope, so the rate limiter, the profiler and the API dependencies
+    share one signature check per request.
+    """
+    if SCOPE_KEY not in scope:
+        scheme, _, raw_token = dict(scope['headers']).get(b'authorization', b'').decode().partition(' ')
+        token = None
+        if scheme.lower() == 'bearer' and raw_token:
+            try:
+                token = AccessToken(raw_token)
+            except (InvalidToken, TokenError):
+                pass
+        scope[SCOPE_KEY] = token
+    return scope[SCOPE_KEY]
+
+
+def issue_tokens(user):
+    """A new refresh/access pair for a user who has just proved who they are."""
+    refresh = RefreshToken.for_user(user)
+    return {'access': str(refresh.access_token), 'refresh': str(refresh)}
+
+
+def session_access_token(user, session_key):
+    """
+    An access token for the user of a Django session. The token is signed once and reused
+    for the session until half its lifetime is gone, so the page always hands out a token
+    with at least that much time left without signing one on every render.
+    """
+    key = (user.pk, session_key)
+    token = session_token_cache.get(key)
+    if token is None:
+        token = str(AccessToken.for_user(user))
+        session_token_cache.set(key, token, ttl=jwt_settings.ACCESS_TOKEN_LIFETIME.total_seconds() / 2)
+    return token
+
+
+async def arevoke(token):
+    """
+    Revoke a (validated) refresh token until it expires. Returns False if it already was,
+    so two requests racing to use the same token can't both get past this.
+    """
+    expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+    return await _insert_revoked(_jti(token), expires_at)
+
+
+@sync_to_async
+def _insert_revoked(jti, expires_at):
+    try:
+        # A savepoint, so the duplicate doesn't break a transaction this runs in
+        with transaction.atomic():
+            RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+    except IntegrityError:
+        return False
+    return True
+
+
+async def ais_revoked(token):
+    return await RevokedToken.objects.filter(jti=_jti(token)).aexists()
+
+
+async def refresh_tokens(raw_token):
+    """
+    A new access token for a refresh token: a signature check and a couple of indexed
+    lookups, no password hash. With ROTATE_REFRESH_TOKENS the refresh token is replaced
+    too, and with BLACKLIST_AFTER_ROTATION the old one is revoked, so a stolen token that
+    has already been used is refused. Raises TokenError for unusable tokens.
+    """
+    token = RefreshToken(raw_token)
+    user_id = token[jwt_settings.USER_ID_CLAIM]
+    if not await get_user_model().objects.filter(pk=user_id, is_active=True).aexists():
+        raise TokenError("User is inactive or deleted")
+
+    if jwt_settings.ROTATE_REFRESH_TOKENS and jwt_settings.BLACKLIST_AFTER_ROTATION:
+        revoked = not await arevoke(token)
+    else:
+        revoked = await ais_revoked(token)
+    if revoked:
+        raise TokenError("Token has been revoked")
+
+    tokens = {'access': str(token.access_token), 'refresh': raw_token}
+    if jwt_settings.ROTATE_REFRESH_TOKENS:
+        # Same claims under a new id and a fresh lifetime, like simplejwt's TokenRefreshSerializer
+        token.set_jti()
+        token.set_exp()
+        token.set_iat()
+        tokens['refresh'] = str(token)
+    return tokens
+
+
+def prune_revoked_tokens():
+    """Forget revoked tokens that have expired anyway; returns how many were deleted."""
+    deleted, _ = RevokedToken.objects.filter(expires_at__lt=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db import connections, transaction
+from pydantic import ValidationError
+
+from .models import Task
+from .ordering import ORDER_STEP, next_order
+from .pagination import TASK_LIST_ORDERING
+from .stats import record_changes
+
+EXPORT_FIELDS = (
+    'id', 'title', 'description', 'priority', 'status', 'due_date', 'order',
+    'is_completed', 'completed_at', 'created_at', 'updated_at',
+)
+# Rows fetched per trip to the database, and rows per bulk_create when importing
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_CHUNK_SIZE = 1000
+# Only the first few invalid records are reported back individually
+MAX_REPORTED_ERRORS = 100
+
+
+def _json_default(value):
+    return value.isoformat()
+
+
+def _encode_ndjson(rows):
+    return ''.join(json.dumps(dict(zip(EXPORT_FIELDS, row)), default=_json_default) + '\n' for row in rows)
+
+
+def _encode_csv(rows, header=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def _finish_export(rows):
+    # On the export's thread: its cursor and connection live there
+    rows.close()
+    connections.close_all()
+
+
+async def export_tasks(owner_id, fmt):
+    """
+    Stream a user's tasks as NDJSON or CSV. Rows come off a server-side cursor
+    (iterator(chunk_size=...)) one chunk per thread hop, so memory stays constant however
+    many tasks there are. The cursor belongs to one connection, so the export runs its
+    hops on a thread of its own rather than on DB threads leased per call, and doesn't
+    keep one of those while the client reads slowly.
+    """
+    rows = (
+        Task.objects.filter(owner_id=owner_id)
+        .order_by(*TASK_LIST_ORDERING)
+        .values_list(*EXPORT_FIELDS)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export')
+    next_chunk = sync_to_async(lambda: list(islice(rows, EXPORT_CHUNK_SIZE)), thread_sensitive=False, executor=thread)
+    try:
+        if fmt == 'csv':
+            yield _encode_csv([], header=True)
+        while chunk := await next_chunk():
+            yield _encode_ndjson(chunk) if fmt == 'ndjson' else _encode_csv(chunk)
+    finally:
+        await sync_to_async(_finish_export, thread_sensitive=False, executor=thread)(rows)
+        thread.shutdown(wait=False)
+
+
+async def _records(stream, fmt):
+    """
+    Yield (line number, dict) for each record of an NDJSON or CSV byte stream, parsing
+    as the chunks arrive. A CSV record is only complete once its quotes are balanced,
+    since quoted fields may contain newlines.
+    """
+    pending = b''
+    header = None
+    record, record_line, line_no = '', 0, 0
+    async for chunk in stream:
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for raw in lines:
+            line_no += 1
+            line = raw.decode('utf-8', errors='replace')
+            if fmt == 'ndjson':
+                if line.strip():
+                    yield line_no, line
+                continue
+            if not record:
+                record_line = line_no
+            # The '\r' of a CRLF stays: the csv module drops it at the end of a record and
+            # keeps it inside a quoted field
+            record += line + '\n'
+            if record.count('"') % 2:
+                continue
+            values, record = next(csv.reader(io.StringIO(record))), ''
+            if header is None:
+                header = [name.strip().lstrip('\ufeff') for name in values]
+            elif any(values):
+                yield record_line, dict(zip(header, values))
+    if pending.strip():
+        line_no += 1
+        line = pending.decode('utf-8', errors='replace')
+        if fmt == 'ndjson':
+            yield line_no, line
+        elif header is not None:
+            yield line_no, dict(zip(header, next(csv.reader(io.StringIO(record + line)))))
+
+
+@sync_to_async
+def _insert(owner_id, items):
+    tasks = []
+    for item in items:
+        data = item.dict()
+        if data.get('description') is None:
+            data['description'] = ""
+        task = Task(owner_id=owner_id, **data)
+        task.sync_status()
+        tasks.append(task)
+    with transaction.atomic():
+        base_order = next_order(owner_id)
+        for i, task in enumerate(tasks):
+            task.order = base_order + i * ORDER_STEP
+        Task.objects.bulk_create(tasks)
+        record_changes(owner_id, added=[task.stats_state() for task in tasks])
+    return len(tasks)
+
+
+async def import_tasks(owner_id, stream, fmt, schema):
+    """
+    Validate each record against `schema` (TaskBase) and insert the valid ones in
+    bulk_create chunks, appended in file order. Returns a summary of the run.
+    """
+    created, failed, errors, chunk = 0, 0, [], []
+    async for line_no, record in _records(stream, fmt):
+        try:
+            if fmt == 'ndjson':
+                item = schema.model_validate_json(record)
+            else:
+                # Empty CSV cells mean "not given"
+                item = schema.model_validate({key: value for key, value in record.items() if value != ''})
+        except ValidationError as exc:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'line': line_no, 'detail': exc.errors(include_url=False, include_input=False)})
+            continue
+        chunk.append(item)
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            created += await _insert(owner_id, chunk)
+            chunk = []
+    if chunk:
+        created += await _insert(owner_id, chunk)
+    return {'created': created, 'failed': failed, 'errors': errors}
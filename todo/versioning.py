@@ -0,0 +1,52 @@
+import hashlib
+
+from django.db.models import F
+from django.db.models.functions import Now
+from fastapi import Request, Response, status
+
+from . import replicas
+from .models import Profile
+
+# Per-user change counter stored on Profile.version. Every task or profile write bumps it
+# *after* the write, so a response cached under a version never predates that version.
+# The same UPDATE stamps last_write_at, which pins the user's reads to the primary
+# database for a while (todo.replicas).
+
+
+def bump_version(user_id):
+    Profile.objects.filter(user_id=user_id).update(version=F('version') + 1, last_write_at=Now())
+
+
+async def abump_version(user_id):
+    await Profile.objects.filter(user_id=user_id).aupdate(version=F('version') + 1, last_write_at=Now())
+
+
+async def aget_version(user_id):
+    # A read-only endpoint's replica check has already read it on the primary
+    version = replicas.primary_version(user_id)
+    if version is not None:
+        return version
+    version = await Profile.objects.filter(user_id=user_id).values_list('version', flat=True).afirst()
+    return version or 0
+
+
+def make_etag(user_id, version, *parts):
+    """Strong ETag for a user's data at `version`; `parts` distinguish different views of it."""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:12]
+    return f'"{user_id}-{version}-{digest}"'
+
+
+def not_modified(request: Request, etag):
+    """A 304 response when the client's If-None-Match already covers `etag`, else None."""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return None
+    candidates = {tag.strip().removeprefix('W/') for tag in header.split(',')}
+    if etag in candidates or '*' in candidates:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))
+    return None
+
+
+def etag_headers(etag):
+    # Clients may keep the response but must revalidate it before every use
+    return {'ETag': etag, 'Cache-Control': 'private, no-cache'}
@@ -1,26 +1,52 @@
+import functools
+import hashlib
+
+from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import render
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.cache import add_never_cache_headers, get_conditional_response, patch_cache_control
+
+from .tokens import session_access_token
+
+
+@functools.lru_cache(maxsize=1)
+def anonymous_shell(year):
+    """
+    The page for visitors without a Django session, rendered once: it only changes with
+    the templates and the year in the footer (hence the argument). Returns (content, ETag).
+    """
+    content = render_to_string("todo/index.html", {'jwt_access_token': 'null'}).encode()
+    return content, f'"{hashlib.blake2b(content, digest_size=16).hexdigest()}"'
+
 
 def index(request):
     """
     This view renders the main single-page application.
     If a user is authenticated (e.g., after a social auth redirect),
-    it generates a JWT access token and embeds it in the template context.
+    it embeds a JWT access token for the session in the template context.
+    Everyone else gets the same cached shell, which browsers revalidate by ETag.
     """
-    context = {
-        'jwt_access_token': 'null',
-    }
-    
     # Check if the request.user is a real, authenticated user and not an AnonymousUser
     if request.user and request.user.is_authenticated:
-        # Generate token using a simple, direct method
-        refresh = RefreshToken.for_user(request.user)
-        access_token = str(refresh.access_token)
-        
+        # Reuses the token already issued to this session while it has plenty of time left
+        access_token = session_access_token(request.user, request.session.session_key)
+
         # Add the token to the context that gets passed to the template
-        context['jwt_access_token'] = access_token
-        
-    return render(request, "todo/index.html", context)
+        response = render(request, "todo/index.html", {'jwt_access_token': access_token})
+        # The page carries a token: never keep it in any cache
+        add_never_cache_headers(response)
+        return response
+
+    if settings.DEBUG:
+        # Template edits show up on the next reload
+        anonymous_shell.cache_clear()
+    content, etag = anonymous_shell(timezone.localdate().year)
+    response = HttpResponse(content)
+    response['ETag'] = etag
+    patch_cache_control(response, no_cache=True)
+    return get_conditional_response(request, etag=etag, response=response)
 
 def about(request):
-    return render(request, "todo/about.html")
\ No newline at end of file
+    return render(request, "todo/about.html")
@@ -7,30 +7,91 @@ For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
+import asyncio
+import contextlib
 import os
+from urllib.parse import urlsplit
 
+import django
+from django.conf import settings
 from django.core.asgi import get_asgi_application
-from starlette.routing import Mount
+from starlette.middleware import Middleware
+from starlette.routing import Mount, Route
 from starlette.applications import Starlette
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'todoproject.settings')
 
-# Get the standard Django ASGI application
-django_asgi_app = get_asgi_application()
+
+class DeferredASGIApp:
+    """An ASGI app built by `factory` when the first request reaches it."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.app = None
+
+    async def __call__(self, scope, receive, send):
+        if self.app is None:
+            self.app = self.factory()
+        await self.app(scope, receive, send)
+
+
+if settings.LEAN_STARTUP:
+    # The ORM is needed right away; Django's handler (and its middleware imports) is not
+    django.setup(set_prefix=False)
+    django_asgi_app = DeferredASGIApp(get_asgi_application)
+else:
+    # Get the standard Django ASGI application
+    django_asgi_app = get_asgi_application()
 
 
 # Import FastAPI app AFTER setting the environment variable
 from todo.api import api as fastapi_app
+from todo import assets, hashing, metrics, profiling
+from todo.outbox import run_dispatcher
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Mounted apps don't get lifespan events, so background work is started here
+    if static_assets is not None:
+        static_assets.check_collected()
+    dispatcher = None
+    if settings.EMAIL_OUTBOX_IN_PROCESS:
+        dispatcher = asyncio.create_task(run_dispatcher())
+    yield
+    if dispatcher:
+        dispatcher.cancel()
+        # Returns once a batch being sent has been recorded
+        with contextlib.suppress(asyncio.CancelledError):
+            await dispatcher
+    hashing.pool.shutdown()
 
 
 # Creating a new top-level Starlette application
+routes = []
+middleware = []
+if settings.METRICS_ENABLED:
+    # Prometheus scrape endpoint, and the middleware that feeds it for every request
+    routes.append(Route("/metrics", metrics.metrics_endpoint))
+    middleware.append(Middleware(metrics.MetricsMiddleware))
+static_assets = None
+if not urlsplit(settings.STATIC_URL).netloc:
+    # Assets straight from STATIC_ROOT, and the SPA shell from a cached copy, bypassing Django
+    static_assets = assets.StaticAssets()
+    routes.append(Mount('/' + settings.STATIC_URL.strip('/'), app=static_assets))
+    routes.append(Route("/", assets.ShellCache(django_asgi_app)))
+# Per-request profiles on demand (X-Profile-Request from staff) or by PROFILING_SAMPLE_RATE
+middleware.append(Middleware(profiling.ProfilingMiddleware))
+
 application = Starlette(
-    routes=[
+    routes=routes + [
         # Mount the FastAPI app at the "/api" path
         Mount("/api", app=fastapi_app),
 
         # Mount the Django app at the root path "/"
         # This is a catch-all for any request not matching "/api"
         Mount("/", app=django_asgi_app),
-    ]
+    ],
+    middleware=middleware,
+    lifespan=lifespan,
 )
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -30,8 +31,14 @@ ALLOWED_HOSTS = []
 
 # Application definition
 
+# Lean startup defers work a worker does not need to start serving the API: admin
+# modules are discovered when the URLconf first loads, social providers when their URLs
+# do, and the Django request handler is built on the first request that reaches it.
+# Set LEAN_STARTUP=0 to load everything at boot.
+LEAN_STARTUP = os.environ.get('LEAN_STARTUP', '1') == '1'
+
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    'django.contrib.admin.apps.SimpleAdminConfig' if LEAN_STARTUP else 'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -47,7 +54,7 @@ INSTALLED_APPS = [
     'django.contrib.sites', # Required by allauth
     'allauth',
     'allauth.account',
-    'allauth.socialaccount',
+    'todo.apps.DeferredSocialAccountConfig' if LEAN_STARTUP else 'allauth.socialaccount',
     
     # Providers for Google and GitHub
     'allauth.socialaccount.providers.google',
@@ -101,16 +108,66 @@ WSGI_APPLICATION = 'todoproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default' : {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'tododb',
-        'USER': 'todouser',
-        'PASSWORD': 'password',
-        'HOST': 'localhost',
-        'PORT': '5432',
+# Threads the API runs ORM calls on; each keeps its connection between requests.
+# 0 starts a fresh thread (and connection) for every request.
+API_DB_THREADS = 16
+
+# DATABASE_BACKEND=sqlite runs against a local SQLite file (tests, quick local runs)
+if os.environ.get('DATABASE_BACKEND', 'postgresql') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            # SQLite connections are cheap but not pooled: keep one open per DB thread
+            'CONN_MAX_AGE': None,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'timeout': 20,
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+                'transaction_mode': 'IMMEDIATE',
+            },
         }
-}
+    }
+else:
+    DATABASES = {
+        'default' : {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': 'tododb',
+            'USER': 'todouser',
+            'PASSWORD': 'password',
+            'HOST': 'localhost',
+            'PORT': '5432',
+            # psycopg 3 pool: connections are handed back at the end of each request instead
+            # of being closed, so no request pays for the TCP/auth handshake
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': 2,
+                    'max_size': API_DB_THREADS + 4,
+                    'timeout': 10,
+                },
+            },
+        }
+    }
+
+# --- READ REPLICAS ---
+# Aliases in DATABASES that replicate 'default' (add them with the same settings plus the
+# replica's host). The task list, single task and profile endpoints read from one of them,
+# except for users who wrote in the last REPLICA_PIN_SECONDS: they stay on the primary and
+# always see their own changes. With DATABASE_BACKEND=sqlite there is a 'replica' alias
+# for trying this locally: set SQLITE_REPLICA_PATH to read from that file, which
+# `manage.py simulate_replication` keeps a few seconds behind.
+DATABASE_ROUTERS = ['todo.replicas.PrimaryReplicaRouter']
+DATABASE_REPLICAS = []
+REPLICA_PIN_SECONDS = 5
+
+if os.environ.get('DATABASE_BACKEND', 'postgresql') == 'sqlite':
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('SQLITE_REPLICA_PATH', BASE_DIR / 'db-replica.sqlite3'),
+    }
+    if os.environ.get('SQLITE_REPLICA_PATH'):
+        DATABASE_REPLICAS = ['replica']
 
 
 # Password validation
@@ -149,6 +206,20 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# `manage.py collectstatic` copies the assets here under content-hashed names, with gzip
+# copies of the text files; todo.assets.StaticAssets serves them from the ASGI app
+# (with DEBUG it also finds uncollected files in the app directories)
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'todo.assets.CompressedManifestStaticFilesStorage'},
+}
+
+# How long the ASGI app reuses the page rendered for visitors without a session; 0 sends
+# every page load to Django
+SPA_SHELL_CACHE_SECONDS = 0 if DEBUG else 300
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -159,6 +230,12 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # 1. Console Backend: Emails will be printed to your terminal (CMD)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Confirmation emails go through an outbox table (todo.outbox). With EMAIL_OUTBOX_IN_PROCESS
+# the ASGI app drains it in a background task; set it to False when running dedicated
+# `python manage.py dispatch_outbox` workers instead.
+EMAIL_OUTBOX_IN_PROCESS = True
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+
 # 2. Allauth Settings
 ACCOUNT_AUTHENTICATION_METHOD = 'username_email'
 ACCOUNT_EMAIL_REQUIRED = True
@@ -183,6 +260,79 @@ SOCIALACCOUNT_PROVIDERS = {
     }
 }
 
+# --- API AUTHENTICATION ---
+# 'stateless': task endpoints trust the signed user_id claim and skip the user lookup.
+# 'database': every request resolves the full User (through the cache below).
+API_AUTH_MODE = 'stateless'
+
+# Bounded in-process cache of User rows for endpoints that need the full user
+API_USER_CACHE_SIZE = 1024
+API_USER_CACHE_TTL = 60  # seconds
+
+# POST /api/auth/refresh hands out a new refresh token with every access token and revokes
+# the old one (todo.models.RevokedToken; see `manage.py prune_revoked_tokens`)
+SIMPLE_JWT = {
+    'ROTATE_REFRESH_TOKENS': True,
+    'BLACKLIST_AFTER_ROTATION': True,
+}
+
+# Login/registration password hashes run in this many worker processes per ASGI worker
+# (0 = in the request thread). Up to PASSWORD_HASHING_QUEUE_SIZE more may wait; beyond
+# that the API answers 503 with Retry-After.
+PASSWORD_HASHING_WORKERS = min(4, os.cpu_count() or 1)
+PASSWORD_HASHING_QUEUE_SIZE = 32
+
+# --- RATE LIMITING (/api) ---
+# Token buckets per client: the first rule whose methods and path prefix (below /api)
+# match applies, keyed on the token's user ('user') or the client IP ('ip'). `rate` is
+# tokens per second, `burst` the bucket size. Over budget: 429 with Retry-After.
+RATE_LIMITS = [
+    {'name': 'login', 'methods': ['POST'], 'path': '/auth/login', 'rate': 5 / 60, 'burst': 10, 'key': 'ip'},
+    {'name': 'register', 'methods': ['POST'], 'path': '/auth/register', 'rate': 10 / 3600, 'burst': 5, 'key': 'ip'},
+    {'name': 'refresh', 'methods': ['POST'], 'path': '/auth/refresh', 'rate': 1, 'burst': 20, 'key': 'ip'},
+    {'name': 'logout', 'methods': ['POST'], 'path': '/auth/logout', 'rate': 10 / 60, 'burst': 10, 'key': 'ip'},
+    {'name': 'import', 'methods': ['POST'], 'path': '/tasks/import', 'rate': 1 / 60, 'burst': 3, 'key': 'user'},
+    {'name': 'write', 'methods': ['POST', 'PUT', 'PATCH', 'DELETE'], 'path': '/', 'rate': 10, 'burst': 50, 'key': 'user'},
+    {'name': 'read', 'methods': ['GET'], 'path': '/', 'rate': 20, 'burst': 100, 'key': 'user'},
+]
+# Per worker. With several workers on one host use 'todo.ratelimit.SQLiteBackend' with
+# {'path': BASE_DIR / 'ratelimit.sqlite3'} so they share the buckets.
+RATE_LIMIT_BACKEND = 'todo.ratelimit.InMemoryBackend'
+RATE_LIMIT_BACKEND_OPTIONS = {'shards': 16, 'max_keys': 10000}
+# Only behind a proxy that sets it; otherwise clients could pick their own key
+RATE_LIMIT_TRUST_X_FORWARDED_FOR = False
+# Requests in progress on /api beyond which new ones are shed with 503 (0 = no limit)
+API_MAX_CONCURRENT_REQUESTS = 256
+
+# --- METRICS (/metrics) ---
+# Per-route latency, status codes, in-flight requests, DB queries and executor waits in
+# the Prometheus text format. With METRICS_TOKEN set, scrapers must send it as a Bearer token.
+METRICS_ENABLED = True
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# --- REQUEST PROFILING ---
+# A staff user's request with `X-Profile-Request: 1`, or this fraction of all requests, is
+# stack-sampled every PROFILING_INTERVAL seconds. The newest PROFILING_MAX_FILES profiles
+# are kept in PROFILING_DIR (see /api/profiles).
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_INTERVAL = 0.005
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_MAX_FILES = 100
+
+# --- DELTA SYNC ---
+# Tombstones of deleted tasks are kept this long (see `manage.py prune_tombstones`);
+# sync cursors older than this must start a full sync again.
+TASK_TOMBSTONE_RETENTION_DAYS = 30
+
+# --- REAL-TIME EVENTS (/api/ws) ---
+# InProcessBroker fans out within one worker. With several workers on one host use
+# 'todo.events.SQLiteBroker' with {'path': BASE_DIR / 'events.sqlite3'}.
+EVENTS_BROKER = 'todo.events.InProcessBroker'
+EVENTS_BROKER_OPTIONS = {'queue_size': 100}
+# How often an open socket re-checks that its user is still active (it is also closed
+# when its access token expires)
+EVENTS_AUTH_RECHECK_SECONDS = 30
+
 # --- SECURITY CONFIGURATION ---
 # CORS
 CORS_ALLOWED_ORIGINS = [
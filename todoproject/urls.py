@@ -18,10 +18,10 @@ from django.contrib import admin
 from django.urls import path, include
 from todo import views
 
-#Added these two imports 
-from django.conf import settings
-from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 
+# With LEAN_STARTUP the admin uses SimpleAdminConfig, so the admin modules are found
+# here, when the URLconf first loads (a no-op if they were already imported at boot)
+admin.autodiscover()
 
 urlpatterns = [
     path('', views.index, name='index'),
@@ -34,6 +34,3 @@ urlpatterns = [
     path('accounts/', include('allauth.urls')), # This handles social auth redirects
 ]
 
-# This is for development only, to serve static files with Uvicorn
-if settings.DEBUG:
-    urlpatterns += staticfiles_urlpatterns()